@@ -0,0 +1,62 @@
+-- Adds aligned processing tiles to the processing block tables of a database created before them, and compacts the
+-- fragmented blocks that were created for arbitrary gaps.
+-- Run it once, with the scheduler service stopped, after updating the code: psql -d soso_db -f aligned_processing_tiles.sql
+-- It assumes the default tile duration (PROCESSING_TILE_HOURS=24): tile n covers [n, n+1) days after the unix epoch (UTC).
+--
+-- Every tile completely covered by processed blocks is replaced by a single processed tile. The rest of the unaligned
+-- blocks are deleted: their events stay in the event tables, and computing them again later merges into the same events.
+-- The capture blocks of different image types at the same location no longer exclude each other, so each of them gets its tiles.
+BEGIN;
+
+ALTER TABLE eclipse_processing_block ADD COLUMN IF NOT EXISTS tile integer;
+ALTER TABLE contact_processing_block ADD COLUMN IF NOT EXISTS tile integer;
+ALTER TABLE capture_processing_block ADD COLUMN IF NOT EXISTS tile integer;
+
+CREATE OR REPLACE FUNCTION pg_temp.compact_processing_blocks(block_table text, partition_columns text) RETURNS void AS $$
+BEGIN
+    EXECUTE format($sql$
+        CREATE TEMPORARY TABLE compacted_blocks AS
+        SELECT %2$s, tiles.tile
+        FROM %1$I AS block
+        CROSS JOIN LATERAL generate_series(
+            floor(extract(epoch FROM lower(block.time_range)) / 86400)::integer,
+            ceil(extract(epoch FROM upper(block.time_range)) / 86400)::integer - 1
+        ) AS tiles(tile)
+        WHERE block.tile IS NULL AND block.status = 'processed'
+        GROUP BY %2$s, tiles.tile
+        HAVING range_agg(block.time_range * tstzrange(to_timestamp(tiles.tile::bigint * 86400), to_timestamp((tiles.tile::bigint + 1) * 86400)))
+            = tstzmultirange(tstzrange(to_timestamp(tiles.tile::bigint * 86400), to_timestamp((tiles.tile::bigint + 1) * 86400)))
+    $sql$, block_table, partition_columns);
+
+    EXECUTE format('DELETE FROM %1$I WHERE tile IS NULL', block_table);
+    EXECUTE format($sql$
+        INSERT INTO %1$I (%2$s, tile, time_range, status)
+        SELECT %2$s, tile, tstzrange(to_timestamp(tile::bigint * 86400), to_timestamp((tile::bigint + 1) * 86400)), 'processed'
+        FROM compacted_blocks
+    $sql$, block_table, partition_columns);
+    DROP TABLE compacted_blocks;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT pg_temp.compact_processing_blocks('eclipse_processing_block', 'satellite_id');
+SELECT pg_temp.compact_processing_blocks('contact_processing_block', 'satellite_id, groundstation_id');
+SELECT pg_temp.compact_processing_blocks('capture_processing_block', 'satellite_id, image_type, latitude, longitude');
+
+DO $$
+DECLARE
+    exclusion_constraint name;
+BEGIN
+    FOR exclusion_constraint IN
+        SELECT conname FROM pg_constraint WHERE conrelid = 'capture_processing_block'::regclass AND contype = 'x'
+    LOOP
+        EXECUTE format('ALTER TABLE capture_processing_block DROP CONSTRAINT %I', exclusion_constraint);
+    END LOOP;
+END;
+$$;
+ALTER TABLE capture_processing_block ADD EXCLUDE USING gist (satellite_id WITH =, image_type WITH =, latitude WITH =, longitude WITH =, time_range WITH &&);
+
+CREATE UNIQUE INDEX IF NOT EXISTS eclipse_processing_block_tile ON eclipse_processing_block (satellite_id, tile) WHERE tile IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS contact_processing_block_tile ON contact_processing_block (satellite_id, groundstation_id, tile) WHERE tile IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS capture_processing_block_tile ON capture_processing_block (satellite_id, image_type, latitude, longitude, tile) WHERE tile IS NOT NULL;
+
+COMMIT;
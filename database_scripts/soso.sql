@@ -227,29 +227,35 @@ CREATE TABLE IF NOT EXISTS capture_processing_block (
     latitude double precision NOT NULL,
     longitude double precision NOT NULL,
     time_range tstzrange NOT NULL,
+    tile integer, -- number of the aligned tile the block covers (see retrieve_and_lock_unprocessed_blocks_for_processing), NULL for blocks covering an arbitrary gap
 	status processing_status DEFAULT 'processing'::processing_status NOT NULL,
     CONSTRAINT valid_time_range CHECK (lower(time_range) < upper(time_range)),
-    EXCLUDE USING gist (satellite_id WITH =, latitude WITH =, longitude WITH =, time_range WITH &&) -- no overlapping time ranges
+    EXCLUDE USING gist (satellite_id WITH =, image_type WITH =, latitude WITH =, longitude WITH =, time_range WITH &&) -- no overlapping time ranges
 );
+CREATE UNIQUE INDEX IF NOT EXISTS capture_processing_block_tile ON capture_processing_block (satellite_id, image_type, latitude, longitude, tile) WHERE tile IS NOT NULL;
 
 CREATE TABLE IF NOT EXISTS contact_processing_block (
     id integer PRIMARY KEY GENERATED ALWAYS AS IDENTITY, -- only here so we will be able to automap the table in sqlalchemy. a key is not really needed.
     satellite_id integer REFERENCES satellite (id) NOT NULL,
     groundstation_id integer REFERENCES ground_station (id) NOT NULL,
     time_range tstzrange NOT NULL,
+    tile integer, -- number of the aligned tile the block covers, NULL for blocks covering an arbitrary gap
 	status processing_status DEFAULT 'processing'::processing_status NOT NULL,
     CONSTRAINT valid_time_range CHECK (lower(time_range) < upper(time_range)),
 	EXCLUDE USING gist (satellite_id WITH =, groundstation_id WITH =, time_range WITH &&) -- no overlapping time ranges
 );
+CREATE UNIQUE INDEX IF NOT EXISTS contact_processing_block_tile ON contact_processing_block (satellite_id, groundstation_id, tile) WHERE tile IS NOT NULL;
 
 CREATE TABLE IF NOT EXISTS eclipse_processing_block (
     id integer PRIMARY KEY GENERATED ALWAYS AS IDENTITY, -- only here so we will be able to automap the table in sqlalchemy. a key is not really needed.
     satellite_id integer REFERENCES satellite (id) NOT NULL,
     time_range tstzrange NOT NULL,
+    tile integer, -- number of the aligned tile the block covers, NULL for blocks covering an arbitrary gap
 	status processing_status DEFAULT 'processing'::processing_status NOT NULL,
     CONSTRAINT valid_time_range CHECK (lower(time_range) < upper(time_range)),
     EXCLUDE USING gist (satellite_id WITH =, time_range WITH &&) -- no overlapping time ranges
 );
+CREATE UNIQUE INDEX IF NOT EXISTS eclipse_processing_block_tile ON eclipse_processing_block (satellite_id, tile) WHERE tile IS NOT NULL;
 
 CREATE TABLE IF NOT EXISTS ground_station_request (
     id integer PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
@@ -0,0 +1,119 @@
+from app_config import rabbit, create_rabbit
+from rabbit_wrapper import TopicPublisher, TopicConsumer
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SatelliteStateHub:
+    """
+    Fans the satellite states streamed by the scheduler service out to every websocket client of this API worker.
+    The hub holds a single subscription to the batched 'satellite.state.batch' topic while any client is connected,
+    polled on its own thread and connection so the event loop never blocks on rabbit, and puts each satellite's state in
+    the queue of every client watching that satellite.
+    Client queues only hold the `max_pending` most recent states: a client that can't keep up skips the stale states instead
+    of slowing down the hub or the other clients.
+    The scheduler service is told about one listener per satellite watched by this worker, no matter how many clients watch it.
+    """
+    def __init__(self, max_pending: int = 1, poll_interval: timedelta = timedelta(milliseconds=100)):
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self._clients: dict[int, set] = dict() # map from satellite id -> queues of the clients watching the satellite
+        self._consumer = None
+        self._task: Optional[asyncio.Task] = None
+        # the consumer's blocking connection is only ever used from this one thread
+        self._consumer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="satellite-state-hub")
+
+    def subscribe(self, satellite_id: int) -> asyncio.Queue:
+        """
+        Start receiving the states of the satellite. Must be called from the event loop.
+        """
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        if satellite_id not in self._clients:
+            self._clients[satellite_id] = set()
+            # tell the scheduler service someone is interested in the satellite, so that it starts publishing its state
+            self._publish("satellite.state.listener.create", {"satellite_id": satellite_id})
+        self._clients[satellite_id].add(queue)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, satellite_id: int, queue: asyncio.Queue):
+        clients = self._clients.get(satellite_id)
+        if clients is None or queue not in clients: return
+        clients.discard(queue)
+        if len(clients)==0:
+            del self._clients[satellite_id]
+            # tell the scheduler service to stop publishing the satellite's state when noone is listening anymore
+            self._publish("satellite.state.listener.destroy", {"satellite_id": satellite_id})
+
+    def client_count(self, satellite_id: Optional[int] = None) -> int:
+        if satellite_id is not None:
+            return len(self._clients.get(satellite_id, ()))
+        return sum(len(clients) for clients in self._clients.values())
+
+    def broadcast(self, message: dict):
+        """
+        Put each state of a 'satellite.state.batch' message in the queues of the clients watching its satellite
+        """
+        for satellite_state in message["states"]:
+            for queue in self._clients.get(satellite_state["satellite_id"], ()):
+                if queue.full():
+                    queue.get_nowait() # drop the stale state, the client only cares about the latest one
+                queue.put_nowait(satellite_state)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # clients can connect again while the consumer is being closed, in which case a new one is bound
+        while len(self._clients) > 0:
+            self._consumer = await loop.run_in_executor(self._consumer_thread, self._create_consumer)
+            try:
+                await self._consume(loop)
+            finally:
+                # unbound when the last client leaves, so that states don't pile up in the queue and get replayed stale to the next clients
+                consumer, self._consumer = self._consumer, None
+                await loop.run_in_executor(self._consumer_thread, self._close_consumer, consumer)
+
+    async def _consume(self, loop: asyncio.AbstractEventLoop):
+        while len(self._clients) > 0:
+            try:
+                message = await loop.run_in_executor(self._consumer_thread, self._consumer.get_message)
+            except Exception:
+                logger.exception("Failed to receive the satellite states.")
+                message = None
+
+            if message is None:
+                await asyncio.sleep(self.poll_interval.total_seconds())
+                continue
+            self.broadcast(message)
+            await asyncio.sleep(0) # let the clients send their states between messages
+
+    def _create_consumer(self):
+        consumer = TopicConsumer(create_rabbit())
+        consumer.bind("satellite.state.batch")
+        return consumer
+
+    def _close_consumer(self, consumer):
+        try:
+            consumer.unbind("satellite.state.batch")
+        except Exception:
+            logger.exception("Failed to unbind the satellite state consumer.")
+
+    def _publish(self, topic: str, message: dict):
+        TopicPublisher(rabbit(), topic).publish_message(message)
+
+
+_hub = None
+def get_satellite_state_hub() -> SatelliteStateHub:
+    """
+    The hub shared by the websocket clients of this API worker
+    """
+    global _hub
+    if _hub is None:
+        _hub = SatelliteStateHub()
+    return _hub
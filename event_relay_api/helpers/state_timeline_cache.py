@@ -0,0 +1,214 @@
+from app_config import create_rabbit, db_engine
+from app_config.database.mapping import StateCheckpoint, ScheduledMaintenance, SatelliteOutage
+from rabbit_wrapper import TopicConsumer
+from sqlalchemy.orm import Session
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from bisect import bisect_right
+from typing import Optional
+from time import monotonic
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SatelliteTimeline:
+    """
+    Sorted checkpoints, outages and maintenance of a satellite. Overlapping outages (and maintenance) are merged,
+    so that whether a time is covered is answered with a single bisection.
+    """
+    checkpoint_times: list = field(default_factory=list)
+    checkpoint_states: list = field(default_factory=list)
+    outage_starts: list = field(default_factory=list)
+    outage_ends: list = field(default_factory=list)
+    maintenance_starts: list = field(default_factory=list)
+    maintenance_ends: list = field(default_factory=list)
+
+    def checkpoint_state(self, time: datetime):
+        """
+        State of the latest checkpoint at or before `time`, or None if there is none
+        """
+        index = bisect_right(self.checkpoint_times, time) - 1
+        return self.checkpoint_states[index] if index >= 0 else None
+
+    def in_outage(self, time: datetime) -> bool:
+        return _covers(self.outage_starts, self.outage_ends, time)
+
+    def in_maintenance(self, time: datetime) -> bool:
+        return _covers(self.maintenance_starts, self.maintenance_ends, time)
+
+
+class StateTimelineCache:
+    """
+    In-memory copy of the checkpoints, outages and maintenance of every satellite in the default schedule, used to add
+    them to the streamed satellite states without querying the database for every state.
+    The cache is reloaded when a request is scheduled or displaced, and at least every `max_age` in case the schedule
+    changed through some other path. Scheduling events are checked every `poll_interval`.
+    The checks and reloads run on a background thread, with its own rabbit connection and database session, which swaps
+    in each reloaded snapshot, so enriching a state only reads memory and never blocks the event loop. States enriched
+    before the first snapshot is loaded have no checkpoint, outage or maintenance.
+    """
+    def __init__(self, schedule_id: int = 0, poll_interval: timedelta = timedelta(seconds=1), max_age: timedelta = timedelta(minutes=10)):
+        self.schedule_id = schedule_id
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self._timelines: Optional[dict] = None # map from satellite id -> SatelliteTimeline
+        self._loaded_at = 0.0
+        self._stale = False
+        self._consumer = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enrich(self, satellite_state: dict) -> dict:
+        """
+        Add the power draw and storage utilization of the satellite's latest checkpoint, and whether it is in an outage
+        or in maintenance, to a streamed satellite state
+        """
+        timeline = self.timeline(satellite_state["satellite_id"])
+        capture_time = _naive_utc(datetime.fromisoformat(satellite_state["time"]))
+        state = timeline.checkpoint_state(capture_time)
+        return {
+            **satellite_state,
+            "power_draw": getattr(state, "power_draw", None),
+            "storage_utilization": getattr(state, "storage_util", None),
+            "in_outage": timeline.in_outage(capture_time),
+            "in_maintenance": timeline.in_maintenance(capture_time)
+        }
+
+    def timeline(self, satellite_id: int) -> SatelliteTimeline:
+        if self._thread is None:
+            self.start()
+        timelines = self._timelines or dict()
+        return timelines.get(satellite_id) or SatelliteTimeline()
+
+    def invalidate(self):
+        """
+        Reload the timelines at the next refresh
+        """
+        self._stale = True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="state-timeline-cache", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the state timelines.")
+            self._stop.wait(self.poll_interval.total_seconds())
+
+    def refresh(self):
+        """
+        Reload the timelines if the schedule changed or the snapshot is older than `max_age`. Called by the background thread.
+        """
+        if self._schedule_changed():
+            self.invalidate()
+        now = monotonic()
+        if self._timelines is None or self._stale or now - self._loaded_at >= self.max_age.total_seconds():
+            self._stale = False
+            self._timelines = self._load() # swapped in whole, so readers see either the old or the new snapshot
+            self._loaded_at = now
+
+    def _schedule_changed(self) -> bool:
+        if self._consumer is None:
+            self._consumer = TopicConsumer(create_rabbit())
+            self._consumer.bind("schedule.request.*.scheduled")
+            self._consumer.bind("schedule.request.*.displaced")
+        changed = False
+        while self._consumer.get_message() is not None: # drain every pending event, a single reload covers them all
+            changed = True
+        return changed
+
+    def _load(self) -> dict:
+        with Session(db_engine) as session:
+            checkpoints, outages, maintenance = self._query_checkpoints(session), self._query_outages(session), self._query_maintenance(session)
+
+        timelines = dict()
+        def timeline(satellite_id: int) -> SatelliteTimeline:
+            if satellite_id not in timelines:
+                timelines[satellite_id] = SatelliteTimeline()
+            return timelines[satellite_id]
+
+        for satellite_id, checkpoint_time, state in sorted(checkpoints, key=lambda row: (row[0], _naive_utc(row[1]))):
+            timeline(satellite_id).checkpoint_times.append(_naive_utc(checkpoint_time))
+            timeline(satellite_id).checkpoint_states.append(state)
+        for satellite_id, intervals in _group_by_satellite(outages).items():
+            timeline(satellite_id).outage_starts, timeline(satellite_id).outage_ends = _merge_intervals(intervals)
+        for satellite_id, intervals in _group_by_satellite(maintenance).items():
+            timeline(satellite_id).maintenance_starts, timeline(satellite_id).maintenance_ends = _merge_intervals(intervals)
+
+        logger.info(f"Loaded the state timelines of {len(timelines)} satellites.")
+        return timelines
+
+    def _query_checkpoints(self, session: Session) -> list:
+        """
+        (satellite id, checkpoint time, state) of every satellite checkpoint in the schedule
+        """
+        return session.query(StateCheckpoint.asset_id, StateCheckpoint.checkpoint_time, StateCheckpoint.state).filter(
+            StateCheckpoint.schedule_id==self.schedule_id,
+            StateCheckpoint.asset_type=="satellite"
+        ).all()
+
+    def _query_outages(self, session: Session) -> list:
+        """
+        (satellite id, start, end) of every satellite outage in the schedule, in naive UTC
+        """
+        rows = session.query(SatelliteOutage.asset_id, SatelliteOutage.utc_time_range).filter(SatelliteOutage.schedule_id==self.schedule_id).all()
+        return [(asset_id, time_range.lower, time_range.upper) for asset_id, time_range in rows]
+
+    def _query_maintenance(self, session: Session) -> list:
+        """
+        (satellite id, start, end) of every maintenance activity in the schedule, in naive UTC
+        """
+        rows = session.query(ScheduledMaintenance.asset_id, ScheduledMaintenance.utc_time_range).filter(ScheduledMaintenance.schedule_id==self.schedule_id).all()
+        return [(asset_id, time_range.lower, time_range.upper) for asset_id, time_range in rows]
+
+
+def _naive_utc(time: datetime) -> datetime:
+    # the database's tsrange columns are naive UTC times
+    if time.tzinfo is None:
+        return time
+    return time.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _group_by_satellite(rows: list) -> dict:
+    intervals = dict()
+    for satellite_id, start, end in rows:
+        intervals.setdefault(satellite_id, []).append((start, end))
+    return intervals
+
+def _merge_intervals(intervals: list):
+    """
+    Union of [start, end) intervals, as sorted lists of starts and ends
+    """
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if len(ends) > 0 and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+def _covers(starts: list, ends: list, time: datetime) -> bool:
+    index = bisect_right(starts, time) - 1
+    return index >= 0 and time < ends[index]
+
+
+_cache = None
+def get_state_timeline_cache() -> StateTimelineCache:
+    """
+    The cache shared by the websocket clients of this API worker
+    """
+    global _cache
+    if _cache is None:
+        _cache = StateTimelineCache()
+    return _cache
@@ -7,12 +7,21 @@ from helpers.asset_helper import add_satellite
 from helpers.miscellaneous_helper import tle_txt_to_json_converter
 import logging
 from fastapi import HTTPException
-from app_config import get_db_session
+from fastapi.responses import StreamingResponse
+from app_config import get_db_session, db_engine
+from sqlalchemy.orm import Session
 from app_config.database.mapping import Satellite, GroundStation
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator, STATE_RECORD_DTYPE
+from scheduler_service.satellite_state.precision_policy import get_precision_policy
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+MAX_TRACK_STATES = 1_000_000
+MAX_VISIBILITY_DURATION = timedelta(days=31) # the ground track index holds a sample of the whole range at every capture step
+
 #ground_station endpoints
 @router.get("/groundstations")
 async def get_all_ground_stations(): 
@@ -51,6 +60,69 @@ async def get_ground_station(id):
         raise HTTPException(404, detail="Satellite with id={id} does not exist.")
     return jsonable_encoder(satellite)
 
+@router.get("/satellites/{id}/visibility")
+def get_satellite_visibility(id: int, latitude: float, longitude: float, start_time: datetime, end_time: datetime, image_type: str = Query("medium")):
+    """
+    Time windows between `start_time` and `end_time` in which the satellite can capture an image of the provided type at (latitude, longitude).
+    Answered from the satellite's ground track index, so new targets don't require propagating the satellite again.
+    The search is synchronous, so like the track it runs in fastapi's threadpool rather than on the event loop, with its
+    own database session since the global one isn't thread safe.
+    """
+    if image_type not in ["spotlight", "medium", "low"]:
+        raise HTTPException(400, detail="Invalid image type")
+    if end_time <= start_time:
+        raise HTTPException(400, detail="end_time must be after start_time")
+    if end_time - start_time > MAX_VISIBILITY_DURATION:
+        raise HTTPException(400, detail=f"The time range can't be longer than {MAX_VISIBILITY_DURATION.days} days")
+
+    with Session(db_engine) as session:
+        satellite = session.query(Satellite).filter_by(id=id).first()
+        if not satellite:
+            raise HTTPException(404, detail=f"Satellite with id={id} does not exist.")
+
+        state_generator = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=timedelta(seconds=1), precision_policy=get_precision_policy())
+        target = SimpleNamespace(latitude=latitude, longitude=longitude, image_type=image_type)
+        capture_events, = state_generator.capture_events_for_targets(
+            start_time, end_time, [target],
+            ground_track_index=state_generator.ground_track_index(start_time, end_time)
+        )
+    return jsonable_encoder([
+        {"start_time": event_start.utc_datetime(), "end_time": event_end.utc_datetime()}
+        for event_start, event_end in capture_events
+    ])
+
+@router.get("/satellites/{id}/track")
+def get_satellite_track(id: int, start_time: datetime, end_time: datetime, step: float = Query(60.0, gt=0, description="seconds between states"), format: str = Query("json")):
+    """
+    States of the satellite from `start_time` to `end_time`, every `step` seconds, streamed in chunks as they are propagated.
+    - 'json' streams newline-delimited JSON objects, each holding the columns of a chunk (times in microseconds since the unix epoch)
+    - 'binary' streams packed little-endian records, laid out as described by the X-Record-Format header
+    """
+    if format not in ["json", "binary"]:
+        raise HTTPException(400, detail="Invalid format")
+    if end_time <= start_time:
+        raise HTTPException(400, detail="end_time must be after start_time")
+    if (end_time - start_time).total_seconds() / step > MAX_TRACK_STATES:
+        raise HTTPException(400, detail=f"The track can't have more than {MAX_TRACK_STATES} states, use a larger step")
+
+    # this route isn't async so that the streamed chunks are propagated in the thread pool instead of blocking the event loop,
+    # so it loads the satellite with its own session, since the global one isn't thread safe. The satellite is detached
+    # from it, because the chunks are propagated after the session is closed.
+    with Session(db_engine) as session:
+        satellite = session.query(Satellite).filter_by(id=id).first()
+        if not satellite:
+            raise HTTPException(404, detail=f"Satellite with id={id} does not exist.")
+        session.expunge(satellite)
+
+    chunks = SatelliteStateGenerator(satellite).track_chunks(start_time, end_time, timedelta(seconds=step))
+    if format == "binary":
+        return StreamingResponse(
+            (chunk.records().tobytes() for chunk in chunks),
+            media_type="application/octet-stream",
+            headers={"X-Record-Format": json.dumps(STATE_RECORD_DTYPE.descr)}
+        )
+    return StreamingResponse((json.dumps(chunk.columns()) + "\n" for chunk in chunks), media_type="application/x-ndjson")
+
 @router.post("/satellites/create")
 async def new_satellite(tle_file: UploadFile, satellite_form_data: SatelliteCreationRequest):    
     tle_json = tle_file
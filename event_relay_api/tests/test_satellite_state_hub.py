@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import unittest
+from datetime import timedelta
+from event_relay_api.helpers.satellite_state_hub import SatelliteStateHub
+
+
+class FakeConsumer:
+    def __init__(self):
+        self.messages = []
+        self.bound = False
+        self.threads = set() # threads the consumer was used from
+
+    def get_message(self):
+        self.threads.add(threading.get_ident())
+        return self.messages.pop(0) if self.messages else None
+
+    def unbind(self, topic):
+        self.threads.add(threading.get_ident())
+        self.bound = False
+
+
+class RecordingSatelliteStateHub(SatelliteStateHub):
+    def __init__(self, **kwargs):
+        super().__init__(poll_interval=timedelta(milliseconds=1), **kwargs)
+        self.consumer = FakeConsumer()
+        self.published = []
+
+    def _create_consumer(self):
+        self.consumer.bound = True
+        return self.consumer
+
+    def _publish(self, topic, message):
+        self.published.append((topic, message))
+
+
+def batch(time, *satellite_ids):
+    return {"time": time, "states": [{"satellite_id": satellite_id, "time": time} for satellite_id in satellite_ids]}
+
+
+class TestSatelliteStateHub(unittest.IsolatedAsyncioTestCase):
+    async def test_one_listener_per_watched_satellite(self):
+        hub = RecordingSatelliteStateHub()
+        first, second, other = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+        hub.unsubscribe(1, first)
+        hub.unsubscribe(1, first) # already unsubscribed
+        self.assertEqual(hub.client_count(), 2)
+        hub.unsubscribe(1, second)
+        hub.unsubscribe(2, other)
+
+        self.assertEqual(hub.published, [
+            ("satellite.state.listener.create", {"satellite_id": 1}),
+            ("satellite.state.listener.create", {"satellite_id": 2}),
+            ("satellite.state.listener.destroy", {"satellite_id": 1}),
+            ("satellite.state.listener.destroy", {"satellite_id": 2}),
+        ])
+
+    async def test_states_are_broadcast_to_the_clients_of_their_satellite(self):
+        hub = RecordingSatelliteStateHub()
+        clients = [hub.subscribe(1) for _ in range(100)]
+        other = hub.subscribe(2)
+        hub.consumer.messages.append(batch("t0", 1, 3))
+
+        states = await asyncio.wait_for(asyncio.gather(*[client.get() for client in clients]), timeout=1)
+        self.assertEqual(states, [{"satellite_id": 1, "time": "t0"}] * 100)
+        self.assertTrue(other.empty())
+
+    async def test_consumer_runs_off_the_event_loop_and_is_unbound_when_the_last_client_leaves(self):
+        hub = RecordingSatelliteStateHub()
+        client = hub.subscribe(1)
+        hub.consumer.messages.append(batch("t0", 1))
+        self.assertEqual((await asyncio.wait_for(client.get(), timeout=1))["time"], "t0")
+        self.assertTrue(hub.consumer.bound)
+
+        hub.unsubscribe(1, client)
+        await asyncio.wait_for(hub._task, timeout=1)
+        self.assertFalse(hub.consumer.bound)
+        self.assertNotIn(threading.get_ident(), hub.consumer.threads)
+
+    async def test_slow_clients_only_get_the_latest_state(self):
+        hub = RecordingSatelliteStateHub(max_pending=1)
+        slow = hub.subscribe(1)
+        for time in ["t0", "t1", "t2"]:
+            hub.broadcast(batch(time, 1))
+        self.assertEqual(slow.qsize(), 1)
+        self.assertEqual(slow.get_nowait()["time"], "t2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from event_relay_api.helpers.state_timeline_cache import StateTimelineCache
+
+
+class FakeStateTimelineCache(StateTimelineCache):
+    def __init__(self):
+        super().__init__(poll_interval=timedelta(0))
+        self.schedule_changed = False
+        self.load_count = 0
+        self.checkpoints = [
+            (1, datetime(2024, 1, 1, 12, tzinfo=timezone.utc), SimpleNamespace(storage_util=0.5, power_draw=2.0)),
+            (1, datetime(2024, 1, 1, 6, tzinfo=timezone.utc), SimpleNamespace(storage_util=0.1, power_draw=1.0)),
+        ]
+        self.outages = [(1, datetime(2024, 1, 1, 8), datetime(2024, 1, 1, 9)), (1, datetime(2024, 1, 1, 8, 30), datetime(2024, 1, 1, 10))]
+        self.maintenance = [(2, datetime(2024, 1, 1, 7), datetime(2024, 1, 1, 7, 5))]
+
+    def _schedule_changed(self):
+        changed, self.schedule_changed = self.schedule_changed, False
+        return changed
+
+    def _load(self):
+        self.load_count += 1
+        return super()._load()
+
+    def _query_checkpoints(self, session):
+        return self.checkpoints
+
+    def _query_outages(self, session):
+        return self.outages
+
+    def _query_maintenance(self, session):
+        return self.maintenance
+
+
+class ManuallyRefreshedStateTimelineCache(FakeStateTimelineCache):
+    def start(self):
+        self._thread = "refreshed by the test"
+
+
+def state(satellite_id, time):
+    return {"satellite_id": satellite_id, "time": time.isoformat()}
+
+
+class TestStateTimelineCache(unittest.TestCase):
+    def test_enrichment(self):
+        cache = ManuallyRefreshedStateTimelineCache()
+        cache.refresh()
+        before_checkpoints = cache.enrich(state(1, datetime(2024, 1, 1, 5)))
+        self.assertEqual((before_checkpoints["power_draw"], before_checkpoints["storage_utilization"]), (None, None))
+
+        enriched = cache.enrich(state(1, datetime(2024, 1, 1, 9, 30)))
+        self.assertEqual((enriched["power_draw"], enriched["storage_utilization"]), (1.0, 0.1))
+        self.assertTrue(enriched["in_outage"]) # in the second of the overlapping outages
+        self.assertFalse(enriched["in_maintenance"])
+        self.assertEqual(enriched["satellite_id"], 1)
+
+        self.assertFalse(cache.enrich(state(1, datetime(2024, 1, 1, 10)))["in_outage"])
+        self.assertEqual(cache.enrich(state(1, datetime(2024, 1, 1, 12)))["power_draw"], 2.0)
+        self.assertTrue(cache.enrich(state(2, datetime(2024, 1, 1, 7, 1)))["in_maintenance"])
+        self.assertFalse(cache.enrich(state(3, datetime(2024, 1, 1, 7, 1)))["in_maintenance"])
+        self.assertEqual(cache.load_count, 1)
+
+    def test_reloaded_when_the_schedule_changes(self):
+        cache = ManuallyRefreshedStateTimelineCache()
+        cache.refresh()
+        self.assertFalse(cache.enrich(state(1, datetime(2024, 1, 2)))["in_outage"])
+        cache.outages.append((1, datetime(2024, 1, 2), datetime(2024, 1, 3)))
+        cache.refresh()
+        self.assertFalse(cache.enrich(state(1, datetime(2024, 1, 2)))["in_outage"])
+
+        cache.schedule_changed = True
+        cache.refresh()
+        self.assertTrue(cache.enrich(state(1, datetime(2024, 1, 2)))["in_outage"])
+        self.assertEqual(cache.load_count, 2)
+
+    def test_enrichment_only_reads_the_snapshot_refreshed_in_the_background(self):
+        cache = FakeStateTimelineCache()
+        release, loaded = threading.Event(), threading.Event()
+        load = cache._load
+        def load_on_the_background_thread():
+            self.assertNotEqual(threading.current_thread(), threading.main_thread())
+            release.wait(timeout=1)
+            timelines = load()
+            loaded.set()
+            return timelines
+        cache._load = load_on_the_background_thread
+
+        enriched = cache.enrich(state(1, datetime(2024, 1, 1, 9, 30))) # starts the refreshes, without waiting for the first snapshot
+        self.assertEqual(enriched["power_draw"], None)
+        release.set()
+        self.assertTrue(loaded.wait(timeout=1))
+        self.assertTrue(cache.enrich(state(1, datetime(2024, 1, 1, 9, 30)))["in_outage"])
+        cache.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,6 @@ if __name__ == '__main__':
     celery_app.control.purge()
 
     worker = celery_app.Worker(
-        include=['satellite_state.tasks'],
         loglevel=log_level,
         pool='solo',
     )
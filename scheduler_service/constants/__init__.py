@@ -1 +1 @@
-from .constants import EARTH_RADIUS, get_ephemeris
\ No newline at end of file
+from .constants import EARTH_RADIUS, EARTH_ROTATION_PER_MINUTE, get_ephemeris, get_timescale
\ No newline at end of file
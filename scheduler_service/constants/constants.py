@@ -2,6 +2,7 @@ from skyfield.api import load
 import os
 
 EARTH_RADIUS = 6378.137
+EARTH_ROTATION_PER_MINUTE = 7.292115e-5 * 60 # radians
 
 _de421_bsp = None
 def get_ephemeris():
@@ -12,4 +13,12 @@ def get_ephemeris():
         # Construct the path to the de421.bsp file
         bsp_path = os.path.join(dir_path, 'de421.bsp')
         _de421_bsp = load(bsp_path)
-    return _de421_bsp
\ No newline at end of file
+    return _de421_bsp
+
+_timescale = None
+def get_timescale():
+    # loading the timescale parses the leap second and delta T tables, so the whole process shares a single one
+    global _timescale
+    if _timescale is None:
+        _timescale = load.timescale()
+    return _timescale
@@ -1,9 +1,131 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from app_config import get_db_session, logging
+from app_config.database.mapping import Schedule, ScheduleRequest
+from scheduler_service.event_processing.capture_opportunities import ensure_capture_opportunities_populated
 from scheduler_service.event_processing.contact_events import ensure_contact_events_populated
 from scheduler_service.event_processing.eclipse_events import ensure_eclipse_events_populated
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import multiprocessing
+from typing import Optional
+import time
+import os
 
-scheduler = BackgroundScheduler()
+logger = logging.getLogger(__name__)
 
-# scheduler.add_job(ensure_eclipse_events_populated(), 'interval', hours=1)
 
-# scheduler.add_job(ensure_contact_events_populated(), 'interval', hours=1)
\ No newline at end of file
+@dataclass
+class PrecomputeProgress:
+    horizon_start: datetime
+    horizon_end: datetime
+    total_slices: int
+    completed_slices: int = 0
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def fraction(self) -> float:
+        return self.completed_slices / self.total_slices if self.total_slices > 0 else 1.0
+
+
+class StaticEventPrecomputer:
+    """
+    Keeps the eclipses, contacts and capture opportunities (of the orders with requests in the horizon) populated from
+    now to `horizon` ahead, so that requests arriving within the horizon find their static events already computed.
+    The horizon is populated in slices of `slice_duration`, nearest first. Each slice only locks its own processing blocks,
+    and a slice isn't started while a request is being scheduled, so the precomputation stays out of the way of the
+    scheduling path, which populates whatever it needs itself. A run waits for requests for at most `max_request_wait`
+    in total, and requests that have been processing for longer than that (e.g. left over from a crash) aren't waited for.
+    Blocks that were already processed are skipped, so every run only computes the part of the horizon that rolled in since the last one.
+    """
+    def __init__(self, horizon: timedelta = timedelta(days=14), slice_duration: timedelta = timedelta(days=1), workers: int = 1, max_request_wait: timedelta = timedelta(minutes=10)):
+        self.horizon = horizon
+        self.slice_duration = slice_duration
+        self.workers = workers
+        self.max_request_wait = max_request_wait
+        self.progress: Optional[PrecomputeProgress] = None
+        self._processing_since = dict() # map from the id of a request being processed -> when it was first seen processing
+
+    def run(self, now: Optional[datetime] = None) -> PrecomputeProgress:
+        now = now or self._current_time()
+        slices = time_slices(now, now + self.horizon, self.slice_duration)
+        self.progress = PrecomputeProgress(horizon_start=now, horizon_end=now + self.horizon, total_slices=len(slices), started_at=datetime.now())
+        wait_deadline = time.monotonic() + self.max_request_wait.total_seconds()
+
+        for slice_start, slice_end in slices:
+            self._wait_for_requests(wait_deadline)
+            try:
+                # blocks that a request is already populating are left to it
+                ensure_eclipse_events_populated(slice_start, slice_end, skip_locked=True)
+                ensure_contact_events_populated(slice_start, slice_end, workers=self.workers, skip_locked=True)
+                ensure_capture_opportunities_populated(slice_start, slice_end, workers=self.workers, skip_locked=True)
+            except Exception:
+                get_db_session().rollback() # release the locks on the slice's processing blocks
+                raise
+            self.progress.completed_slices += 1
+            logger.info(f"Precomputed static events up to {slice_end} ({self.progress.completed_slices}/{self.progress.total_slices} slices, {datetime.now() - self.progress.started_at} elapsed).")
+
+        self.progress.finished_at = datetime.now()
+        return self.progress
+
+    def _wait_for_requests(self, deadline: float):
+        while self._requests_in_progress() and time.monotonic() < deadline:
+            time.sleep(1)
+
+    def _requests_in_progress(self) -> bool:
+        """
+        Whether a request is being scheduled, ignoring the requests seen processing for longer than `max_request_wait`
+        """
+        now = time.monotonic()
+        self._processing_since = {request_id: self._processing_since.get(request_id, now) for request_id in self._processing_request_ids()}
+        return any(now - since < self.max_request_wait.total_seconds() for since in self._processing_since.values())
+
+    def _processing_request_ids(self) -> list:
+        session = get_db_session()
+        request_ids = [request_id for request_id, in session.query(ScheduleRequest.id).filter(ScheduleRequest.status=="processing")]
+        session.commit() # don't keep a transaction open while waiting
+        return request_ids
+
+    def _current_time(self) -> datetime:
+        # same clock as the scheduler, which can be offset from the real time by the default schedule
+        schedule = get_db_session().query(Schedule).filter_by(id=0).one()
+        return datetime.now() + schedule.time_offset
+
+
+def time_slices(start_time: datetime, end_time: datetime, slice_duration: timedelta) -> list:
+    slices = []
+    while start_time < end_time:
+        slices.append((start_time, min(start_time + slice_duration, end_time)))
+        start_time += slice_duration
+    return slices
+
+
+precompute_process = None
+def ensure_static_event_precompute_running():
+    """
+    Start the static event precomputation in its own process, unless PRECOMPUTE_HORIZON_DAYS is 0.
+    The process is spawned rather than forked, so it opens its own database session and rabbit connection instead of
+    inheriting the ones this process is using, and it isn't daemonic, since it starts the capture and contact worker pools.
+    """
+    global precompute_process
+    if float(os.getenv("PRECOMPUTE_HORIZON_DAYS", 14)) <= 0: return
+    if precompute_process is None or not precompute_process.is_alive():
+        precompute_process = multiprocessing.get_context('spawn').Process(target=static_event_precompute_task, name="static-event-precompute")
+        precompute_process.start()
+        logger.info("Static event precompute process started.")
+
+def static_event_precompute_task():
+    """
+    Runs the precomputation every PRECOMPUTE_INTERVAL_MINUTES over the next PRECOMPUTE_HORIZON_DAYS, in slices of
+    PRECOMPUTE_SLICE_HOURS. The process (and its worker pool, which inherits it) runs at the lower priority PRECOMPUTE_NICENESS,
+    with PRECOMPUTE_WORKERS workers (half the cores by default), so the scheduling path keeps the rest of the machine.
+    """
+    os.nice(int(os.getenv("PRECOMPUTE_NICENESS", 10)))
+    precomputer = StaticEventPrecomputer(
+        horizon=timedelta(days=float(os.getenv("PRECOMPUTE_HORIZON_DAYS", 14))),
+        slice_duration=timedelta(hours=float(os.getenv("PRECOMPUTE_SLICE_HOURS", 24))),
+        workers=max(1, int(os.getenv("PRECOMPUTE_WORKERS", (os.cpu_count() or 2) // 2)))
+    )
+    scheduler = BlockingScheduler()
+    logging.getLogger("apscheduler").propagate = False
+    scheduler.add_job(precomputer.run, 'interval', minutes=float(os.getenv("PRECOMPUTE_INTERVAL_MINUTES", 60)), next_run_time=datetime.now(), max_instances=1, coalesce=True)
+    scheduler.start()
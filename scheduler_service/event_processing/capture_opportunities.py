@@ -1,12 +1,11 @@
 from datetime import datetime
-from scheduler_service.event_processing.utils import retrieve_and_lock_unprocessed_blocks_for_processing
-from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.event_processing.utils import retrieve_and_lock_unprocessed_blocks_for_processing, group_overlapping_blocks, merge_event_intervals
+from scheduler_service.event_processing.capture_workers import create_capture_tasks, run_capture_tasks, max_targets_per_task, capture_worker_count, capture_worker_memory_budget
+from scheduler_service.satellite_state.feasibility import can_ever_capture
 from app_config.database.mapping import Satellite, CaptureProcessingBlock, CaptureOpportunity, ScheduleRequest, ImageOrder
 from app_config import get_db_session
 from sqlalchemy import func, or_, distinct, exists, tuple_, true, and_
 from datetime import datetime, timedelta
-import concurrent.futures
-import loky
 from typing import Optional
 
 class SerializableCaptureProcessingBlock:
@@ -18,16 +17,7 @@ class SerializableCaptureProcessingBlock:
         self.longitude = longitude
         self.time_range = time_range
 
-class SerializableCaptureOpportunity:
-    def __init__(self, asset_id: int, image_type: str, latitude: float, longitude: float, start_time: datetime, duration: timedelta):
-        self.asset_id = asset_id
-        self.image_type = image_type
-        self.latitude = latitude
-        self.longitude = longitude
-        self.start_time = start_time
-        self.duration = duration
-
-def ensure_capture_opportunities_populated(start_time: datetime, end_time: datetime, order_id: Optional[int] = None):
+def ensure_capture_opportunities_populated(start_time: datetime, end_time: datetime, order_id: Optional[int] = None, workers: Optional[int] = None, skip_locked: bool = False):
     session = get_db_session()
 
     processing_block_filters = []
@@ -66,50 +56,60 @@ def ensure_capture_opportunities_populated(start_time: datetime, end_time: datet
             CaptureProcessingBlock.longitude
         ],
         filters=processing_block_filters,
-        valid_partition_values_subquery=all_satellite_capture_combinations
+        valid_partition_values_subquery=all_satellite_capture_combinations,
+        skip_locked=skip_locked
     )
 
-    processed_block_ids = []
     if len(blocks_to_process)==0: return
-    if len(blocks_to_process)==1:
-        block_id, opportunities = calculate_capture_opportunities(serializable_blocks[0])
-        capture_opportunities = [CaptureOpportunity(
-            asset_id=opportunity.asset_id,
-            image_type=opportunity.image_type,
-            latitude=opportunity.latitude,
-            longitude=opportunity.longitude,
-            start_time=opportunity.start_time,
-            duration=opportunity.duration
-        ) for opportunity in opportunities]
-        session.add(capture_opportunities)
-        processed_block_ids.append(block_id)
-    else:
-        with loky.ProcessPoolExecutor(max_workers=4) as executor:
-            serializable_blocks = [
-                SerializableCaptureProcessingBlock(
-                    id=block.id,
-                    satellite_id=block.satellite_id,
-                    image_type=block.image_type,
-                    latitude=block.latitude,
-                    longitude=block.longitude,
-                    time_range=block.time_range
-                ) for block in blocks_to_process
-            ]
-            result_set = map(calculate_capture_opportunities, serializable_blocks) #i keep running out of memory. ditching multiprocessing for now
-            for block_id, opportunities in result_set:
-                capture_opportunities = [
-                    CaptureOpportunity(
-                        asset_id=opportunity.asset_id,
-                        image_type=opportunity.image_type,
-                        latitude=opportunity.latitude,
-                        longitude=opportunity.longitude,
-                        start_time=opportunity.start_time,
-                        duration=opportunity.duration
-                    ) for opportunity in opportunities
-                ]
-                session.add_all(capture_opportunities)
-                processed_block_ids.append(block_id)
 
+    serializable_blocks = [
+        SerializableCaptureProcessingBlock(
+            id=block.id,
+            satellite_id=block.satellite_id,
+            image_type=block.image_type,
+            latitude=block.latitude,
+            longitude=block.longitude,
+            time_range=block.time_range
+        ) for block in blocks_to_process
+    ]
+
+    # targets outside the band of latitudes the satellite can see have no capture opportunities, so their blocks are processed without propagating
+    satellites = {satellite.id: satellite for satellite in session.query(Satellite).filter(Satellite.id.in_({block.satellite_id for block in serializable_blocks}))}
+    processed_block_ids = []
+    feasible_blocks = []
+    for block in serializable_blocks:
+        if can_ever_capture(satellites[block.satellite_id], block.latitude, block.image_type):
+            feasible_blocks.append(block)
+        else:
+            processed_block_ids.append(block.id)
+
+    # group the blocks by satellite, so that each satellite is only propagated once for all of its targets
+    blocks_by_satellite = dict() # satellite_id -> list of blocks
+    for block in feasible_blocks:
+        blocks_by_satellite.setdefault(block.satellite_id, []).append(block)
+
+    # each satellite's overlapping blocks are split into tasks small enough for a worker's memory budget. Workers only
+    # propagate and return compact arrays of opportunity times, all the database work is done here in bulk
+    workers = workers or capture_worker_count()
+    days_per_target = sum((block.time_range.upper - block.time_range.lower) / timedelta(days=1) for block in feasible_blocks) / max(len(feasible_blocks), 1)
+    max_targets = max_targets_per_task(len(feasible_blocks), days_per_target, workers, capture_worker_memory_budget())
+    tasks = [
+        task
+        for satellite_id, blocks in blocks_by_satellite.items()
+        for block_group in group_overlapping_blocks(blocks)
+        for task in create_capture_tasks(satellites[satellite_id], block_group, max_targets)
+    ]
+
+    blocks_by_id = {block.id: block for block in feasible_blocks}
+    capture_opportunities = [] # (satellite id, image type, latitude, longitude), start, end
+    for capture_windows in run_capture_tasks(tasks, workers):
+        for block_id, event_start, event_end in capture_windows.intervals():
+            block = blocks_by_id[block_id]
+            capture_opportunities.append(((block.satellite_id, block.image_type, block.latitude, block.longitude), event_start, event_end))
+        processed_block_ids.extend(int(block_id) for block_id in capture_windows.block_ids)
+
+    # merge opportunities that either overlap, or are contiguous with existing opportunities, all at once
+    merge_event_intervals(CaptureOpportunity, ['asset_id', 'image_type', 'latitude', 'longitude'], capture_opportunities)
     session.query(CaptureProcessingBlock).filter(
         CaptureProcessingBlock.id.in_(processed_block_ids)
     ).update(
@@ -118,58 +118,3 @@ def ensure_capture_opportunities_populated(start_time: datetime, end_time: datet
     )
     session.commit()
     session.rollback() # just making extra sure all locks are released
-
-    
-def calculate_capture_opportunities(block):
-    session = get_db_session()
-    capture_opportunities = []
-    state_generators = dict() # satellite_id -> satellite_state_generator
-    # Find and insert all eclipse events that occur within the time range of the processing block
-    if block.satellite_id not in state_generators:
-        satellite = session.query(Satellite).filter_by(id=block.satellite_id).first()
-        state_generators[block.satellite_id] = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10))
-    
-    state_generator = state_generators[block.satellite_id]
-    event_time_ranges = state_generator.capture_events(
-        block.time_range.lower,
-        block.time_range.upper,
-        block
-    )
-
-    # merge events that either overlap, or are contiguous, and create the appropriate events
-    for event_start, event_end in event_time_ranges:
-        event_start = event_start.utc_datetime().replace(tzinfo=None) # remove time zone info to compare with utc_time_range column which is tsrange type (doesn't have timezone info)
-        event_end = event_end.utc_datetime().replace(tzinfo=None)
-
-        merged_events = session.query(CaptureOpportunity).filter(
-            CaptureOpportunity.asset_id == block.satellite_id,
-            CaptureOpportunity.image_type == block.image_type,
-            CaptureOpportunity.latitude == block.latitude,
-            CaptureOpportunity.longitude == block.longitude,
-            or_(
-                CaptureOpportunity.utc_time_range.op('&&')(func.tsrange(event_start, event_end)), # if the eclipse overlaps with our eclipse
-                func.lower(CaptureOpportunity.utc_time_range) == event_end, # if the eclipse starts where our eclipse ends
-                func.upper(CaptureOpportunity.utc_time_range) == event_start # if the eclipse ends where our eclipse starts
-            )
-        ).all()
-
-        if merged_events:
-            min_overlapping_start = min([event.utc_time_range.lower for event in merged_events])
-            max_overlapping_end = max([event.utc_time_range.upper for event in merged_events])
-            # update capture opportunity start and end to encompass all continuous/overlapping eclipses
-            event_start = min(event_start, min_overlapping_start)
-            event_end = max(event_end, max_overlapping_end) 
-
-        # first delete overlapping events
-        for event in merged_events:
-            session.delete(event)
-        # then add the event encompassing them all
-        capture_opportunities.append(SerializableCaptureOpportunity(
-            asset_id=block.satellite_id,
-            image_type=block.image_type,
-            latitude=block.latitude,
-            longitude=block.longitude,
-            start_time=event_start,
-            duration=event_end - event_start
-        ))
-    return block.id, capture_opportunities
\ No newline at end of file
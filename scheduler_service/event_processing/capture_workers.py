@@ -0,0 +1,116 @@
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.satellite_state.precision_policy import get_precision_policy
+from scheduler_service.satellite_state.kernels import datetime_from_epoch_microseconds, naive_epoch_microseconds
+from scheduler_service.event_processing.workers import EventWindows, run_event_tasks, worker_count
+from dataclasses import dataclass
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+import numpy as np
+import math
+import os
+
+# rough working set of one target over one day of its time range: a day of 10 second samples, times the handful of float64
+# arrays the capture search keeps per sample. It overestimates searches that use a ground track index, which only test the samples near the target.
+_BYTES_PER_TARGET_DAY = 8640 * 8 * 8
+
+
+@dataclass
+class CaptureTask:
+    """
+    Everything a worker needs to search the capture opportunities of a batch of targets of one satellite, whose time
+    ranges overlap. Times are integer microseconds since the unix epoch (UTC), so tasks are cheap to send to the workers.
+    """
+    satellite_id: int
+    name: str
+    line1: str
+    line2: str
+    fov: float
+    block_ids: np.ndarray # int64
+    image_types: list
+    latitude: np.ndarray # float64
+    longitude: np.ndarray # float64
+    range_start: np.ndarray # int64
+    range_end: np.ndarray # int64
+
+
+def compute_capture_windows(task: CaptureTask) -> EventWindows:
+    """
+    Search the capture opportunities of a task. Only propagates the satellite, so it can run in a worker process
+    without a database session.
+    """
+    satellite = SimpleNamespace(id=task.satellite_id, name=task.name, tle={"line1": task.line1, "line2": task.line2}, fov=task.fov)
+    state_generator = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=timedelta(seconds=1), precision_policy=get_precision_policy())
+
+    targets = [
+        SimpleNamespace(latitude=float(latitude), longitude=float(longitude), image_type=image_type)
+        for latitude, longitude, image_type in zip(task.latitude, task.longitude, task.image_types)
+    ]
+    time_ranges = [
+        (datetime_from_epoch_microseconds(start), datetime_from_epoch_microseconds(end))
+        for start, end in zip(task.range_start, task.range_end)
+    ]
+    task_start = datetime_from_epoch_microseconds(task.range_start.min())
+    task_end = datetime_from_epoch_microseconds(task.range_end.max())
+    event_time_ranges_per_target = state_generator.capture_events_for_targets(
+        task_start,
+        task_end,
+        targets,
+        time_ranges=time_ranges,
+        ground_track_index=state_generator.ground_track_index(task_start, task_end)
+    )
+
+    return EventWindows.from_events(task.block_ids, event_time_ranges_per_target)
+
+
+def create_capture_tasks(satellite, block_group: list, max_targets: int) -> list:
+    """
+    Split a group of overlapping processing blocks of `satellite` into tasks of at most `max_targets` targets
+    """
+    tasks = []
+    for batch_start in range(0, len(block_group), max(1, max_targets)):
+        batch = block_group[batch_start:batch_start + max(1, max_targets)]
+        tasks.append(CaptureTask(
+            satellite_id=satellite.id,
+            name=satellite.name,
+            line1=satellite.tle["line1"],
+            line2=satellite.tle["line2"],
+            fov=satellite.fov,
+            block_ids=np.array([block.id for block in batch], dtype=np.int64),
+            image_types=[block.image_type for block in batch],
+            latitude=np.array([block.latitude for block in batch], dtype=np.float64),
+            longitude=np.array([block.longitude for block in batch], dtype=np.float64),
+            range_start=np.array([naive_epoch_microseconds(block.time_range.lower) for block in batch], dtype=np.int64),
+            range_end=np.array([naive_epoch_microseconds(block.time_range.upper) for block in batch], dtype=np.int64)
+        ))
+    return tasks
+
+
+def max_targets_per_task(num_targets: int, days_per_target: float, workers: int, memory_budget: int) -> int:
+    """
+    Number of targets per task that keeps a task's working set within a worker's `memory_budget` (bytes), while still
+    making at least one task per worker so that every worker has something to do
+    """
+    within_budget = int(memory_budget // (_BYTES_PER_TARGET_DAY * max(days_per_target, 1.0)))
+    per_worker = math.ceil(num_targets / max(workers, 1))
+    return max(1, min(within_budget, per_worker))
+
+
+def run_capture_tasks(tasks: Iterable[CaptureTask], workers: int) -> Iterator[EventWindows]:
+    """
+    Run the tasks in a pool of `workers` processes, or in this process if there is a single worker
+    """
+    return run_event_tasks(compute_capture_windows, tasks, workers)
+
+
+def capture_worker_count() -> int:
+    """
+    Number of worker processes for capture searches, CAPTURE_WORKERS or every core by default
+    """
+    return worker_count("CAPTURE_WORKERS")
+
+def capture_worker_memory_budget() -> int:
+    """
+    Memory each capture worker may use for its task in bytes, from CAPTURE_WORKER_MEMORY_MB (512 by default)
+    """
+    return int(float(os.getenv("CAPTURE_WORKER_MEMORY_MB", 512)) * 1024 * 1024)
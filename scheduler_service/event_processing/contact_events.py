@@ -4,10 +4,18 @@ from skyfield.api import load, Topos, EarthSatellite
 from sqlalchemy import func, or_, true
 from app_config import get_db_session
 from app_config.database.mapping import ContactProcessingBlock, ContactEvent, Satellite, GroundStation
-from .utils import retrieve_and_lock_unprocessed_blocks_for_processing
-from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from .utils import retrieve_and_lock_unprocessed_blocks_for_processing, group_overlapping_blocks, merge_event_intervals
+from .contact_workers import create_contact_task, run_contact_tasks, contact_worker_count
+from scheduler_service.satellite_state.feasibility import can_ever_contact
+from scheduler_service.constants import get_timescale
+from typing import Optional
 
-def ensure_contact_events_populated(start_time: datetime, end_time: datetime):
+def ensure_contact_events_populated(start_time: datetime, end_time: datetime, workers: Optional[int] = None, skip_locked: bool = False):
+    """
+    Find the contact events of every unprocessed contact processing block in the time range, with `workers` processes
+    (CONTACT_WORKERS or every core by default), and merge them into the database in one batch.
+    With `skip_locked`, blocks that another worker is processing are left to it instead of waited for.
+    """
     session = get_db_session()
     all_satellite_groundstation_combinations_subquery = session.query(
         Satellite.id.label("satellite_id"),
@@ -20,63 +28,44 @@ def ensure_contact_events_populated(start_time: datetime, end_time: datetime):
             ContactProcessingBlock.satellite_id,
             ContactProcessingBlock.groundstation_id
         ],
-        valid_partition_values_subquery=all_satellite_groundstation_combinations_subquery
+        valid_partition_values_subquery=all_satellite_groundstation_combinations_subquery,
+        skip_locked=skip_locked
     )
 
-    contact_events = []
-    state_generators = dict() # satellite_id -> satellite_state_generator
-    groundstations = dict() # groundstation_id -> groundstation
+    # group the blocks by satellite, so that each satellite is only propagated once for all of its ground stations
+    blocks_by_satellite = dict() # satellite_id -> list of blocks
     for block in blocks_to_process:
-        # Find and insert all eclipse events that occur within the time range of the processing block
-        if block.satellite_id not in state_generators:
-            satellite = session.query(Satellite).filter_by(id=block.satellite_id).first()
-            state_generators[block.satellite_id] = SatelliteStateGenerator(satellite)
-        if block.groundstation_id not in groundstations:
-            groundstation = session.query(GroundStation).filter_by(id=block.groundstation_id).first()
-            groundstations[block.groundstation_id] = groundstation
-        
-        state_generator = state_generators[block.satellite_id]
-        event_time_ranges = state_generator.contact_events(block.time_range.lower, block.time_range.upper, groundstations[block.groundstation_id])
+        blocks_by_satellite.setdefault(block.satellite_id, []).append(block)
 
-        # merge events that either overlap, or are contiguous, and create the appropriate events
-        for event_start, event_end in event_time_ranges:
-            event_start = event_start.utc_datetime().replace(tzinfo=None) # remove time zone info to compare with utc_time_range column which is tsrange type (doesn't have timezone info)
-            event_end = event_end.utc_datetime().replace(tzinfo=None)
+    satellites = {satellite.id: satellite for satellite in session.query(Satellite).filter(Satellite.id.in_(blocks_by_satellite.keys()))}
+    groundstations = {
+        groundstation.id: groundstation
+        for groundstation in session.query(GroundStation).filter(GroundStation.id.in_({block.groundstation_id for block in blocks_to_process}))
+    }
 
-            merged_events = session.query(ContactEvent).filter(
-                ContactEvent.asset_id == block.satellite_id,
-                ContactEvent.groundstation_id == block.groundstation_id,
-                or_(
-                    ContactEvent.utc_time_range.op('&&')(func.tsrange(event_start, event_end)), # if the eclipse overlaps with our eclipse
-                    func.lower(ContactEvent.utc_time_range) == event_end, # if the eclipse starts where our eclipse ends
-                    func.upper(ContactEvent.utc_time_range) == event_start # if the eclipse ends where our eclipse starts
-                )
-            ).all()
+    # each satellite's overlapping blocks are searched together by one task, so the satellite is propagated once for all of
+    # its ground stations. Workers only propagate, the blocks stay locked by this session until the events are merged below
+    tasks = []
+    for satellite_id, satellite_blocks in blocks_by_satellite.items():
+        satellite = satellites[satellite_id]
+        # ground stations the orbit never rises above the mask of have no contact events, so their blocks are processed without propagating
+        satellite_blocks = [block for block in satellite_blocks if can_ever_contact(satellite, groundstations[block.groundstation_id])]
+        tasks.extend(create_contact_task(satellite, block_group, groundstations) for block_group in group_overlapping_blocks(satellite_blocks))
 
-            if merged_events:
-                min_overlapping_start = min([event.utc_time_range.lower for event in merged_events])
-                max_overlapping_end = max([event.utc_time_range.upper for event in merged_events])
-                # update eclipse start and end to encompass all continuous/overlapping eclipses
-                event_start = min(event_start, min_overlapping_start)
-                event_end = max(event_end, max_overlapping_end) 
+    blocks_by_id = {block.id: block for block in blocks_to_process}
+    contact_events = [] # (satellite id, groundstation id), start, end
+    for contact_windows in run_contact_tasks(tasks, workers or contact_worker_count()):
+        for block_id, event_start, event_end in contact_windows.intervals():
+            block = blocks_by_id[block_id]
+            contact_events.append(((block.satellite_id, block.groundstation_id), event_start, event_end))
 
-            # first delete overlapping events
-            for event in merged_events:
-                session.delete(event)
-            # then add the event encompassing them all
-            contact_events.append(ContactEvent(
-                asset_id=block.satellite_id,
-                groundstation_id=block.groundstation_id,
-                start_time=event_start,
-                duration=event_end - event_start,
-            ))
-    
-    session.add_all(contact_events)
+    # merge events that either overlap, or are contiguous with existing events, all at once
+    merge_event_intervals(ContactEvent, ['asset_id', 'groundstation_id'], contact_events)
     # update blocks_to_proces state to 'processed' using batch update
     for block in blocks_to_process:
         block.status = 'processed'
     session.commit() # releases lock on processing blocks
-        
+
 
 def contact_update(start_time: datetime, end_time: datetime, satellite):
     """
@@ -86,7 +75,7 @@ def contact_update(start_time: datetime, end_time: datetime, satellite):
 
     while start_time < end_time:
         
-        current_time_skyfield = load.timescale().utc(start_time.year, start_time.month, start_time.day, start_time.hour, start_time.minute, start_time.second)
+        current_time_skyfield = get_timescale().utc(start_time.year, start_time.month, start_time.day, start_time.hour, start_time.minute, start_time.second)
         session = get_db_session()
         ground_stations_list = session.query(GroundStation).all()
         satellite_access = {ground_station.name: None for ground_station in ground_stations_list}  
@@ -0,0 +1,84 @@
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.satellite_state.precision_policy import get_precision_policy
+from scheduler_service.satellite_state.kernels import datetime_from_epoch_microseconds, naive_epoch_microseconds
+from scheduler_service.event_processing.workers import EventWindows, run_event_tasks, worker_count
+from dataclasses import dataclass
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+import numpy as np
+
+
+@dataclass
+class ContactTask:
+    """
+    Everything a worker needs to search the contact events of one satellite with a group of ground stations, whose
+    processing blocks overlap. Times are integer microseconds since the unix epoch (UTC).
+    """
+    satellite_id: int
+    name: str
+    line1: str
+    line2: str
+    block_ids: np.ndarray # int64
+    latitude: np.ndarray # float64, of each block's ground station
+    longitude: np.ndarray # float64
+    send_mask: np.ndarray # float64
+    range_start: np.ndarray # int64
+    range_end: np.ndarray # int64
+
+
+def compute_contact_windows(task: ContactTask) -> EventWindows:
+    """
+    Search the contact events of a task. Only propagates the satellite, so it can run in a worker process
+    without a database session.
+    """
+    satellite = SimpleNamespace(id=task.satellite_id, name=task.name, tle={"line1": task.line1, "line2": task.line2})
+    state_generator = SatelliteStateGenerator(satellite, tolerance=timedelta(seconds=1), precision_policy=get_precision_policy())
+
+    groundstations = [
+        SimpleNamespace(latitude=float(latitude), longitude=float(longitude), send_mask=float(send_mask))
+        for latitude, longitude, send_mask in zip(task.latitude, task.longitude, task.send_mask)
+    ]
+    event_time_ranges_per_block = state_generator.contact_events_for_groundstations(
+        datetime_from_epoch_microseconds(task.range_start.min()),
+        datetime_from_epoch_microseconds(task.range_end.max()),
+        groundstations,
+        time_ranges=[
+            (datetime_from_epoch_microseconds(start), datetime_from_epoch_microseconds(end))
+            for start, end in zip(task.range_start, task.range_end)
+        ]
+    )
+    return EventWindows.from_events(task.block_ids, event_time_ranges_per_block)
+
+
+def create_contact_task(satellite, block_group: list, groundstations: dict) -> ContactTask:
+    """
+    Task searching a group of overlapping processing blocks of `satellite`. `groundstations` maps the blocks' ground station ids to ground stations.
+    """
+    block_groundstations = [groundstations[block.groundstation_id] for block in block_group]
+    return ContactTask(
+        satellite_id=satellite.id,
+        name=satellite.name,
+        line1=satellite.tle["line1"],
+        line2=satellite.tle["line2"],
+        block_ids=np.array([block.id for block in block_group], dtype=np.int64),
+        latitude=np.array([groundstation.latitude for groundstation in block_groundstations], dtype=np.float64),
+        longitude=np.array([groundstation.longitude for groundstation in block_groundstations], dtype=np.float64),
+        send_mask=np.array([groundstation.send_mask for groundstation in block_groundstations], dtype=np.float64),
+        range_start=np.array([naive_epoch_microseconds(block.time_range.lower) for block in block_group], dtype=np.int64),
+        range_end=np.array([naive_epoch_microseconds(block.time_range.upper) for block in block_group], dtype=np.int64)
+    )
+
+
+def run_contact_tasks(tasks: Iterable[ContactTask], workers: int) -> Iterator[EventWindows]:
+    """
+    Run the tasks in a pool of `workers` processes, or in this process if there is a single worker
+    """
+    return run_event_tasks(compute_contact_windows, tasks, workers)
+
+
+def contact_worker_count() -> int:
+    """
+    Number of worker processes for contact searches, CONTACT_WORKERS or every core by default
+    """
+    return worker_count("CONTACT_WORKERS")
@@ -1,29 +1,68 @@
-from typing import List, Optional, Any, Union, Callable, Type
-from datetime import datetime
-from sqlalchemy import Column, func, union, insert, and_, not_, select, column, case, or_
-from sqlalchemy.exc import IntegrityError
+from typing import List, Optional, Any, Union, Callable, Type, Tuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Column, func, union, union_all, insert, delete, and_, not_, select, column, case, or_, text, true, values, cast, literal, Integer, DateTime, Text, table as sql_table
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.sql import Alias
-import time
+import os
 
-from app_config import get_db_session
+from app_config import get_db_session, logging
 from scheduler_service.schedulers.utils import query_gaps
 
+logger = logging.getLogger(__name__)
+
+_TILE_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 def retrieve_and_lock_unprocessed_blocks_for_processing(
         start_time: datetime,
         end_time: datetime,
         processing_block_table: Any, # orm-mapped table class
         partition_column_names: List[str],
         valid_partition_values_subquery,
-        filters = []
+        filters = [],
+        tile_duration: Optional[timedelta] = None,
+        skip_locked: bool = False
 ):
     """
     Retrieves unprocessed blocks from the database if they exist, and creates them if they don't
+    In aligned tile mode (`tile_duration`, PROCESSING_TILE_HOURS by default), blocks are whole tiles of a fixed grid
+    aligned on the unix epoch (UTC day boundaries by default). The tiles covering the time range are known up front, so
+    they are created with a single insert that skips the ones that exist, and retrieved by their tile number instead of
+    searching for gaps between arbitrary blocks. A `tile_duration` of zero creates blocks for the exact gaps instead.
+    Blocks locked by another worker are waited for, so the events of the whole time range are populated once the caller commits.
+    With `skip_locked`, they are skipped instead, so that concurrent workers each claim a disjoint set of blocks
+    (for callers that only populate events, and don't need them right away).
     WARNING: This function locks some rows in the database and doesn't release the lock until the transaction is committed. Make sure to commit to the database soon after calling this function to release lock.
     """
     session = get_db_session()
 
     if partition_column_names and type(partition_column_names[0]) != str:
         partition_column_names = [col.name for col in partition_column_names]
+
+    tile_duration = processing_tile_duration() if tile_duration is None else tile_duration
+    if tile_duration and valid_partition_values_subquery is not None and _has_tile_column(processing_block_table):
+        tiles = tiles_covering(start_time, end_time, tile_duration)
+        start_time, end_time = tile_time_range(tiles.start, tile_duration)[0], tile_time_range(tiles.stop - 1, tile_duration)[1]
+        if not _insert_missing_tiles(processing_block_table, partition_column_names, valid_partition_values_subquery, tiles, tile_duration):
+            # blocks created before tiles (see database_scripts/migrations/aligned_processing_tiles.sql) are in the way of
+            # some tiles, so the rest of those tiles is covered with blocks for the exact gaps
+            _insert_gap_blocks(start_time, end_time, processing_block_table, partition_column_names, valid_partition_values_subquery, filters)
+        overlaps_time_range = or_(
+            processing_block_table.tile.in_(list(tiles)),
+            and_(processing_block_table.tile == None, processing_block_table.time_range.op('&&')(func.tstzrange(start_time, end_time)))
+        )
+    else:
+        _insert_gap_blocks(start_time, end_time, processing_block_table, partition_column_names, valid_partition_values_subquery, filters)
+        overlaps_time_range = processing_block_table.time_range.op('&&')(func.tstzrange(start_time, end_time))
+
+    # query all processing blocks whose state are 'processing' and whose time range overlaps with the given time range
+    query_blocks_to_process = session.query(processing_block_table).filter(
+        overlaps_time_range,
+        processing_block_table.status == 'processing'
+    ).with_for_update(skip_locked=skip_locked).all()
+    return query_blocks_to_process
+
+def _insert_gap_blocks(start_time: datetime, end_time: datetime, processing_block_table: Any, partition_column_names: List[str], valid_partition_values_subquery, filters = []):
+    session = get_db_session()
     partition_columns = [column(col_name) for col_name in partition_column_names]
 
     processing_blocks = session.query(processing_block_table)
@@ -40,28 +79,172 @@ def retrieve_and_lock_unprocessed_blocks_for_processing(
         valid_partition_values_subquery=valid_partition_values_subquery
     )
 
-    # There is an exclusive constraint to prevent overlapping time range for same partition.
-    # If two processes query
+    # Concurrent workers computing the gaps of the same partitions would each insert blocks for the same gaps, and all but
+    # one would violate the exclusion constraint. Each partition's gaps are instead computed and filled while holding the
+    # partition's advisory lock, so workers see each other's blocks, and the insert skips any block that still conflicts
+    # (e.g. with a block inserted outside of this function) instead of failing and throwing the whole insert away.
+    _lock_partitions(processing_block_table, partition_column_names, valid_partition_values_subquery)
+    gap_count = session.query(func.count()).select_from(query_blocks_to_process.subquery()).scalar()
     columns_to_insert = partition_column_names + ['time_range']
-    while True:
-        try:
-            insert_stmt = insert(processing_block_table).from_select(columns_to_insert, query_blocks_to_process)
-            session.execute(insert_stmt)
-            session.commit()
-            break
-        except IntegrityError:
-            # If multiple processes are trying to populate the same time range,
-            # there might come a case where a process has already populated a 
-            # gap (or partially populated a gap) that we are trying to populate.
-            # In such a case, it is unfortunately impossible to partially rollback only
-            # the rows that violate. we have to rollback everything and retry the whole thing.
-            session.rollback()
-            time.sleep(0.1)
+    inserted_count = session.execute(postgresql.insert(processing_block_table.__table__).from_select(columns_to_insert, query_blocks_to_process).on_conflict_do_nothing()).rowcount
+    session.commit() # releases the advisory locks
+    if inserted_count < gap_count:
+        # the exclusion constraint of the table can be coarser than its partitions (e.g. capture blocks created before image
+        # types were part of it), in which case the blocks of one partition keep those of another one from being created
+        logger.warning(f"{gap_count - inserted_count} of the {gap_count} {processing_block_table.__table__.name} blocks between {start_time} and {end_time} overlap blocks of other partitions and were not created, so their events won't be computed.")
+
+def _lock_partitions(processing_block_table: Any, partition_column_names: List[str], valid_partition_values_subquery):
+    """
+    Take the transaction-level advisory lock of every valid partition of the processing block table, keyed on
+    (hash of the table name, hash of the partition values). The locks are taken in key order, so that workers locking
+    overlapping sets of partitions can't deadlock. They are released when the transaction ends.
+    """
+    if valid_partition_values_subquery is None: return
+    session = get_db_session()
+    partitions = valid_partition_values_subquery
+    partition_key = func.hashtext(func.concat_ws('|', *[cast(partitions.c[name], Text) for name in partition_column_names]))
+    partition_keys = sorted(session.execute(select(partition_key).distinct()).scalars())
+    if not partition_keys: return
+    # the keys are sorted here rather than in the query, where nothing guarantees the order the locks are taken in.
+    # unnest reads an array out in order, so the locks are taken in the order of the sorted keys, in a single round trip
+    sorted_keys = func.unnest(literal(partition_keys, postgresql.ARRAY(Integer))).table_valued('partition_key')
+    session.execute(select(func.pg_advisory_xact_lock(func.hashtext(processing_block_table.__table__.name), sorted_keys.c.partition_key))).all()
 
+def _insert_missing_tiles(processing_block_table: Any, partition_column_names: List[str], valid_partition_values_subquery, tiles: range, tile_duration: timedelta) -> bool:
+    """
+    Create the `tiles` of every valid partition that don't exist yet, while holding the partitions' advisory locks like
+    `_insert_gap_blocks`. Tiles that overlap an older unaligned block are skipped instead of failing the insert.
+    Returns whether every tile of every valid partition now exists.
+    """
+    session = get_db_session()
+    table = processing_block_table.__table__
+    partitions = valid_partition_values_subquery
+    tile_values = values(
+        column('tile', Integer), column('tile_start', DateTime(timezone=True)), column('tile_end', DateTime(timezone=True)),
+        name='tiles'
+    ).data([(tile, *tile_time_range(tile, tile_duration)) for tile in tiles])
 
-    # query all processing blocks whose state are 'processing' and whose time range overlaps with the given time range
-    query_blocks_to_process = session.query(processing_block_table).filter(
-        processing_block_table.time_range.op('&&')(func.tstzrange(start_time, end_time)),
-        processing_block_table.status == 'processing'
-    ).with_for_update().all()
-    return query_blocks_to_process
\ No newline at end of file
+    select_tiles = select(
+        *[partitions.c[name] for name in partition_column_names],
+        tile_values.c.tile,
+        func.tstzrange(tile_values.c.tile_start, tile_values.c.tile_end)
+    ).select_from(partitions).join(tile_values, true())
+    _lock_partitions(processing_block_table, partition_column_names, valid_partition_values_subquery)
+    session.execute(postgresql.insert(table).from_select(partition_column_names + ['tile', 'time_range'], select_tiles).on_conflict_do_nothing())
+    session.commit() # releases the advisory locks
+
+    # the tile numbers of each partition are unique, so this is an index lookup per partition
+    existing_tiles = session.query(func.count()).select_from(table).join(
+        partitions, and_(*[table.c[name] == partitions.c[name] for name in partition_column_names])
+    ).filter(table.c.tile.in_(list(tiles))).scalar()
+    expected_tiles = session.query(func.count()).select_from(partitions).scalar() * len(tiles)
+    return existing_tiles >= expected_tiles
+
+
+def processing_tile_duration() -> timedelta:
+    """
+    Duration of the aligned processing tiles, PROCESSING_TILE_HOURS (24 by default). Zero disables aligned tiles.
+    Tables without the tile column (see database_scripts/migrations/aligned_processing_tiles.sql) don't use them either.
+    """
+    return timedelta(hours=float(os.getenv("PROCESSING_TILE_HOURS", 24)))
+
+_tables_without_tiles = set()
+def _has_tile_column(processing_block_table: Any) -> bool:
+    table = processing_block_table.__table__
+    if 'tile' in table.c: return True
+    if table.name not in _tables_without_tiles:
+        _tables_without_tiles.add(table.name)
+        logger.warning(f"{table.name} has no tile column, so its blocks are created for the exact gaps. Run database_scripts/migrations/aligned_processing_tiles.sql to use aligned tiles.")
+    return False
+
+def tiles_covering(start_time: datetime, end_time: datetime, tile_duration: timedelta) -> range:
+    """
+    Numbers of the tiles overlapping [start_time, end_time). Tile n covers [n * tile_duration, (n+1) * tile_duration)
+    after the unix epoch. Naive times are UTC.
+    """
+    first_tile = (_utc(start_time) - _TILE_EPOCH) // tile_duration
+    last_tile = -((_TILE_EPOCH - _utc(end_time)) // tile_duration) # rounded up
+    return range(first_tile, max(last_tile, first_tile + 1))
+
+def tile_time_range(tile: int, tile_duration: timedelta) -> Tuple[datetime, datetime]:
+    return _TILE_EPOCH + tile * tile_duration, _TILE_EPOCH + (tile + 1) * tile_duration
+
+def _utc(time: datetime) -> datetime:
+    return time.replace(tzinfo=timezone.utc) if time.tzinfo is None else time
+
+def group_overlapping_blocks(blocks: list) -> List[list]:
+    """
+    Group processing blocks whose time ranges overlap (directly, or through other blocks of the group), so that
+    each group can be processed over a single continuous time range.
+    """
+    block_groups = []
+    group_end = None
+    for block in sorted(blocks, key=lambda block: block.time_range.lower):
+        if group_end is None or block.time_range.lower > group_end:
+            block_groups.append([])
+            group_end = block.time_range.upper
+        block_groups[-1].append(block)
+        group_end = max(group_end, block.time_range.upper)
+    return block_groups
+
+
+def merge_event_intervals(event_table: Any, partition_column_names: List[str], intervals: List[Tuple[tuple, datetime, datetime]]):
+    """
+    Add computed event intervals to `event_table`, merging them with the existing events of the same partition that they
+    overlap or touch. Each interval is (partition values, start, end), with the partition values in the order of
+    `partition_column_names` and the times in naive UTC (like the `utc_time_range` column).
+    All the intervals are staged in a temporary table with a single executemany, and merged with one statement that
+    deletes the existing events they touch and inserts the union (range_agg) of the deleted and staged ranges of each
+    partition, so the number of round-trips doesn't depend on the number of events.
+    The temporary table is dropped when the transaction is committed.
+    """
+    if len(intervals)==0: return
+    session = get_db_session()
+    table = event_table.__table__
+
+    # the staging table copies the partition columns' types (e.g. enums) from the event table
+    staged_name = f"staged_{table.name}"
+    session.execute(text(f"DROP TABLE IF EXISTS {staged_name}")) # in case an earlier merge of the same transaction already staged intervals
+    session.execute(text(
+        f"CREATE TEMPORARY TABLE {staged_name} ON COMMIT DROP AS "
+        f"SELECT {', '.join(partition_column_names)}, lower(utc_time_range) AS range_start, upper(utc_time_range) AS range_end "
+        f"FROM {session.get_bind().dialect.identifier_preparer.format_table(table)} WITH NO DATA"
+    ))
+    staged = sql_table(staged_name, *[column(name) for name in partition_column_names], column('range_start'), column('range_end'))
+    session.execute(insert(staged), [
+        {**dict(zip(partition_column_names, partition_values)), 'range_start': start, 'range_end': end}
+        for partition_values, start, end in intervals
+    ])
+
+    # existing events that overlap or are adjacent to (end where it starts, or start where it ends) a staged interval of the same partition
+    staged_range = func.tsrange(staged.c.range_start, staged.c.range_end)
+    deleted = delete(table).where(
+        *[table.c[name] == staged.c[name] for name in partition_column_names],
+        or_(table.c.utc_time_range.op('&&')(staged_range), table.c.utc_time_range.op('-|-')(staged_range))
+    ).returning(
+        *[table.c[name] for name in partition_column_names],
+        table.c.utc_time_range.label('time_range')
+    ).cte('deleted')
+
+    all_ranges = union_all(
+        select(*[deleted.c[name] for name in partition_column_names], deleted.c.time_range),
+        select(*[staged.c[name] for name in partition_column_names], staged_range.label('time_range'))
+    ).cte('all_ranges')
+
+    # range_agg() unions overlapping and adjacent ranges into islands, and unnest() gives one row per island
+    merged = select(
+        *[all_ranges.c[name] for name in partition_column_names],
+        func.unnest(func.range_agg(all_ranges.c.time_range)).label('time_range')
+    ).group_by(*[all_ranges.c[name] for name in partition_column_names]).cte('merged')
+
+    island_start = func.lower(merged.c.time_range)
+    island_end = func.upper(merged.c.time_range)
+    insert_merged = insert(table).from_select(
+        partition_column_names + ['start_time', 'duration'],
+        select(
+            *[merged.c[name] for name in partition_column_names],
+            func.timezone('UTC', island_start), # the ranges are naive UTC, while start_time has a time zone
+            island_end - island_start
+        )
+    ).add_cte(deleted)
+    session.execute(insert_merged)
@@ -0,0 +1,63 @@
+from scheduler_service.satellite_state.kernels import epoch_microseconds, naive_datetime_from_epoch_microseconds
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+import numpy as np
+import loky
+import os
+
+
+@dataclass
+class EventWindows:
+    """
+    Events found by a worker for processing blocks. The events of `block_ids[i]` are the `counts[i]` next (start, end)
+    pairs of the `start` and `end` arrays, in integer microseconds since the unix epoch (UTC).
+    """
+    block_ids: np.ndarray # int64
+    counts: np.ndarray # int64
+    start: np.ndarray # int64
+    end: np.ndarray # int64
+
+    @classmethod
+    def from_events(cls, block_ids: np.ndarray, events_per_block: list) -> 'EventWindows':
+        """
+        Windows of the (start, end) skyfield Time events of each block, in the same order as `block_ids`
+        """
+        starts, ends = [], []
+        for events in events_per_block:
+            starts.extend(epoch_microseconds(event_start) for event_start, _ in events)
+            ends.extend(epoch_microseconds(event_end) for _, event_end in events)
+        return cls(
+            block_ids=block_ids,
+            counts=np.array([len(events) for events in events_per_block], dtype=np.int64),
+            start=np.array(starts, dtype=np.int64),
+            end=np.array(ends, dtype=np.int64)
+        )
+
+    def intervals(self) -> Iterator[tuple]:
+        """
+        (block id, naive UTC start, naive UTC end) of every event, the same naive UTC times as the database's tsrange columns
+        """
+        for block_id, start, end in zip(np.repeat(self.block_ids, self.counts), self.start, self.end):
+            yield int(block_id), naive_datetime_from_epoch_microseconds(start), naive_datetime_from_epoch_microseconds(end)
+
+
+def run_event_tasks(compute: Callable, tasks: Iterable, workers: int) -> Iterator[EventWindows]:
+    """
+    Run `compute` on each task in a pool of `workers` processes, or in this process if there is a single worker.
+    Tasks have int64 `range_start` and `range_end` arrays, and the longest tasks are started first, so that the pool
+    doesn't wait on a long task started last.
+    """
+    tasks = sorted(tasks, key=lambda task: int(np.sum(task.range_end - task.range_start)), reverse=True)
+    if workers <= 1 or len(tasks) <= 1:
+        return map(compute, tasks)
+    # the pool is kept alive between calls, so workers only load the satellite caches and ground track indexes once
+    executor = loky.get_reusable_executor(max_workers=workers)
+    return executor.map(compute, tasks)
+
+
+def worker_count(variable: str, default: int = None) -> int:
+    """
+    Number of worker processes from the environment `variable`, or `default` (every core by default)
+    """
+    return max(1, int(os.getenv(variable, default or os.cpu_count() or 1)))
+
@@ -4,6 +4,7 @@ from scheduler_service.satellite_state.stream import register_state_streaming_li
 from scheduler_service.event_processing.order_processing import register_order_processing_listener
 from scheduler_service.schedulers.basic_scheduler import register_request_scheduler_listener
 from scheduler_service.event_processing.order_processing import ensure_order_processor_running
+from scheduler_service.event_processing.background_jobs import ensure_static_event_precompute_running
 import time
 import threading
 from app_config.database.mapping import ScheduleRequest
@@ -20,6 +21,8 @@ def startup_event():
     # Order processor runs whenever an order is created. make sure we process all orders that came in before we started listening for the order created event
     ensure_order_processor_running() 
     register_request_scheduler_listener()
+    # keep the static events of the coming days populated, so that requests don't have to wait for them
+    ensure_static_event_precompute_running()
 
     # os.system(f"sleep 10; python {os.path.dirname(__file__)}/restart_interrupted_requests.py")
     rabbit().start_consuming()
@@ -0,0 +1,110 @@
+from app_config.database.mapping import Satellite
+from app_config import get_db_session
+from sqlalchemy.orm import Session
+from sgp4.api import Satrec, SatrecArray
+from skyfield.sgp4lib import theta_GMST1982
+from skyfield.timelib import Time
+from scheduler_service.satellite_state.kernels import is_sunlit_kernel
+from scheduler_service.satellite_state.state_generator import find_row_events
+from scheduler_service.satellite_state.sun import sun_positions
+from datetime import timedelta
+from typing import List, Optional
+import numpy as np
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class ConstellationPropagator:
+    """
+    Propagates the whole fleet at once with sgp4's vectorized `SatrecArray`, so fleet-wide computations scale with
+    the size of the arrays rather than with the number of satellites looped through in python.
+    Positions are earth-fixed (ITRS) vectors in km, with shape (N_satellites, N_times, 3), in the order of `satellite_ids`.
+    """
+    def __init__(self, satellites: List[Satellite]):
+        self.satellite_ids = [satellite.id for satellite in satellites]
+        self._satrecs = [Satrec.twoline2rv(satellite.tle["line1"], satellite.tle["line2"]) for satellite in satellites]
+        self._satrec_array = SatrecArray(self._satrecs)
+
+    @classmethod
+    def from_database(cls, satellite_ids: Optional[List[int]] = None, session: Optional[Session] = None):
+        """
+        Propagator of the satellites with `satellite_ids` (all of them by default), loaded with `session` (the global session by default)
+        """
+        session = session or get_db_session()
+        query = session.query(Satellite)
+        if satellite_ids is not None:
+            query = query.filter(Satellite.id.in_(satellite_ids))
+        return cls(query.order_by(Satellite.id).all())
+
+    def __len__(self):
+        return len(self.satellite_ids)
+
+    def positions(self, time: Time) -> np.ndarray:
+        """
+        Position of every satellite at every time. Times at which SGP4 fails for a satellite (e.g. it has decayed) give nan positions.
+        """
+        time = _ensure_time_array(time)
+        jd, fraction = _sgp4_julian_date(time)
+        _, teme_positions, _ = self._satrec_array.sgp4(jd, fraction)
+        return _teme_to_itrs(teme_positions, time)
+
+    def is_sunlit(self, time: Time, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Whether each satellite is sunlit at each time, as an (N_satellites, N_times) array.
+        Already computed `positions` can be provided to avoid propagating the fleet again.
+        """
+        time = _ensure_time_array(time)
+        if positions is None:
+            positions = self.positions(time)
+        # the sun's position is the same for the whole fleet, so it is only computed once per time
+        return is_sunlit_kernel(positions, sun_positions(time)[np.newaxis])
+
+    def eclipse_events(self, start_time: Time, end_time: Time, step: timedelta = timedelta(minutes=1), tolerance: Optional[timedelta] = None):
+        """
+        Get the eclipse events of every satellite between `start_time` and `end_time`, by sampling the whole fleet every `step`.
+        If a `tolerance` is provided, the eclipse boundaries are refined by bisection until they are known to within `tolerance`.
+        Returns a list containing the eclipse events of each satellite, in the order of `satellite_ids`.
+        """
+        num_steps = max(int(np.ceil((end_time - start_time) * _SECONDS_PER_DAY / step.total_seconds())), 1)
+        times = start_time.ts.linspace(start_time, end_time, num_steps + 1)
+
+        return find_row_events(
+            times, end_time, len(self),
+            lambda time: ~self.is_sunlit(time),
+            lambda rows, time: ~self._is_sunlit_per_satellite(rows, time),
+            tolerance
+        )
+
+    def _is_sunlit_per_satellite(self, rows: np.ndarray, time: Time) -> np.ndarray:
+        """
+        Whether the satellite at `rows[i]` is sunlit at `time[i]`, for every i. Each satellite is only propagated at its own times.
+        """
+        jd, fraction = _sgp4_julian_date(time)
+        teme_positions = np.empty((len(rows), 3), dtype=np.float64)
+        for row in np.unique(rows):
+            satellite_times = rows == row
+            _, teme_positions[satellite_times], _ = self._satrecs[row].sgp4_array(jd[satellite_times], fraction[satellite_times])
+        positions = _teme_to_itrs(teme_positions[np.newaxis], time)[0]
+        return is_sunlit_kernel(positions, sun_positions(time))
+
+
+def _ensure_time_array(time: Time) -> Time:
+    if time.shape == ():
+        return time.ts.tt_jd(np.atleast_1d(time.whole), np.atleast_1d(time.tt_fraction))
+    return time
+
+def _sgp4_julian_date(time: Time):
+    # same UTC julian date split as skyfield's EarthSatellite, since TLE epochs are UTC
+    fraction = time.tai_fraction - time._leap_seconds() / _SECONDS_PER_DAY
+    jd = np.zeros_like(fraction) + time.whole # times built from a single reference date have a scalar `whole`
+    return jd, fraction
+
+def _teme_to_itrs(teme_positions: np.ndarray, time: Time) -> np.ndarray:
+    """
+    Rotate (N_satellites, N_times, 3) TEME positions into the earth-fixed frame. TEME and skyfield's ITRS only differ by
+    a rotation of the Greenwich mean sidereal time about the z axis (skyfield doesn't apply polar motion by default).
+    """
+    theta, _ = theta_GMST1982(time.whole, time.ut1_fraction)
+    cos_theta, sin_theta = np.cos(theta), np.sin(theta)
+    x, y, z = teme_positions[..., 0], teme_positions[..., 1], teme_positions[..., 2]
+    return np.stack([cos_theta*x + sin_theta*y, -sin_theta*x + cos_theta*y, z], axis=-1)
@@ -0,0 +1,187 @@
+from skyfield.api import EarthSatellite
+from skyfield.framelib import itrs
+from skyfield.timelib import Time
+from scheduler_service.satellite_state.kernels import hermite_interpolate, epoch_microseconds
+from scheduler_service.satellite_state.sun import is_geocentric_sunlit
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import hashlib
+import tempfile
+import os
+
+_MICROSECONDS_PER_DAY = 24 * 60 * 60 * 1_000_000
+_MAX_OPEN_TABLES = 64
+
+# columns of a table: earth-fixed (ITRS) position in km, earth-fixed velocity in km/s, and the sunlit flag
+_POSITION = slice(0, 3)
+_VELOCITY = slice(3, 6)
+_SUNLIT = 6
+
+
+class EphemerisCache:
+    """
+    Persistent cache of SGP4-propagated satellite states on a fixed time grid.
+    Each satellite (identified by a hash of its TLE, so a new TLE never reads stale positions) gets one table per UTC day,
+    stored as a `.npy` file that is memory-mapped when read. Every process reading the same table shares one copy of it
+    through the OS page cache, and the tables survive restarts, so each day of each TLE is only ever propagated once.
+    Positions between grid points are interpolated with cubic Hermite polynomials of the position and velocity at the
+    surrounding grid points. The sunlit flag is taken from the grid when both surrounding grid points agree, and is
+    computed exactly otherwise (i.e. only around eclipse boundaries).
+    With `max_bytes`, the least recently used tables are deleted whenever writing a table takes the directory over that size.
+    """
+    def __init__(self, directory: Path, step: timedelta = timedelta(minutes=1), max_bytes: Optional[int] = None):
+        if (24 * 60 * 60) % step.total_seconds() != 0:
+            raise ValueError(f"The ephemeris cache step must divide a day evenly, got {step}")
+        self.directory = Path(directory)
+        self.step = step
+        self.max_bytes = max_bytes
+        self._tables = OrderedDict() # (tle_hash, day) -> memory-mapped table, least recently used first
+
+    def positions(self, satellite: EarthSatellite, time: Time) -> np.ndarray:
+        """
+        Earth-fixed (ITRS) position of the satellite in km at the provided time(s), as an array of shape (3, *time.shape)
+        """
+        tables, index, u = self._locate(satellite, time)
+        step_seconds = self.step.total_seconds()
+        positions = hermite_interpolate(
+            tables[index, _POSITION].T, tables[index, _VELOCITY].T,
+            tables[index + 1, _POSITION].T, tables[index + 1, _VELOCITY].T,
+            step_seconds, u
+        )
+        return positions.reshape((3,) + time.shape)
+
+    def is_sunlit(self, satellite: EarthSatellite, time: Time) -> np.ndarray:
+        """
+        Whether the satellite is sunlit at the provided time(s)
+        """
+        tables, index, _ = self._locate(satellite, time)
+        sunlit_before, sunlit_after = tables[index, _SUNLIT] > 0.5, tables[index + 1, _SUNLIT] > 0.5
+        sunlit = sunlit_before.copy()
+
+        # the satellite entered or left earth's shadow between the grid points, so we need the exact value
+        undecided = np.nonzero(sunlit_before != sunlit_after)[0]
+        if len(undecided) > 0:
+            undecided_time = time if time.shape == () else time[undecided]
+            sunlit[undecided] = is_geocentric_sunlit(satellite.at(undecided_time))
+        return sunlit.reshape(time.shape)
+
+    def _locate(self, satellite: EarthSatellite, time: Time):
+        """
+        Gather, for every time, the table rows of the grid points it lies between. Returns the rows (as one stacked array),
+        the index of the grid point before each time in that array, and the fraction of the step each time is past that grid point.
+        """
+        microseconds = np.atleast_1d(epoch_microseconds(time)).reshape(-1)
+        days = microseconds // _MICROSECONDS_PER_DAY
+        step_microseconds = int(self.step.total_seconds() * 1_000_000)
+        steps_into_day, microseconds_into_step = np.divmod(microseconds - days * _MICROSECONDS_PER_DAY, step_microseconds)
+
+        unique_days, day_indices = np.unique(days, return_inverse=True)
+        tables = [self._get_table(satellite, int(day), time.ts) for day in unique_days]
+        rows_per_table = len(tables[0])
+        index = day_indices * rows_per_table + steps_into_day
+        stacked_tables = tables[0] if len(tables) == 1 else np.concatenate(tables)
+        return stacked_tables, index, microseconds_into_step / step_microseconds
+
+    def _get_table(self, satellite: EarthSatellite, day: int, ts) -> np.ndarray:
+        key = (_tle_hash(satellite), day)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+
+        path = self.directory / key[0] / f"{_day_to_date(day).isoformat()}.npy"
+        try:
+            table = np.load(path, mmap_mode='r')
+            os.utime(path) # the modification time orders the tables by last use for the eviction
+        except FileNotFoundError: # never written, or evicted
+            self._write_table(path, self._propagate_day(satellite, day, ts))
+            table = np.load(path, mmap_mode='r')
+            self._evict(keep=path)
+
+        self._tables[key] = table
+        if len(self._tables) > _MAX_OPEN_TABLES:
+            self._tables.popitem(last=False)
+        return table
+
+    def _propagate_day(self, satellite: EarthSatellite, day: int, ts) -> np.ndarray:
+        """
+        Propagate the satellite on the grid of the provided day, including midnight of the next day as the last
+        grid point, so that every time of the day can be interpolated from a single table.
+        """
+        date = _day_to_date(day)
+        steps_per_day = int((24 * 60 * 60) // self.step.total_seconds())
+        seconds = np.arange(steps_per_day + 1) * self.step.total_seconds()
+        time = ts.utc(date.year, date.month, date.day, 0, 0, seconds)
+
+        geocentric = satellite.at(time)
+        position, velocity = geocentric.frame_xyz_and_velocity(itrs)
+
+        table = np.empty((len(seconds), 7), dtype=np.float64)
+        table[:, _POSITION] = position.km.T
+        table[:, _VELOCITY] = velocity.km_per_s.T
+        table[:, _SUNLIT] = is_geocentric_sunlit(geocentric)
+        return table
+
+    def _write_table(self, path: Path, table: np.ndarray):
+        # Write to a temporary file and rename it into place, so that other processes never see a partially written table.
+        # If several processes build the same table at once, they all write identical contents, so it doesn't matter who wins
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False) as file:
+            np.save(file, table)
+        os.replace(file.name, path)
+
+    def _evict(self, keep: Path):
+        """
+        Delete the least recently used tables (other than `keep`) until the cache fits in `max_bytes`. Processes that
+        have a deleted table memory-mapped keep reading it, the others propagate it again when they need it.
+        """
+        if self.max_bytes is None: return
+        tables = []
+        for path in self.directory.glob("*/*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError: # evicted by another process
+                continue
+            tables.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in tables)
+
+        for _, size, path in sorted(tables):
+            if total_bytes <= self.max_bytes: break
+            if path == keep: continue
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+def _tle_hash(satellite: EarthSatellite) -> str:
+    # EarthSatellite doesn't keep the TLE lines around, but the parsed elements identify the TLE just as well
+    satrec = satellite.model
+    elements = (
+        satrec.satnum, satrec.jdsatepoch, satrec.jdsatepochF, satrec.bstar, satrec.ndot, satrec.nddot,
+        satrec.inclo, satrec.nodeo, satrec.ecco, satrec.argpo, satrec.mo, satrec.no_kozai
+    )
+    return hashlib.sha1(repr(elements).encode()).hexdigest()[:16]
+
+def _day_to_date(day: int):
+    return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)).date()
+
+
+_ephemeris_cache = None
+def get_ephemeris_cache() -> Optional[EphemerisCache]:
+    """
+    The ephemeris cache of this process, configured with the EPHEMERIS_CACHE_DIR, EPHEMERIS_CACHE_STEP_SECONDS and
+    EPHEMERIS_CACHE_MAX_MB (1024 by default) environment variables. The cache is disabled unless EPHEMERIS_CACHE_DIR is set.
+    """
+    global _ephemeris_cache
+    if _ephemeris_cache is None:
+        directory = os.getenv("EPHEMERIS_CACHE_DIR", "")
+        if directory == "":
+            return None
+        step = timedelta(seconds=float(os.getenv("EPHEMERIS_CACHE_STEP_SECONDS", 60)))
+        max_bytes = int(float(os.getenv("EPHEMERIS_CACHE_MAX_MB", 1024)) * 1024 * 1024)
+        _ephemeris_cache = EphemerisCache(directory, step, max_bytes)
+    return _ephemeris_cache
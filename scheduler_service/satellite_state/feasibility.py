@@ -0,0 +1,62 @@
+from app_config.database.mapping import Satellite, GroundStation
+from scheduler_service.constants import EARTH_RADIUS
+from scheduler_service.satellite_state.kernels import coverage_distance, HAVERSINE_EARTH_RADIUS
+from scheduler_service.satellite_state.satellite_cache import get_skyfield_satellite
+from scheduler_service.schedulers.utils import get_image_dimensions
+import math
+
+# Slack on the bounds below, so that the prefilter never rules out a pair that the propagated search would find. It covers the
+# difference between geodetic and geocentric latitudes (~0.2 degrees), the periodic variations of the osculating inclination
+# and radius around the mean TLE elements, and the spherical earth used for the geometry
+_LATITUDE_MARGIN = 1.0 # degrees
+_ALTITUDE_MARGIN = 25.0 # km
+
+
+def orbit_latitude_and_altitude_bounds(db_satellite: Satellite):
+    """
+    Highest latitude (degrees, north or south) the sub-satellite point can reach, and highest altitude (km) of the orbit,
+    from the TLE's inclination, and its mean motion and eccentricity (through the semi-major axis).
+    """
+    satrec = get_skyfield_satellite(db_satellite).model
+    inclination = math.degrees(satrec.inclo)
+    max_latitude = min(inclination, 180.0 - inclination) # retrograde orbits reach the same latitudes as their supplement
+    apogee_altitude = satrec.a * satrec.radiusearthkm * (1.0 + satrec.ecco) - EARTH_RADIUS # satrec.a is in earth radii
+    return max_latitude + _LATITUDE_MARGIN, apogee_altitude + _ALTITUDE_MARGIN
+
+def can_ever_capture(db_satellite: Satellite, target_latitude: float, image_type: str) -> bool:
+    """
+    Whether the satellite's orbit passes close enough to the target's latitude for it to ever capture an image of it.
+    An image fits in the satellite's view only if the distance from the sub-satellite point to the target along the meridian,
+    plus half the image length, is less than the satellite's coverage radius (see `can_capture_kernel()`).
+    """
+    max_latitude, max_altitude = orbit_latitude_and_altitude_bounds(db_satellite)
+    image_length, _ = get_image_dimensions(image_type)
+    reach = float(coverage_distance(max_altitude, db_satellite.fov)) - 0.5*image_length # km along the meridian
+    if reach <= 0: return False
+    return abs(target_latitude) - max_latitude < math.degrees(reach / HAVERSINE_EARTH_RADIUS)
+
+def can_ever_contact(db_satellite: Satellite, groundstation: GroundStation) -> bool:
+    """
+    Whether the satellite's orbit passes close enough to the ground station's latitude for it to ever rise above the
+    station's `send_mask` elevation.
+    """
+    max_latitude, _ = orbit_latitude_and_altitude_bounds(db_satellite)
+    return abs(groundstation.latitude) - max_latitude < math.degrees(contact_reach(db_satellite, groundstation.send_mask))
+
+def capture_reach(db_satellite: Satellite) -> float:
+    """
+    Largest angle (radians, at the earth's center) between the sub-satellite point and a target the satellite can capture.
+    The distances x and y from the sub-satellite point to the target along its meridian and its parallel must satisfy
+    sqrt(x^2 + y^2) < coverage (see `can_capture_kernel()`), and the distance between them is at most x + y <= sqrt(2) * sqrt(x^2 + y^2).
+    """
+    _, max_altitude = orbit_latitude_and_altitude_bounds(db_satellite)
+    return min(math.sqrt(2) * float(coverage_distance(max_altitude, db_satellite.fov)) / HAVERSINE_EARTH_RADIUS, math.pi)
+
+def contact_reach(db_satellite: Satellite, send_mask: float) -> float:
+    """
+    Largest angle (radians, at the earth's center) between the sub-satellite point and a ground station that sees the
+    satellite above its `send_mask` elevation (degrees).
+    """
+    _, max_altitude = orbit_latitude_and_altitude_bounds(db_satellite)
+    mask = math.radians(send_mask)
+    return math.acos(EARTH_RADIUS * math.cos(mask) / (EARTH_RADIUS + max_altitude)) - mask
@@ -0,0 +1,75 @@
+from skyfield.timelib import Time
+from scipy.spatial import cKDTree
+from scheduler_service.satellite_state.kernels import HAVERSINE_EARTH_RADIUS
+from collections import OrderedDict
+import numpy as np
+import threading
+import os
+
+
+class GroundTrackIndex:
+    """
+    Spatial index of a satellite's ground track: the sub-satellite points sampled at `times`, stored in a k-d tree as unit
+    vectors, so that all the times at which the satellite passes within some distance of a point are found with a single
+    range query instead of scanning every time.
+    """
+    def __init__(self, times: Time, latitude: np.ndarray, longitude: np.ndarray, altitude: np.ndarray):
+        self.times = times
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.altitude = np.asarray(altitude, dtype=np.float64)
+        # times at which SGP4 failed (nan) are put at the earth's center, where the capture kernel rejects them
+        self._tree = cKDTree(np.nan_to_num(_unit_vectors(self.latitude, self.longitude)))
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the index: its samples, its tree, and the arrays skyfield computed and cached on `times` while propagating them
+        """
+        arrays = [self.latitude, self.longitude, self.altitude, self._tree.data, self._tree.indices]
+        for value in vars(self.times).values():
+            arrays.extend(value if isinstance(value, tuple) else [value])
+        return sum(array.nbytes for array in arrays if isinstance(array, np.ndarray))
+
+    def indices_within(self, latitude: float, longitude: float, radius: float) -> np.ndarray:
+        """
+        Indices (into `times`) of the samples whose sub-satellite point is within `radius` km of the point, in chronological order
+        """
+        # a distance along the sphere is an angle, which is the chord length `2*sin(angle/2)` between unit vectors
+        angle = min(radius / HAVERSINE_EARTH_RADIUS, np.pi)
+        indices = self._tree.query_ball_point(_unit_vectors(latitude, longitude), 2.0 * np.sin(0.5 * angle) * (1 + 1e-12))
+        return np.sort(np.asarray(indices, dtype=np.int64))
+
+
+def _unit_vectors(latitude, longitude) -> np.ndarray:
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    return np.stack([np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)], axis=-1)
+
+
+_ground_track_indexes = OrderedDict() # key -> GroundTrackIndex, least recently used first
+_ground_track_indexes_lock = threading.Lock() # indexes are requested from the threads of the api's threadpool
+def get_ground_track_index(key, build) -> GroundTrackIndex:
+    """
+    The ground track index of this process for `key`, which is built by calling `build()` the first time it is requested.
+    The key must identify everything the index depends on (satellite, TLE, time range and sampling step).
+    The least recently used indexes are dropped once the indexes hold more than GROUND_TRACK_INDEX_CACHE_MB (256 by default).
+    """
+    with _ground_track_indexes_lock:
+        index = _ground_track_indexes.get(key)
+        if index is not None:
+            _ground_track_indexes.move_to_end(key)
+            return index
+
+    # built outside of the lock, so a long build doesn't hold up the requests of other satellites
+    index = build()
+    max_bytes = float(os.getenv("GROUND_TRACK_INDEX_CACHE_MB", 256)) * 1024 * 1024
+    with _ground_track_indexes_lock:
+        _ground_track_indexes[key] = index
+        total_bytes = sum(cached_index.nbytes for cached_index in _ground_track_indexes.values())
+        while total_bytes > max_bytes and len(_ground_track_indexes) > 1:
+            _, evicted_index = _ground_track_indexes.popitem(last=False)
+            total_bytes -= evicted_index.nbytes
+    return index
@@ -0,0 +1,192 @@
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from haversine import Unit
+from haversine.haversine import get_avg_earth_radius
+from scheduler_service.constants import EARTH_RADIUS
+
+# haversine() measures distances on a sphere with the mean earth radius, so we use the same radius here to get identical results
+HAVERSINE_EARTH_RADIUS = get_avg_earth_radius(Unit.KILOMETERS)
+
+# skyfield's (deprecated) Geocentric.subpoint(), which we have always used for the satellite's latitude/longitude/altitude, uses the IERS2010 ellipsoid
+_IERS2010_RADIUS = 6378.1366 # km
+_IERS2010_FLATTENING = 1 / 298.25642
+_IERS2010_E2 = 2.0*_IERS2010_FLATTENING - _IERS2010_FLATTENING**2
+
+# radius of the sphere skyfield uses for the earth's shadow in `ICRF.is_sunlit()`
+_SKYFIELD_EARTH_RADIUS = 6378.1366 # km
+
+_SUN_RADIUS = 695700.0 # km, IAU 2015 nominal solar radius
+
+_UNIX_EPOCH_SECONDS_SINCE_JD_0 = 210866760000 # 2440587.5 days * 86400 seconds
+
+
+def haversine_distance(lat1, lng1, lat2, lng2):
+    """
+    Numpy version of `haversine.haversine()` (in kilometers). Inputs are in degrees, and can be any arrays that broadcast together.
+    """
+    lat1 = np.radians(lat1)
+    lng1 = np.radians(lng1)
+    lat2 = np.radians(lat2)
+    lng2 = np.radians(lng2)
+    lat = lat2 - lat1
+    lng = lng2 - lng1
+    d = np.sin(lat * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(lng * 0.5) ** 2
+    return HAVERSINE_EARTH_RADIUS * 2 * np.arcsin(np.sqrt(d))
+
+
+def coverage_distance(altitude, fov: float):
+    """
+    Radius (in km, along the earth's surface) of the area the satellite can see from the provided altitude (in km), given its field of view (in degrees).
+    """
+    # https://faculty.nps.edu/awashburn/Files/Notes/EARTHCOV.pdf
+    rho = EARTH_RADIUS / (EARTH_RADIUS + np.asarray(altitude, dtype=np.float64))
+
+    half_fov = 0.5 * np.radians(fov)
+    horizon_limited_cap_angle = np.arccos(rho) # sensor's field of view is not limiting
+    fov_limited_cap_angle = np.arcsin(np.minimum(np.sin(half_fov) / rho, 1.0)) - half_fov # coverage is limited by the sensor's field of view
+    cap_angle = np.where(np.sin(half_fov) > rho, horizon_limited_cap_angle, fov_limited_cap_angle)
+
+    return EARTH_RADIUS * cap_angle # this is radius * angle = arc length
+
+
+def can_capture_kernel(latitude, longitude, altitude, target_latitude, target_longitude, image_length: float, image_width: float, fov: float):
+    """
+    Check whether an image of `image_length` x `image_width` km centered at the target fits in the satellite's view,
+    for whole arrays of sub-satellite points at once. Returns a boolean array with the broadcasted shape of the inputs.
+    """
+    # distance from the subpoint to the target along the meridian (x) and along the parallel (y)
+    dist_subpoint_to_target_x = haversine_distance(target_latitude, longitude, latitude, longitude)
+    dist_subpoint_to_target_y = haversine_distance(latitude, target_longitude, latitude, longitude)
+
+    dist_x = dist_subpoint_to_target_x + 0.5*image_length
+    dist_y = dist_subpoint_to_target_y + 0.5*image_width
+    required_coverage_dist = (dist_x**2 + dist_y**2)**0.5
+
+    return required_coverage_dist < coverage_distance(altitude, fov)
+
+
+def ecef_to_geodetic(x, y, z):
+    """
+    Convert earth-fixed (ITRS) coordinates in km to geodetic latitude (degrees), longitude (degrees) and altitude (km).
+    Same iteration as skyfield's `Geoid._compute_latitude()`, so the results match `Geocentric.subpoint()`.
+    """
+    R = np.sqrt(x*x + y*y)
+    latitude = np.arctan2(z, R)
+    for _ in range(3):
+        e2_sin_latitude = _IERS2010_E2 * np.sin(latitude)
+        aC = _IERS2010_RADIUS / np.sqrt(1.0 - e2_sin_latitude * np.sin(latitude))
+        hyp = z + aC * e2_sin_latitude
+        latitude = np.arctan2(hyp, R)
+    longitude = (np.arctan2(y, x) - np.pi) % (2*np.pi) - np.pi
+    altitude = np.sqrt(hyp*hyp + R*R) - aC
+    return np.degrees(latitude), np.degrees(longitude), altitude
+
+
+def is_sunlit_kernel(position, sun_position):
+    """
+    Whether the satellites at `position` are in sunlight, given the position of the sun. Both are earth-centered vectors in km
+    along the last axis, in the same (any) frame, and broadcast together.
+    Same test as skyfield's `ICRF.is_sunlit()`: the satellite is in the earth's shadow if the line from the satellite to the sun
+    crosses the earth's sphere in front of the satellite.
+    """
+    direction = sun_position - position
+    direction = direction / np.linalg.norm(direction, axis=-1, keepdims=True)
+    earth = -position # earth's center, relative to the satellite
+    minus_b = 2.0 * np.sum(direction * earth, axis=-1)
+    c = np.sum(earth * earth, axis=-1) - _SKYFIELD_EARTH_RADIUS**2
+    discriminant = minus_b * minus_b - 4 * c
+    with np.errstate(invalid='ignore'):
+        far_intersection = (minus_b + np.sqrt(discriminant)) / 2.0
+    return np.nan_to_num(far_intersection) <= 0 # no intersection (nan) means sunlit
+
+
+def shadow_angles(position, sun_position):
+    """
+    Apparent radius of the sun, apparent radius of the earth, and the angle between their centers (all in radians), as seen
+    from the satellites at `position`. Both inputs are earth-centered vectors in km along the last axis, in the same (any) frame,
+    and broadcast together. The satellite is:
+        - in the umbra if `separation < earth_radius - sun_radius` (the sun is entirely hidden)
+        - in the penumbra or umbra if `separation < earth_radius + sun_radius` (the sun is at least partly hidden)
+        - in the shadow according to `is_sunlit_kernel()` if `separation < earth_radius` (the center of the sun is hidden)
+    """
+    to_sun = sun_position - position
+    to_earth = -position
+    sun_distance = np.linalg.norm(to_sun, axis=-1)
+    earth_distance = np.linalg.norm(to_earth, axis=-1)
+
+    sun_radius = np.arcsin(_SUN_RADIUS / sun_distance)
+    earth_radius = np.arcsin(np.minimum(_SKYFIELD_EARTH_RADIUS / earth_distance, 1.0))
+    cos_separation = np.sum(to_sun * to_earth, axis=-1) / (sun_distance * earth_distance)
+    separation = np.arccos(np.clip(cos_separation, -1.0, 1.0))
+    return sun_radius, earth_radius, separation
+
+
+def geodetic_to_ecef(latitude, longitude, altitude=0.0):
+    """
+    Convert geodetic latitude (degrees), longitude (degrees) and altitude (km) to earth-fixed (ITRS) coordinates in km,
+    with the coordinates along a new last axis. Uses the same ellipsoid as skyfield's `Topos`.
+    """
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    radius_of_curvature = _IERS2010_RADIUS / np.sqrt(1.0 - _IERS2010_E2 * np.sin(latitude)**2)
+    return np.stack([
+        (radius_of_curvature + altitude) * np.cos(latitude) * np.cos(longitude),
+        (radius_of_curvature + altitude) * np.cos(latitude) * np.sin(longitude),
+        (radius_of_curvature * (1.0 - _IERS2010_E2) + altitude) * np.sin(latitude),
+    ], axis=-1)
+
+
+def elevation_kernel(position, observer_latitude, observer_longitude, observer_altitude=0.0):
+    """
+    Elevation angle (degrees) of earth-fixed `position`s (km, coordinates along the last axis) above the horizon of observers
+    on the ground, given their geodetic latitude (degrees), longitude (degrees) and altitude (km).
+    The observer arguments broadcast with the leading axes of `position`, e.g. (stations x 1) observers against (1 x times x 3) positions.
+    """
+    observer_position = geodetic_to_ecef(observer_latitude, observer_longitude, observer_altitude)
+    latitude, longitude = np.radians(observer_latitude), np.radians(observer_longitude)
+    up = np.stack([np.cos(latitude) * np.cos(longitude), np.cos(latitude) * np.sin(longitude), np.sin(latitude)], axis=-1)
+
+    relative_position = position - observer_position
+    distance = np.linalg.norm(relative_position, axis=-1)
+    return np.degrees(np.arcsin(np.sum(relative_position * up, axis=-1) / distance))
+
+
+def hermite_interpolate(position0, velocity0, position1, velocity1, step: float, u):
+    """
+    Cubic Hermite interpolation between two nodes `step` seconds apart, given their positions and velocities (per second).
+    `u` is the fraction of the step (0 to 1) to interpolate at. All the inputs broadcast together.
+    """
+    u2 = u*u
+    u3 = u2*u
+    return (
+        (2*u3 - 3*u2 + 1) * position0
+        + (u3 - 2*u2 + u) * step * velocity0
+        + (-2*u3 + 3*u2) * position1
+        + (u3 - u2) * step * velocity1
+    )
+
+
+def epoch_microseconds(time) -> np.ndarray:
+    """
+    Convert a skyfield Time to integer microseconds since the unix epoch (UTC)
+    """
+    # Time._utc_seconds() gives whole seconds and the fractional second separately, so we don't lose precision to float rounding
+    seconds, fraction, _ = time._utc_seconds(0.0)
+    seconds = np.asarray(seconds, dtype=np.int64) - _UNIX_EPOCH_SECONDS_SINCE_JD_0
+    return seconds * 1_000_000 + np.round(np.asarray(fraction) * 1_000_000).astype(np.int64)
+
+
+def datetime_from_epoch_microseconds(epoch_microseconds: int) -> datetime:
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(epoch_microseconds))
+
+
+def naive_epoch_microseconds(time: datetime) -> int:
+    """
+    Convert a datetime to integer microseconds since the unix epoch, naive datetimes being UTC like the database's tsrange columns
+    """
+    if time.tzinfo is None:
+        time = time.replace(tzinfo=timezone.utc)
+    return (time - datetime_from_epoch_microseconds(0)) // timedelta(microseconds=1)
+
+
+def naive_datetime_from_epoch_microseconds(epoch_microseconds: int) -> datetime:
+    return datetime_from_epoch_microseconds(epoch_microseconds).replace(tzinfo=None)
@@ -0,0 +1,92 @@
+from sgp4.api import Satrec
+from skyfield.sgp4lib import theta_GMST1982
+from skyfield.timelib import Time
+from datetime import timedelta
+from scheduler_service.constants import EARTH_ROTATION_PER_MINUTE
+import numpy as np
+
+_MINUTES_PER_DAY = 24 * 60
+
+# The mean elements are taken from SGP4 again every `_ANCHOR_INTERVAL`, so that the effects the predictor ignores (drag,
+# periodic perturbations) never build up for long
+_ANCHOR_INTERVAL = timedelta(hours=12)
+
+# Margin on the angle between the predicted sub-satellite point and a target. The predictor stays within ~0.15 degrees of SGP4
+# (mostly SGP4's short period terms, and the difference between geodetic and geocentric latitudes), so this is mostly slack
+_PASS_MARGIN = np.radians(1.0)
+
+
+class PassPredictor:
+    """
+    Fast approximation of a satellite's sub-satellite point, used to find the candidate windows in which the satellite
+    could be close enough to a target, so that exact searches skip the dead time between passes.
+    The mean elements are taken from SGP4 at regular anchor times, and advanced with SGP4's secular rates (mean motion,
+    nodal regression and apsidal precession due to the earth's oblateness) and Kepler's equation in between.
+    """
+    def __init__(self, satrec: Satrec, reference_time: Time):
+        """
+        `satrec` is propagated to the anchor times, so it shouldn't be shared with other users
+        """
+        self._satrec = satrec
+        self._reference_time = reference_time
+        self._anchors = dict() # anchor number -> mean elements at the anchor
+
+    def directions(self, time: Time) -> np.ndarray:
+        """
+        Approximate earth-fixed (ITRS) unit vectors of the sub-satellite point (on a spherical earth), with shape (len(time), 3)
+        """
+        anchor_minutes = _ANCHOR_INTERVAL.total_seconds() / 60
+        minutes = (time.tt - self._reference_time.tt) * _MINUTES_PER_DAY
+        anchor_numbers = np.floor(minutes / anchor_minutes).astype(np.int64)
+
+        unique_anchor_numbers, anchor_indices = np.unique(anchor_numbers, return_inverse=True)
+        elements = np.array([self._anchor_elements(anchor_number) for anchor_number in unique_anchor_numbers.tolist()]).reshape(-1, 5)[anchor_indices]
+        eccentricity, inclination, node, perigee, anomaly = elements.T
+        since_anchor = minutes - anchor_numbers * anchor_minutes
+
+        mean_anomaly = anomaly + self._satrec.mdot * since_anchor
+        perigee = perigee + self._satrec.argpdot * since_anchor
+        node = node + self._satrec.nodedot * since_anchor
+
+        eccentric_anomaly = mean_anomaly
+        for _ in range(3):
+            eccentric_anomaly = eccentric_anomaly - (eccentric_anomaly - eccentricity * np.sin(eccentric_anomaly) - mean_anomaly) / (1 - eccentricity * np.cos(eccentric_anomaly))
+        true_anomaly = 2 * np.arctan2(np.sqrt(1 + eccentricity) * np.sin(eccentric_anomaly / 2), np.sqrt(1 - eccentricity) * np.cos(eccentric_anomaly / 2))
+        argument_of_latitude = perigee + true_anomaly
+
+        # the orbit's node is measured in the TEME frame, which only differs from ITRS by a rotation of the sidereal time
+        theta, _ = theta_GMST1982(time.whole, time.ut1_fraction)
+        node = node - theta
+        cos_u, sin_u = np.cos(argument_of_latitude), np.sin(argument_of_latitude)
+        return np.stack([
+            np.cos(node) * cos_u - np.sin(node) * sin_u * np.cos(inclination),
+            np.sin(node) * cos_u + np.cos(node) * sin_u * np.cos(inclination),
+            sin_u * np.sin(inclination),
+        ], axis=-1)
+
+    def candidates(self, time: Time, target_directions: np.ndarray, reach: np.ndarray) -> np.ndarray:
+        """
+        Whether each target could be within `reach` (radians at the earth's center) of the sub-satellite point at each time,
+        as a (targets x times) array. `target_directions` are the earth-fixed unit vectors of the targets, with shape (targets, 3).
+        `reach` also needs to cover how far the satellite moves between two searched times, for the samples around the
+        windows to be included.
+        """
+        cos_angle = np.clip(target_directions @ self.directions(time).T, -1.0, 1.0)
+        return np.arccos(cos_angle) < (np.asarray(reach) + _PASS_MARGIN)[..., np.newaxis]
+
+    def max_angle_per_minute(self) -> float:
+        """
+        Upper bound on the angle (radians at the earth's center) the sub-satellite point moves per minute
+        """
+        return self._satrec.mdot + EARTH_ROTATION_PER_MINUTE
+
+    def _anchor_elements(self, anchor_number: int):
+        if anchor_number not in self._anchors:
+            ts = self._reference_time.ts
+            anchor = ts.tt_jd(self._reference_time.whole, self._reference_time.tt_fraction + anchor_number * _ANCHOR_INTERVAL.total_seconds() / (_MINUTES_PER_DAY * 60))
+            # TLE epochs are UTC, so SGP4 takes the UTC julian date, like skyfield's EarthSatellite
+            self._satrec.sgp4(anchor.whole, anchor.tai_fraction - anchor._leap_seconds() / (_MINUTES_PER_DAY * 60))
+            # after propagating, the satrec holds the mean elements at the propagated time
+            satrec = self._satrec
+            self._anchors[anchor_number] = (satrec.em, satrec.im, satrec.Om, satrec.om, satrec.mm)
+        return self._anchors[anchor_number]
@@ -0,0 +1,81 @@
+from app_config.database.mapping import Satellite
+from scheduler_service.constants import EARTH_RADIUS, EARTH_ROTATION_PER_MINUTE
+from scheduler_service.satellite_state.kernels import coverage_distance
+from scheduler_service.satellite_state.satellite_cache import get_skyfield_satellite
+from scheduler_service.schedulers.utils import get_image_dimensions
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable
+import math
+import os
+
+_IMAGE_TYPES = ("spotlight", "medium", "low")
+
+PRECISION_POLICIES = ('fixed', 'adaptive')
+
+
+@dataclass(frozen=True)
+class PrecisionPolicy:
+    """
+    Derives the step at which the event searches sample a satellite, from how long the satellite takes to cross the
+    area in which the events can happen, instead of using the same fixed step for every satellite and target.
+    A capture window lasts as long as the target's image stays in the satellite's view, which depends on the satellite's
+    ground speed, the radius of its view (its altitude and field of view) and the size of the image. A contact lasts as
+    long as the satellite is above the ground station's `send_mask`. The step is the shortest such window (an overhead
+    pass, since that is the only one the policy can bound) divided by `samples_per_pass`, kept between `min_step` and `max_step`.
+    """
+    samples_per_pass: float = 6.0
+    min_step: timedelta = timedelta(seconds=1)
+    max_step: timedelta = timedelta(minutes=5)
+
+    def capture_step(self, db_satellite: Satellite, image_types: Iterable[str] = _IMAGE_TYPES) -> timedelta:
+        """
+        Step for capture searches of targets with the provided image types. The targets of a search share the same times,
+        so the image type with the shortest window (the largest image) decides the step.
+        """
+        coverage = float(coverage_distance(self._perigee_altitude(db_satellite), db_satellite.fov))
+        largest_half_diagonal = max(0.5 * math.hypot(*get_image_dimensions(image_type)) for image_type in set(image_types))
+        window_angle = 2 * max(coverage - largest_half_diagonal, 0.0) / EARTH_RADIUS
+        return self._step(db_satellite, window_angle)
+
+    def contact_step(self, db_satellite: Satellite, send_masks: Iterable[float]) -> timedelta:
+        """
+        Step for contact searches with ground stations of the provided `send_mask`s (degrees). The highest mask has the shortest passes.
+        """
+        altitude = self._perigee_altitude(db_satellite)
+        mask = math.radians(max(send_masks))
+        reach = math.acos(EARTH_RADIUS * math.cos(mask) / (EARTH_RADIUS + altitude)) - mask
+        return self._step(db_satellite, 2 * reach)
+
+    def _step(self, db_satellite: Satellite, window_angle: float) -> timedelta:
+        # the sub-satellite point moves at most by the orbit's mean motion plus the earth's rotation
+        ground_speed = get_skyfield_satellite(db_satellite).model.mdot + EARTH_ROTATION_PER_MINUTE # radians per minute
+        step = timedelta(minutes=window_angle / ground_speed / self.samples_per_pass)
+        return min(max(step, self.min_step), self.max_step)
+
+    def _perigee_altitude(self, db_satellite: Satellite) -> float:
+        satrec = get_skyfield_satellite(db_satellite).model
+        return satrec.a * satrec.radiusearthkm * (1.0 - satrec.ecco) - EARTH_RADIUS # satrec.a is in earth radii
+
+
+_precision_policy = None
+def get_precision_policy():
+    """
+    The precision policy shared by this process, or None if PRECISION_POLICY is 'fixed' (the default), in which case the
+    searches keep the fixed `precision` of their state generator. The adaptive policy only follows the geometry of the
+    passes, not how long the orders need to be imaged, so it has to be opted into with PRECISION_POLICY='adaptive'.
+    PRECISION_SAMPLES_PER_PASS, PRECISION_MIN_STEP_SECONDS and PRECISION_MAX_STEP_SECONDS configure the adaptive policy.
+    """
+    global _precision_policy
+    policy = os.getenv("PRECISION_POLICY", "fixed")
+    if policy not in PRECISION_POLICIES:
+        raise ValueError(f"Unknown precision policy '{policy}', expected one of {PRECISION_POLICIES}")
+    if policy == 'fixed':
+        return None
+    if _precision_policy is None:
+        _precision_policy = PrecisionPolicy(
+            samples_per_pass=float(os.getenv("PRECISION_SAMPLES_PER_PASS", 6)),
+            min_step=timedelta(seconds=float(os.getenv("PRECISION_MIN_STEP_SECONDS", 1))),
+            max_step=timedelta(seconds=float(os.getenv("PRECISION_MAX_STEP_SECONDS", 300))),
+        )
+    return _precision_policy
@@ -0,0 +1,42 @@
+from app_config.database.mapping import Satellite
+from skyfield.api import EarthSatellite
+from scheduler_service.constants import get_timescale
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+
+_MAX_CACHED_SATELLITES = 256
+
+_skyfield_satellites = OrderedDict() # (satellite_id, tle_hash) -> EarthSatellite, least recently used first
+
+
+def get_skyfield_satellite(db_satellite: Satellite) -> EarthSatellite:
+    """
+    Parsed skyfield satellite for the TLE of the provided satellite row, shared by the whole process.
+    The cache is keyed by the satellite id and a hash of its TLE, so a row whose TLE changed is parsed again
+    (and replaces the satellite's stale entry) instead of being served the old orbit.
+    """
+    line1 = db_satellite.tle["line1"]
+    line2 = db_satellite.tle["line2"]
+    key = (db_satellite.id, _tle_hash(line1, line2))
+    if key in _skyfield_satellites:
+        _skyfield_satellites.move_to_end(key)
+        return _skyfield_satellites[key]
+
+    invalidate_skyfield_satellite(db_satellite.id)
+    skyfield_satellite = EarthSatellite(line1, line2, db_satellite.name, get_timescale())
+    _skyfield_satellites[key] = skyfield_satellite
+    if len(_skyfield_satellites) > _MAX_CACHED_SATELLITES:
+        _skyfield_satellites.popitem(last=False)
+    return skyfield_satellite
+
+def invalidate_skyfield_satellite(satellite_id: Optional[int] = None):
+    """
+    Drop the cached skyfield satellite of `satellite_id`, or of every satellite if no id is provided
+    """
+    for key in list(_skyfield_satellites):
+        if satellite_id is None or key[0] == satellite_id:
+            del _skyfield_satellites[key]
+
+def _tle_hash(line1: str, line2: str) -> str:
+    return hashlib.sha1(f"{line1}\n{line2}".encode()).hexdigest()[:16]
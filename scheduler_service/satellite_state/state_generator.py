@@ -5,118 +5,180 @@ from app_config import get_db_session
 from skyfield.api import EarthSatellite, load, Topos
 from skyfield.timelib import Timescale, Time
 from skyfield.searchlib import find_discrete
+from skyfield.framelib import itrs
 from datetime import datetime, timedelta, timezone
-from scheduler_service.constants import EARTH_RADIUS, get_ephemeris
+from scheduler_service.constants import EARTH_RADIUS, get_timescale
 from typing import Optional, Union
 from dataclasses import dataclass, InitVar
 from pydantic import BaseModel
 import numpy as np
 import math
 from skyfield.api import Topos, wgs84
-from haversine import haversine, Unit
-from scheduler_service.schedulers.utils import get_image_dimensions
+from scheduler_service.schedulers.utils import get_image_dimensions, get_default_imaging_duration
+from scheduler_service.satellite_state.ephemeris_cache import get_ephemeris_cache
+from scheduler_service.satellite_state.satellite_cache import get_skyfield_satellite
+from scheduler_service.satellite_state.kernels import can_capture_kernel, coverage_distance, elevation_kernel, ecef_to_geodetic, shadow_angles, epoch_microseconds, datetime_from_epoch_microseconds
+from scheduler_service.satellite_state.sun import sun_positions, is_geocentric_sunlit
+from scheduler_service.satellite_state.ground_track_index import GroundTrackIndex, get_ground_track_index
+from scheduler_service.satellite_state.pass_predictor import PassPredictor
+from scheduler_service.satellite_state.feasibility import capture_reach, contact_reach
+from scheduler_service.satellite_state.precision_policy import PrecisionPolicy
+from sgp4.api import Satrec
+
+_PROPAGATION_CHUNK_SIZE = 5000
+
+# Eclipses shorter than this fraction of the longest possible eclipse of the orbit only happen for the few orbits around the
+# beta angle at which the satellite starts/stops going through earth's shadow, so the adaptive eclipse search is allowed to miss them
+_SHORTEST_ECLIPSE_FRACTION = 0.1
+
+ECLIPSE_BACKENDS = ('skyfield', 'analytic')
 
 # This class extends the database table 'satellite'
 class SatelliteStateGenerator:
-    def __init__(self, db_satellite: Satellite, precision: timedelta = timedelta(minutes=1)):
+    def __init__(self, db_satellite: Satellite, precision: timedelta = timedelta(minutes=1), tolerance: Optional[timedelta] = None, eclipse_backend: str = 'skyfield', pass_prediction: bool = False, precision_policy: Optional[PrecisionPolicy] = None):
+        """
+        Event searches sample the satellite's state every `precision` by default.
+        If a `tolerance` is provided, they instead sample at a coarse step sized to the shortest event worth finding,
+        and only bisect the intervals where the value flips, until the event boundaries are known to within `tolerance`.
+        The `eclipse_backend` decides how the sunlit flag is computed:
+            - 'skyfield' uses the same test as skyfield's `ICRF.is_sunlit()` (the line to the sun's center crosses the earth)
+            - 'analytic' uses a conical shadow model in numpy, from the satellite's earth-fixed position
+        Both take the sun's position from the process-wide sun table, instead of evaluating the DE421 ephemeris for every time.
+        With `pass_prediction`, the multi-target capture and contact searches first predict the windows in which the satellite
+        could pass close enough to each target with a fast analytic orbit model, and only evaluate the satellite's exact state in those windows.
+        With a `precision_policy`, capture and contact searches sample the satellite at the step the policy derives from the
+        satellite's orbit and the targets, instead of every `precision`.
+        """
+        if eclipse_backend not in ECLIPSE_BACKENDS:
+            raise ValueError(f"Unknown eclipse backend '{eclipse_backend}', expected one of {ECLIPSE_BACKENDS}")
         self._db_satellite = db_satellite
         self.precision = precision
+        self.tolerance = tolerance
+        self.eclipse_backend = eclipse_backend
+        self.pass_prediction = pass_prediction
+        self.precision_policy = precision_policy
 
     def state_at(self, time: Union[datetime, Time]):
         """
-        Get the state of the satellite at the provided time
+        Get the state of the satellite at the provided time.
+        If `time` is an array of times, the states are returned as a `SatelliteStateBatch`
         """
-        # get the skyfield EarthSatellite object
-        satellite = self._get_skyfield_satellite() 
-
-        datetime_time = self._ensure_datetime(time)
         skyfield_time = self._ensure_skyfield_time(time)
 
-        # alternate method of calculating: https://arc.net/l/quote/bhepahvs
-        geocentric = satellite.at(skyfield_time)
-        subpoint = geocentric.subpoint()
-        latitude = subpoint.latitude.degrees
-        longitude = subpoint.longitude.degrees
-        altitude = subpoint.elevation.km
-
-        ephemeris = get_ephemeris()
-        sunlit_value = geocentric.is_sunlit(ephemeris)
-
         try:
             len(skyfield_time) # This will raise a TypeError if skyfield_time represents a single time
         except TypeError:
+            latitude, longitude, altitude, sunlit_value = self._propagate(skyfield_time)
             return SatelliteState(
                 satellite_id=self._db_satellite.id,
-                time=datetime_time,
+                time=self._ensure_datetime(time),
                 latitude=latitude,
                 longitude=longitude,
                 altitude=altitude,
                 is_sunlit=sunlit_value
             )
 
-        states = np.empty(len(skyfield_time), dtype=SatelliteState)
-        for i in range(len(skyfield_time)):
-            states[i] = SatelliteState(
-                satellite_id=self._db_satellite.id,
-                time=datetime_time[i],
-                latitude=latitude[i],
-                longitude=longitude[i],
-                altitude=altitude[i],
-                is_sunlit=sunlit_value[i]
-            )
-        
+        states = self._state_batch_at(skyfield_time)
         if len(states) == 1: return states[0]
-        return np.array(states)
-
-    def _create_can_capture_mapper(self, image_order):
-        def can_capture_mapper(satellite_state):
-            satellite_position = (satellite_state.latitude, satellite_state.longitude)
-            target_latitude, target_longitude = image_order.latitude, image_order.longitude
-            image_length, image_width = get_image_dimensions(image_order.image_type)
-
-            dist_subpoint_to_target_x = haversine((target_latitude, satellite_state.longitude), satellite_position, unit=Unit.KILOMETERS)
-            dist_subpoint_to_target_y = haversine((satellite_state.latitude, target_longitude), satellite_position, unit=Unit.KILOMETERS)
-
-
-            dist_x = dist_subpoint_to_target_x + 0.5*image_length
-            dist_y = dist_subpoint_to_target_y + 0.5*image_width
-            required_coverage_dist = (dist_x**2 + dist_y**2)**0.5
-
-            # https://faculty.nps.edu/awashburn/Files/Notes/EARTHCOV.pdf
-            rho = EARTH_RADIUS / (EARTH_RADIUS + satellite_state.altitude)
-
-            fov = math.radians(self._db_satellite.fov)
-            half_fov = 0.5 * fov
-
-            if math.sin(half_fov) > rho: # sensor's field of view is not limiting
-                cap_angle = math.acos(rho * math.cos(0))-0
-            else: # coverage is limited by the sensor's field of view
-                cap_angle = math.asin(math.sin(half_fov) / rho) - half_fov
-            
-            sat_coverage_dist = EARTH_RADIUS * cap_angle # this is radius * angle = arc length
-            
-            image_within_view = required_coverage_dist < sat_coverage_dist
-            return image_within_view
-        return can_capture_mapper
-    
-    def can_capture(self, image_order: ImageOrder, time: Union[datetime, Time]):
+        return states
+
+    def _state_batch_at(self, time: Time) -> "SatelliteStateBatch":
+        states = SatelliteStateBatch(
+            satellite_id=self._db_satellite.id,
+            time=epoch_microseconds(time),
+            latitude=np.empty(len(time), dtype=np.float64),
+            longitude=np.empty(len(time), dtype=np.float64),
+            altitude=np.empty(len(time), dtype=np.float64),
+            is_sunlit=np.empty(len(time), dtype=bool)
+        )
+
+        # skyfield's nutation model allocates ~20KB of temporaries per time, so we propagate in chunks to keep the peak memory bounded
+        for chunk_start in range(0, len(time), _PROPAGATION_CHUNK_SIZE):
+            chunk = slice(chunk_start, chunk_start + _PROPAGATION_CHUNK_SIZE)
+            latitude, longitude, altitude, sunlit_value = self._propagate(time[chunk])
+            states.latitude[chunk] = latitude
+            states.longitude[chunk] = longitude
+            states.altitude[chunk] = altitude
+            states.is_sunlit[chunk] = sunlit_value
+        return states
+
+    def _propagate(self, time: Time):
         """
-        Check if the satellite can capture an image of the target at the provided time
+        Get the latitude (degrees), longitude (degrees), altitude (km) and sunlit flag of the satellite at the provided time(s)
         """
-        satellite_states = self.state_at(time)
-        if type(satellite_states) == list:
-            satellite_states = np.array(satellite_states)
-        elif not isinstance(satellite_states, np.ndarray):
-            satellite_states = np.array([satellite_states])
-        
-        can_capture_values = np.vectorize(self._create_can_capture_mapper(image_order))
+        cache = get_ephemeris_cache()
+        if self.eclipse_backend == 'analytic':
+            positions = self._itrs_positions(time)
+            latitude, longitude, altitude = ecef_to_geodetic(*positions.T)
+            return latitude, longitude, altitude, self._is_sunlit_analytic(positions, time)
+        if cache is not None:
+            latitude, longitude, altitude = ecef_to_geodetic(*cache.positions(self._get_skyfield_satellite(), time))
+            return latitude, longitude, altitude, cache.is_sunlit(self._get_skyfield_satellite(), time)
+
+        # alternate method of calculating: https://arc.net/l/quote/bhepahvs
+        geocentric = self._get_skyfield_satellite().at(time)
+        subpoint = geocentric.subpoint()
+        sunlit_value = is_geocentric_sunlit(geocentric)
+        return subpoint.latitude.degrees, subpoint.longitude.degrees, subpoint.elevation.km, sunlit_value
 
+    def can_capture(self, image_order: ImageOrder, time: Union[datetime, Time, "SatelliteStateBatch"]):
+        """
+        Check if the satellite can capture an image of the target at the provided time.
+        Already computed states can be provided in place of `time` as a `SatelliteStateBatch` to avoid propagating the satellite again
+        """
+        if isinstance(time, SatelliteStateBatch):
+            latitude, longitude, altitude = time.latitude, time.longitude, time.altitude
+        else:
+            latitude, longitude, altitude = self._subpoint(self._ensure_skyfield_time(time))
 
-        can_capture_mapper = self._create_can_capture_mapper(image_order)
-        can_capture_values = np.vectorize(can_capture_mapper)(satellite_states)
+        image_length, image_width = get_image_dimensions(image_order.image_type)
+        can_capture_values = can_capture_kernel(
+            latitude, longitude, altitude,
+            image_order.latitude, image_order.longitude,
+            image_length, image_width,
+            self._db_satellite.fov
+        )
 
+        if np.ndim(can_capture_values)==0: return bool(can_capture_values)
         if len(can_capture_values)==1: return can_capture_values[0]
         return can_capture_values
+
+    def _itrs_positions(self, time: Time) -> np.ndarray:
+        """
+        Get the earth-fixed (ITRS) position of the satellite in km, as an array of shape (len(time), 3), or (3,) for a single time
+        """
+        cache = get_ephemeris_cache()
+        if cache is not None:
+            return cache.positions(self._get_skyfield_satellite(), time).T
+        if time.shape == ():
+            return self._get_skyfield_satellite().at(time).frame_xyz(itrs).km
+
+        positions = np.empty((len(time), 3), dtype=np.float64)
+        for chunk_start in range(0, len(time), _PROPAGATION_CHUNK_SIZE):
+            chunk = slice(chunk_start, chunk_start + _PROPAGATION_CHUNK_SIZE)
+            positions[chunk] = self._get_skyfield_satellite().at(time[chunk]).frame_xyz(itrs).km.T
+        return positions
+
+    def _subpoint(self, time: Time):
+        """
+        Get the latitude (degrees), longitude (degrees) and altitude (km) of the point on earth directly below the satellite
+        """
+        cache = get_ephemeris_cache()
+        if cache is not None:
+            return ecef_to_geodetic(*cache.positions(self._get_skyfield_satellite(), time))
+
+        if time.shape == ():
+            subpoint = self._get_skyfield_satellite().at(time).subpoint()
+            return subpoint.latitude.degrees, subpoint.longitude.degrees, subpoint.elevation.km
+
+        latitude, longitude, altitude = np.empty((3, len(time)), dtype=np.float64)
+        for chunk_start in range(0, len(time), _PROPAGATION_CHUNK_SIZE):
+            chunk = slice(chunk_start, chunk_start + _PROPAGATION_CHUNK_SIZE)
+            subpoint = self._get_skyfield_satellite().at(time[chunk]).subpoint()
+            latitude[chunk] = subpoint.latitude.degrees
+            longitude[chunk] = subpoint.longitude.degrees
+            altitude[chunk] = subpoint.elevation.km
+        return latitude, longitude, altitude
     
     def is_in_contact_with(self, groundstation: GroundStation, time: Union[datetime, Time]):
         time = self._ensure_skyfield_time(time)
@@ -128,12 +190,41 @@ class SatelliteStateGenerator:
         return elevation_angle.degrees > groundstation.send_mask
 
     def is_sunlit(self, time: Time):
+        if self.eclipse_backend == 'analytic':
+            return self._is_sunlit_analytic(self._itrs_positions(time), time)
+
         skyfield_satellite = self._get_skyfield_satellite()
-        ephemeris = get_ephemeris()
+        cache = get_ephemeris_cache()
+        if cache is not None:
+            return cache.is_sunlit(skyfield_satellite, time)
 
-        is_sunlit = skyfield_satellite.at(time).is_sunlit(ephemeris)
-        return is_sunlit
+        return is_geocentric_sunlit(skyfield_satellite.at(time))
     
+    def _is_sunlit_analytic(self, positions: np.ndarray, time: Time):
+        # same criterion as skyfield: the satellite is sunlit as long as the center of the sun is visible
+        _, earth_radius, separation = shadow_angles(positions, sun_positions(time))
+        return separation >= earth_radius
+
+    def shadow_events(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time]):
+        """
+        Get the intervals in which the satellite is in the penumbra (the sun is at least partly hidden by the earth) and
+        in the umbra (the sun is entirely hidden) between `start_time` and `end_time`, using the analytic shadow model
+        whatever the eclipse backend. Returns a dictionary with the 'penumbra' and 'umbra' (start, end) intervals.
+        """
+        start_time = self._ensure_skyfield_time(start_time)
+        end_time = self._ensure_skyfield_time(end_time)
+        step = self.precision if self.tolerance is None else self._shortest_eclipse_duration()
+
+        def in_shadow(time: Time):
+            sun_radius, earth_radius, separation = shadow_angles(self._itrs_positions(time), sun_positions(time))
+            return np.stack([separation < earth_radius + sun_radius, separation < earth_radius - sun_radius])
+
+        def in_shadow_rows(rows: np.ndarray, time: Time):
+            return in_shadow(time)[rows, np.arange(len(rows))]
+
+        penumbra_events, umbra_events = find_row_events(self._time_grid(start_time, end_time, step), end_time, 2, in_shadow, in_shadow_rows, self.tolerance)
+        return {'penumbra': penumbra_events, 'umbra': umbra_events}
+
     def eclipse_events(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time]):
         """
         Get the eclipse events for the satellite between `start_time` and `end_time`
@@ -149,6 +240,9 @@ class SatelliteStateGenerator:
 
         if start_time==end_time:
             change_times, change_values = [start_time], [self.is_sunlit(start_time)]
+        elif self.tolerance is not None:
+            is_sunlit_wrapper.step_days = self._shortest_eclipse_duration().total_seconds() / (24 * 60 * 60)
+            change_times, change_values = self.manual_find_discrete(start_time, end_time, is_sunlit_wrapper, tolerance=self.tolerance)
         else:
             change_times, change_values = find_discrete(start_time, end_time, is_sunlit_wrapper)
         prev_time, prev_sunlit = start_time, self.is_sunlit(start_time)
@@ -197,9 +291,11 @@ class SatelliteStateGenerator:
 
         def can_capture_wrapper(time: Time):
             return self.can_capture(image_order, time)
-        can_capture_wrapper.step_days = self.precision.seconds / (24 * 60 * 60) # convert seconds to days
+        can_capture_wrapper.step_days = self._capture_step([image_order.image_type]).total_seconds() / (24 * 60 * 60) # convert seconds to days
+        if self.tolerance is not None:
+            can_capture_wrapper.step_days = self._shortest_capture_duration([image_order]).total_seconds() / (24 * 60 * 60)
 
-        change_times, change_values = self.manual_find_discrete(start_time, end_time, can_capture_wrapper)
+        change_times, change_values = self.manual_find_discrete(start_time, end_time, can_capture_wrapper, tolerance=self.tolerance)
         prev_time, prev_can_capture = start_time, self.can_capture(image_order, start_time)
         for time, can_capture in zip(change_times, change_values):
             if prev_can_capture and not can_capture:
@@ -212,6 +308,183 @@ class SatelliteStateGenerator:
 
         return capture_events
 
+    def capture_events_for_targets(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], image_orders: list, time_ranges: Optional[list] = None, ground_track_index: Optional[GroundTrackIndex] = None):
+        """
+        Same as `capture_events()`, but for many targets at once. The satellite is only propagated once over the time range,
+        and every target is tested against the same positions as a (targets x times) broadcast.
+        If a `ground_track_index` covering the time range is provided, each target is instead only tested against the samples
+        of the index that pass close enough to it, which are found with a range query rather than by scanning the time range.
+        `time_ranges` optionally provides a (start, end) range for each target to clip its capture events to.
+        Returns a list containing the capture events of each target, in the same order as `image_orders`.
+        """
+        start_time = self._ensure_skyfield_time(start_time)
+        end_time = self._ensure_skyfield_time(end_time)
+        if len(image_orders)==0: return []
+
+        target_latitude = np.array([[order.latitude] for order in image_orders], dtype=np.float64)
+        target_longitude = np.array([[order.longitude] for order in image_orders], dtype=np.float64)
+        image_length, image_width = np.array([get_image_dimensions(order.image_type) for order in image_orders], dtype=np.float64).T[..., np.newaxis]
+
+        def can_capture_targets(time: Time):
+            latitude, longitude, altitude = self._subpoint(time)
+            return can_capture_kernel(
+                latitude, longitude, altitude,
+                target_latitude, target_longitude,
+                image_length, image_width,
+                self._db_satellite.fov
+            )
+        def can_capture_target_rows(rows: np.ndarray, time: Time):
+            latitude, longitude, altitude = self._subpoint(time)
+            return can_capture_kernel(
+                latitude, longitude, altitude,
+                target_latitude[rows, 0], target_longitude[rows, 0],
+                image_length[rows, 0], image_width[rows, 0],
+                self._db_satellite.fov
+            )
+
+        if ground_track_index is None:
+            step = self._capture_step([order.image_type for order in image_orders]) if self.tolerance is None else self._shortest_capture_duration(image_orders)
+            times = self._time_grid(start_time, end_time, step)
+            if self.pass_prediction:
+                reach = np.full(len(image_orders), capture_reach(self._db_satellite))
+                times, can_capture_targets = self._restrict_to_passes(times, step, target_latitude[:, 0], target_longitude[:, 0], reach, can_capture_targets)
+            all_capture_events = find_row_events(times, end_time, len(image_orders), can_capture_targets, can_capture_target_rows, self.tolerance)
+        else:
+            # the index usually covers more than the time range, so its events are clipped to the time range below
+            time_ranges = time_ranges or [(start_time, end_time)] * len(image_orders)
+            all_capture_events = pair_row_changes(
+                ground_track_index.times, ground_track_index.times[-1], len(image_orders),
+                *self._capture_changes_from_index(ground_track_index, target_latitude[:, 0], target_longitude[:, 0], image_length[:, 0], image_width[:, 0]),
+                can_capture_target_rows, self.tolerance
+            )
+        if time_ranges is not None:
+            all_capture_events = [self._clip_events(events, *time_range) for events, time_range in zip(all_capture_events, time_ranges)]
+        return all_capture_events
+
+    def _capture_changes_from_index(self, index: GroundTrackIndex, target_latitude: np.ndarray, target_longitude: np.ndarray, image_length: np.ndarray, image_width: np.ndarray):
+        """
+        The changes of the (targets x index samples) capture mask, as the target, sample index and new value of each change
+        """
+        # A capture needs sqrt((x + length/2)^2 + (y + width/2)^2) < coverage, where x and y are the distances from the subpoint to
+        # the target along its meridian and its parallel. The distance between them is at most x + y <= sqrt(2) * sqrt(x^2 + y^2),
+        # so every sample that can capture the target is within sqrt(2) * coverage of it
+        radius = np.sqrt(2) * np.nanmax(coverage_distance(index.altitude, self._db_satellite.fov))
+
+        change_rows, change_indices, change_values = [], [], []
+        for row in range(len(target_latitude)):
+            candidates = index.indices_within(target_latitude[row], target_longitude[row], radius)
+            captures = candidates[can_capture_kernel(
+                index.latitude[candidates], index.longitude[candidates], index.altitude[candidates],
+                target_latitude[row], target_longitude[row],
+                image_length[row], image_width[row],
+                self._db_satellite.fov
+            )]
+            if len(captures)==0: continue
+
+            # each run of consecutive samples that can capture the target rises at its first sample, and falls right after its last one
+            rises = captures[np.diff(captures, prepend=-2) != 1]
+            falls = captures[np.diff(captures, append=captures[-1] + 2) != 1] + 1
+            falls = falls[falls < len(index)]
+            change_rows.append(np.full(len(rises) + len(falls), row))
+            change_indices.append(np.concatenate([rises, falls]))
+            change_values.append(np.concatenate([np.ones(len(rises), dtype=bool), np.zeros(len(falls), dtype=bool)]))
+
+        if len(change_rows)==0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=bool)
+        return np.concatenate(change_rows), np.concatenate(change_indices), np.concatenate(change_values)
+
+    def ground_track_index(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time]) -> GroundTrackIndex:
+        """
+        Index of the satellite's ground track sampled every `precision` (or at the precision policy's capture step), over the whole UTC days from `start_time` to `end_time`.
+        Indexes are shared by the process, so later searches within the same days reuse the same index.
+        """
+        first_day = self._ensure_skyfield_time(start_time).utc_datetime().replace(hour=0, minute=0, second=0, microsecond=0)
+        end = self._ensure_skyfield_time(end_time).utc_datetime()
+        last_day = end.replace(hour=0, minute=0, second=0, microsecond=0)
+        if last_day < end:
+            last_day += timedelta(days=1)
+
+        step = self._capture_step()
+        def build():
+            times = self._time_grid(self._ensure_skyfield_time(first_day), self._ensure_skyfield_time(last_day), step)
+            return GroundTrackIndex(times, *self._subpoint(times))
+
+        tle = self._db_satellite.tle
+        key = (self._db_satellite.id, tle["line1"], tle["line2"], first_day, last_day, step)
+        return get_ground_track_index(key, build)
+
+    def contact_events_for_groundstations(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], groundstations: list, time_ranges: Optional[list] = None):
+        """
+        Same as `contact_events()`, but for many ground stations at once. The satellite is only propagated once over the time range,
+        and the elevation of the satellite above every ground station is computed from the same earth-fixed positions
+        as a (groundstations x times) matrix, which is compared against the `send_mask` of each ground station.
+        The satellite is sampled every `precision` or at the precision policy's contact step (so shorter contacts can be missed), and if a `tolerance` is provided,
+        the contact boundaries are refined by bisection.
+        `time_ranges` optionally provides a (start, end) range for each ground station to clip its contact events to.
+        Returns a list containing the contact events of each ground station, in the same order as `groundstations`.
+        """
+        start_time = self._ensure_skyfield_time(start_time)
+        end_time = self._ensure_skyfield_time(end_time)
+        if len(groundstations)==0: return []
+
+        station_latitude = np.array([[groundstation.latitude] for groundstation in groundstations], dtype=np.float64)
+        station_longitude = np.array([[groundstation.longitude] for groundstation in groundstations], dtype=np.float64)
+        send_mask = np.array([[groundstation.send_mask] for groundstation in groundstations], dtype=np.float64)
+        step = self._contact_step([groundstation.send_mask for groundstation in groundstations])
+        times = self._time_grid(start_time, end_time, step)
+
+        def in_contact_with_groundstations(time: Time):
+            positions = self._itrs_positions(time)
+            return elevation_kernel(positions[np.newaxis], station_latitude, station_longitude) > send_mask
+        def in_contact_with_groundstation_rows(rows: np.ndarray, time: Time):
+            positions = self._itrs_positions(time)
+            return elevation_kernel(positions, station_latitude[rows, 0], station_longitude[rows, 0]) > send_mask[rows, 0]
+
+        if self.pass_prediction:
+            reach = np.array([contact_reach(self._db_satellite, groundstation.send_mask) for groundstation in groundstations])
+            times, in_contact_with_groundstations = self._restrict_to_passes(times, step, station_latitude[:, 0], station_longitude[:, 0], reach, in_contact_with_groundstations)
+        all_contact_events = find_row_events(times, end_time, len(groundstations), in_contact_with_groundstations, in_contact_with_groundstation_rows, self.tolerance)
+        if time_ranges is not None:
+            all_contact_events = [self._clip_events(events, *time_range) for events, time_range in zip(all_contact_events, time_ranges)]
+        return all_contact_events
+
+    def _restrict_to_passes(self, times: Time, step: timedelta, target_latitude: np.ndarray, target_longitude: np.ndarray, reach: np.ndarray, mask_at):
+        """
+        Predict the passes of the satellite over the targets, and restrict a search over `times` to the candidate windows.
+        `reach` is the largest angle (radians at the earth's center) between the sub-satellite point and each target at which
+        the `mask_at(time)` of the target can be True.
+        Returns the times of `times` in the window of at least one target, and a `mask_at` that is False outside of each target's windows.
+        """
+        predictor = PassPredictor(Satrec.twoline2rv(self._db_satellite.tle["line1"], self._db_satellite.tle["line2"]), times[0])
+        target_latitude, target_longitude = np.radians(target_latitude), np.radians(target_longitude)
+        target_directions = np.stack([
+            np.cos(target_latitude) * np.cos(target_longitude), np.cos(target_latitude) * np.sin(target_longitude), np.sin(target_latitude)
+        ], axis=-1)
+        # widen the windows by a step, so that the samples on both sides of every boundary are searched
+        reach = reach + predictor.max_angle_per_minute() * step.total_seconds() / 60
+
+        def candidates_at(time: Time):
+            return predictor.candidates(time, target_directions, reach)
+
+        in_any_window = np.concatenate([
+            np.any(candidates_at(times[chunk_start:chunk_start + _PROPAGATION_CHUNK_SIZE]), axis=0)
+            for chunk_start in range(0, len(times), _PROPAGATION_CHUNK_SIZE)
+        ])
+        return times[np.nonzero(in_any_window)[0]], lambda time: mask_at(time) & candidates_at(time)
+
+    def _clip_events(self, events: list, start_time: Union[datetime, Time], end_time: Union[datetime, Time]):
+        start_time = self._ensure_skyfield_time(start_time)
+        end_time = self._ensure_skyfield_time(end_time)
+
+        clipped_events = []
+        for event_start, event_end in events:
+            if event_end.tt <= start_time.tt or event_start.tt >= end_time.tt: continue
+            clipped_events.append((
+                event_start if event_start.tt > start_time.tt else start_time,
+                event_end if event_end.tt < end_time.tt else end_time
+            ))
+        return clipped_events
+
     def stream(self, reference_time: Optional[datetime] = None):
         time_offset = reference_time - datetime.now() if reference_time else timedelta(seconds=0)
         ts = self._get_timescale()
@@ -219,37 +492,40 @@ class SatelliteStateGenerator:
             yield self.state_at(datetime.now() + time_offset)
 
 
-    def track(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], time_delta: Optional[timedelta]):
+    def track(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], time_delta: Optional[timedelta] = None) -> "SatelliteStateBatch":
+        """
+        Get the states of the satelite from `start_time` to `end_time` at intervals of `time_delta`.
+        Iterating through the returned batch gives the individual `SatelliteState`s
+        """
+        return self._state_batch_at(self._track_times(start_time, end_time, time_delta))
+
+    def track_chunks(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], time_delta: Optional[timedelta] = None, chunk_size: int = _PROPAGATION_CHUNK_SIZE):
         """
-        This is a generator that iterates through the states of the satelite from `start_time` to `end_time` at intervals of `time_delta`
+        Same states as `track()`, yielded as `SatelliteStateBatch`es of at most `chunk_size` states, so that long tracks can be
+        streamed without holding every state in memory. Each chunk is propagated in a single vectorized call.
         """
+        times = self._track_times(start_time, end_time, time_delta)
+        for chunk_start in range(0, len(times), chunk_size):
+            yield self._state_batch_at(times[chunk_start:chunk_start + chunk_size])
+
+    def _track_times(self, start_time: Union[datetime, Time], end_time: Union[datetime, Time], time_delta: Optional[timedelta] = None) -> Time:
         if time_delta is None:
             time_delta = self.precision
         start_time = self._ensure_skyfield_time(start_time)
         end_time = self._ensure_skyfield_time(end_time)
 
+        step_days = time_delta.total_seconds() / (24 * 60 * 60)
+        num_steps = max(int(np.ceil((end_time.tt - start_time.tt) / step_days)), 0)
+
+        # offset from the start time's whole julian date, to avoid losing precision when adding small offsets to large julian dates
         ts = self._get_timescale()
-        current_time = start_time # Compare Julian dates
-        while current_time.tt < end_time.tt:
-            yield self.state_at(current_time)
-            current_time = ts.utc(current_time.utc_datetime() + time_delta)
-
-    _skyfield_satellite: Optional[EarthSatellite] = None
-    def _get_skyfield_satellite(self):
-        if self._skyfield_satellite is not None:
-            return self._skyfield_satellite
-
-        line1 = self._db_satellite.tle["line1"]
-        line2 = self._db_satellite.tle["line2"]
-        name = self._db_satellite.name
-        self._skyfield_satellite = EarthSatellite(line1, line2, name, self._get_timescale())
-        return self._skyfield_satellite
-
-    _timescale: Optional[Timescale] = None
-    def _get_timescale(self):
-        if self._timescale is None:
-            self._timescale = load.timescale()
-        return self._timescale
+        return ts.tt_jd(start_time.whole, start_time.tt_fraction + np.arange(num_steps) * step_days)
+
+    def _get_skyfield_satellite(self) -> EarthSatellite:
+        return get_skyfield_satellite(self._db_satellite)
+
+    def _get_timescale(self) -> Timescale:
+        return get_timescale()
 
     def _ensure_skyfield_time(self, time: Union[datetime, Time]) -> Time:
         if isinstance(time, Time):
@@ -265,28 +541,185 @@ class SatelliteStateGenerator:
             return time
         return time.utc_datetime()
     
-    def manual_find_discrete(self, start_time: Time, end_time: Time, function):
+    def _time_grid(self, start_time: Time, end_time: Time, step: timedelta) -> Time:
         """
-        This function is a manual implementation of the skyfield.searchlib.find_discrete() function, as it doesn't seem to work for some cases.
+        Evenly spaced times covering the entire interval from `start_time` to `end_time` (inclusive), at most `step` apart
         """
-        step_days = timedelta(days=function.step_days)
         # calculate number of steps
         start = self._ensure_datetime(start_time)
         end = self._ensure_datetime(end_time)
-        num_steps = int(np.ceil((end - start).total_seconds() / step_days.total_seconds()))
+        num_steps = max(int(np.ceil((end - start).total_seconds() / step.total_seconds())), 1)
 
         # Generate an array of times using linspace, ensuring coverage of the entire interval
         ts = self._get_timescale()
-        times_to_evaluate = ts.linspace(start_time, end_time, num_steps)
+        return ts.linspace(start_time, end_time, num_steps + 1)
 
-        # detect change points, including the first point
-        values = function(times_to_evaluate)
-        values = values if isinstance(values, np.ndarray) or isinstance(values, list) else np.array([values])
-        changes = np.diff(values, prepend=values[0])
-        change_indices = np.where(changes != 0)[0]
+    def manual_find_discrete(self, start_time: Time, end_time: Time, function, tolerance: Optional[timedelta] = None):
+        """
+        This function is a manual implementation of the skyfield.searchlib.find_discrete() function, as it doesn't seem to work for some cases.
+        If a `tolerance` is provided, `function.step_days` is only used as a coarse step, and the change points are refined by
+        bisecting the steps in which the value flips. The coarse step must be shorter than the shortest event you want to find,
+        as a value that flips and then flips back within a single step is not detected.
+        Returns the times and the new values of the change points. See `iter_discrete_changes()` to stream them instead.
+        """
+        changes = list(self.iter_discrete_changes(start_time, end_time, function, tolerance))
+        if len(changes) == 0:
+            return [], np.array([])
 
-        change_times = times_to_evaluate[change_indices] if len(change_indices) > 0 else []
-        return change_times, values[change_indices]
+        change_times, change_values = zip(*changes)
+        ts = self._get_timescale()
+        change_times = ts.tt_jd(np.array([time.whole for time in change_times]), np.array([time.tt_fraction for time in change_times]))
+        return change_times, np.array(change_values)
+
+    def iter_discrete_changes(self, start_time: Time, end_time: Time, function, tolerance: Optional[timedelta] = None):
+        """
+        Same search as `manual_find_discrete()`, but the time range is evaluated in chunks of `_PROPAGATION_CHUNK_SIZE` steps,
+        and the (time, new value) of each change point is yielded as soon as its chunk is done. The last time and value of each
+        chunk are carried over to the next one, so that changes on chunk boundaries are still found, and the memory used
+        doesn't depend on the length of the time range.
+        """
+        start, end = self._ensure_datetime(start_time), self._ensure_datetime(end_time)
+        num_steps = max(int(np.ceil((end - start).total_seconds() / (function.step_days * 24 * 60 * 60))), 1)
+        step_days = (end_time.tt - start_time.tt) / num_steps # same evenly spaced times as `_time_grid()`
+        ts = self._get_timescale()
+
+        prev_value = None
+        for chunk_start in range(0, num_steps + 1, _PROPAGATION_CHUNK_SIZE):
+            # each chunk also includes the last time of the previous chunk, so that a change right at the boundary can be bisected.
+            # Times are offsets from the start time's whole julian date, to avoid losing precision when adding small offsets to large julian dates
+            steps = np.arange(max(chunk_start - 1, 0), min(chunk_start + _PROPAGATION_CHUNK_SIZE, num_steps + 1))
+            chunk_times = ts.tt_jd(start_time.whole, start_time.tt_fraction + steps * step_days)
+            values = function(chunk_times if prev_value is None else chunk_times[1:])
+            values = np.asarray(values) if isinstance(values, np.ndarray) or isinstance(values, list) else np.array([values])
+            if prev_value is not None:
+                values = np.concatenate([[prev_value], values])
+            prev_value = values[-1]
+
+            change_indices = np.nonzero(values[1:] != values[:-1])[0] + 1
+            if len(change_indices) == 0: continue
+            if tolerance is None:
+                change_times = chunk_times[change_indices]
+            else:
+                change_times = bisect_changes(chunk_times, change_indices - 1, change_indices, values[change_indices], function, tolerance)
+            for change_time, change_value in zip(change_times, values[change_indices]):
+                yield change_time, change_value
+
+    def _capture_step(self, image_types: Optional[list] = None) -> timedelta:
+        """
+        Step of the capture searches for targets of the provided image types (all of them by default)
+        """
+        if self.precision_policy is None:
+            return self.precision
+        if image_types is None:
+            return self.precision_policy.capture_step(self._db_satellite)
+        return self.precision_policy.capture_step(self._db_satellite, image_types)
+
+    def _contact_step(self, send_masks: list) -> timedelta:
+        """
+        Step of the contact searches for ground stations with the provided `send_mask`s
+        """
+        if self.precision_policy is None:
+            return self.precision
+        return self.precision_policy.contact_step(self._db_satellite, send_masks)
+
+    def _shortest_capture_duration(self, image_orders: list) -> timedelta:
+        """
+        Capture opportunities that are shorter than the imaging duration of the order can't be used to fulfill it,
+        so the shortest imaging duration of the orders is the shortest capture event worth finding.
+        Targets without a duration (e.g. capture processing blocks) use the default imaging duration of their image type.
+        """
+        return min(getattr(order, 'duration', None) or get_default_imaging_duration(order.image_type) for order in image_orders)
+
+    def _shortest_eclipse_duration(self) -> timedelta:
+        """
+        Shortest eclipse worth finding, as a fraction of the longest eclipse of the satellite's orbit.
+        The longest eclipse happens when the sun is in the orbital plane, and lasts for the part of the orbit
+        that is within the (cylindrical) shadow of the earth.
+        """
+        satrec = self._get_skyfield_satellite().model
+        orbital_period = timedelta(minutes=2 * math.pi / satrec.no_kozai)
+        longest_eclipse = orbital_period * math.asin(min(1 / satrec.a, 1.0)) / math.pi # satrec.a is in earth radii
+        return longest_eclipse * _SHORTEST_ECLIPSE_FRACTION
+
+
+def find_row_events(times: Time, end_time: Time, num_rows: int, mask_at, mask_of_rows_at, tolerance: Optional[timedelta] = None):
+    """
+    Find the intervals in which each row of a (rows x times) boolean mask is True, such as when each of several targets
+    can be captured. `mask_at(time)` gives the (rows x len(time)) mask for a chunk of `times`, and `mask_of_rows_at(rows, time)`
+    gives the value of row `rows[i]` at `time[i]`, which is used to refine the boundaries by bisection if a `tolerance` is provided.
+    An interval still in progress at the last time ends at `end_time`.
+    Returns a list containing the (start, end) intervals of each row.
+    """
+    if len(times)==0: return [[] for _ in range(num_rows)]
+
+    # Only keep track of where the value flips, so that we never hold the full (rows x times) mask in memory.
+    # Starting from all False means rows that are True from the very start get a rise at index 0
+    prev_values = np.zeros((num_rows, 1), dtype=bool)
+    change_rows, change_indices, change_values = [], [], []
+    for chunk_start in range(0, len(times), _PROPAGATION_CHUNK_SIZE):
+        values = mask_at(times[chunk_start:chunk_start + _PROPAGATION_CHUNK_SIZE])
+        rows, indices = np.nonzero(np.diff(np.concatenate([prev_values, values], axis=1), axis=1))
+        change_rows.append(rows)
+        change_indices.append(indices + chunk_start)
+        change_values.append(values[rows, indices])
+        prev_values = values[:, -1:]
+
+    return pair_row_changes(
+        times, end_time, num_rows,
+        np.concatenate(change_rows), np.concatenate(change_indices), np.concatenate(change_values),
+        mask_of_rows_at, tolerance
+    )
+
+def pair_row_changes(times: Time, end_time: Time, num_rows: int, change_rows: np.ndarray, change_indices: np.ndarray, change_values: np.ndarray, mask_of_rows_at, tolerance: Optional[timedelta] = None):
+    """
+    Turn the changes of a (rows x times) boolean mask that starts all False, given as the row, time index and new value of
+    each change, into the intervals in which each row is True. See `find_row_events()` for the other arguments.
+    """
+    order = np.lexsort((change_indices, change_rows)) # the changes of each row, in chronological order
+    change_rows, change_indices, change_values = change_rows[order], change_indices[order], change_values[order]
+    row_boundaries = np.searchsorted(change_rows, np.arange(num_rows + 1))
+
+    if tolerance is None or len(change_indices)==0:
+        change_times = times[change_indices]
+    else:
+        # a rise at index 0 has no earlier time to bisect towards, so its interval is empty and it stays at the start time
+        change_times = bisect_changes(
+            times, np.maximum(change_indices - 1, 0), change_indices, change_values,
+            lambda time: mask_of_rows_at(change_rows, time), tolerance
+        )
+
+    all_events = []
+    for row in range(num_rows):
+        # changes alternate between the mask becoming True (even positions) and becoming False (odd positions)
+        row_changes = range(row_boundaries[row], row_boundaries[row + 1])
+        events = []
+        for i in range(0, len(row_changes), 2):
+            event_start = change_times[row_changes[i]]
+            event_end = change_times[row_changes[i + 1]] if i + 1 < len(row_changes) else end_time
+            events.append((event_start, event_end))
+        all_events.append(events)
+    return all_events
+
+def bisect_changes(times: Time, lower_indices: np.ndarray, upper_indices: np.ndarray, new_values: np.ndarray, function, tolerance: timedelta) -> Time:
+    """
+    Narrow down each interval from `times[lower_indices[i]]` to `times[upper_indices[i]]`, in which `function` changes to `new_values[i]`,
+    until it is at most `tolerance` wide. `function` must return one value per interval when given one time per interval, so all
+    the intervals are bisected together with a single vectorized call per iteration.
+    Returns the earliest time found with the new value, for each interval.
+    """
+    # work with offsets from a single reference julian date, to avoid losing precision when halving small intervals of large julian dates
+    reference = times.whole.flat[0]
+    offsets = (times.whole - reference) + times.tt_fraction
+    lower, upper = offsets[lower_indices], offsets[upper_indices]
+
+    ts = times.ts
+    tolerance_days = tolerance.total_seconds() / (24 * 60 * 60)
+    while np.max(upper - lower) > tolerance_days:
+        middle = 0.5 * (lower + upper)
+        has_new_value = np.atleast_1d(function(ts.tt_jd(reference, middle))) == new_values
+        upper = np.where(has_new_value, middle, upper)
+        lower = np.where(has_new_value, lower, middle)
+    return ts.tt_jd(reference, upper)
 
 
 class SatelliteState(BaseModel):
@@ -301,3 +734,79 @@ class SatelliteState(BaseModel):
         json_encoders = {
             datetime: lambda dt: dt.isoformat()
         }
+
+
+
+# little-endian layout of the binary form of a `SatelliteStateBatch`, one record per state
+STATE_RECORD_DTYPE = np.dtype([
+    ("time", "<i8"), # microseconds since the unix epoch (UTC)
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("altitude", "<f8"),
+    ("is_sunlit", "?"),
+])
+
+@dataclass(eq=False)
+class SatelliteStateBatch:
+    """
+    Struct-of-arrays version of a list of `SatelliteState`s. This is much lighter than a list of pydantic models when
+    working with many states at once, so `SatelliteState` models are only created when the batch is indexed or iterated through.
+    """
+    satellite_id: int
+    time: np.ndarray # int64 microseconds since the unix epoch (UTC)
+    latitude: np.ndarray # float64 degrees
+    longitude: np.ndarray # float64 degrees
+    altitude: np.ndarray # float64 km
+    is_sunlit: np.ndarray # bool
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return SatelliteState(
+                satellite_id=self.satellite_id,
+                time=datetime_from_epoch_microseconds(self.time[index]),
+                latitude=self.latitude[index],
+                longitude=self.longitude[index],
+                altitude=self.altitude[index],
+                is_sunlit=self.is_sunlit[index]
+            )
+        # slices, index arrays and boolean masks give back a smaller batch
+        return SatelliteStateBatch(
+            satellite_id=self.satellite_id,
+            time=self.time[index],
+            latitude=self.latitude[index],
+            longitude=self.longitude[index],
+            altitude=self.altitude[index],
+            is_sunlit=self.is_sunlit[index]
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def datetimes(self):
+        return [datetime_from_epoch_microseconds(time) for time in self.time]
+
+    def columns(self) -> dict:
+        """
+        The batch as a JSON-friendly dictionary of columns, with the times in microseconds since the unix epoch (UTC)
+        """
+        return {
+            "satellite_id": self.satellite_id,
+            "time": self.time.tolist(),
+            "latitude": self.latitude.tolist(),
+            "longitude": self.longitude.tolist(),
+            "altitude": self.altitude.tolist(),
+            "is_sunlit": self.is_sunlit.tolist(),
+        }
+
+    def records(self) -> np.ndarray:
+        """
+        The batch as a packed structured array of `STATE_RECORD_DTYPE`, e.g. to send it as raw bytes
+        """
+        records = np.empty(len(self), dtype=STATE_RECORD_DTYPE)
+        for name in STATE_RECORD_DTYPE.names:
+            records[name] = getattr(self, name)
+        return records
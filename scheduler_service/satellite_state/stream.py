@@ -1,16 +1,32 @@
-from app_config import rabbit
-from rabbit_wrapper import TopicConsumer
+from app_config import rabbit, create_rabbit, db_engine
+from rabbit_wrapper import TopicConsumer, TopicPublisher
+from sqlalchemy.orm import Session
 from app_config import logging
-from .tasks import state_stream_task
-# from celery.app.control import revoke
+from scheduler_service.constants import get_timescale
+from scheduler_service.satellite_state.constellation import ConstellationPropagator
+from scheduler_service.satellite_state.kernels import ecef_to_geodetic
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from time import monotonic
+import threading
+import os
 
 logger = logging.getLogger(__name__)
 
 manager = None
+streamer = None
 def register_state_streaming_listeners():
-    global manager
+    global manager, streamer
     if manager is None:
         manager = SatelliteStateStreamManager()
+    if streamer is None:
+        streamer = SatelliteStateStreamer(
+            manager,
+            interval=timedelta(seconds=float(os.getenv("STATE_STREAM_INTERVAL_SECONDS", 1))),
+            reload_interval=timedelta(seconds=float(os.getenv("STATE_STREAM_RELOAD_SECONDS", 60)))
+        )
+        streamer.start()
 
     create_listener_consumer = TopicConsumer(rabbit(), "satellite.state.listener.create")
     create_listener_consumer.register_callback(lambda message: manager.create_listener(message["satellite_id"]))
@@ -20,30 +36,121 @@ def register_state_streaming_listeners():
 
 
 class SatelliteStateStreamManager:
-    listener_counts: dict[str, int] = dict() # map from satellite id -> number of listeners
+    def __init__(self):
+        self.listener_counts: dict[int, int] = dict() # map from satellite id -> number of listeners
+        self._lock = threading.Lock() # listeners are created by the rabbit consumer, while the streamer reads them from its own thread
 
-    def create_listener(self, satellite_id: str):
+    def create_listener(self, satellite_id: int):
+        with self._lock:
+            if satellite_id not in self.listener_counts:
+                self.listener_counts[satellite_id] = 0
+            self.listener_counts[satellite_id] += 1
+            count = self.listener_counts[satellite_id]
+        logger.info(f"Created state listener for satellite id={satellite_id}. Total listener count: {count}")
 
-        if satellite_id not in self.listener_counts:
-            self.listener_counts[satellite_id] = 0
-        self.listener_counts[satellite_id] += 1
+    def destroy_listener(self, satellite_id: int):
+        with self._lock:
+            if satellite_id not in self.listener_counts: return
+            self.listener_counts[satellite_id] -= 1
+            count = self.listener_counts[satellite_id]
+            if count==0:
+                del self.listener_counts[satellite_id]
+        logger.info(f"Destroyed state listener for satellite id={satellite_id}. Total listener count: {count}")
 
-        logger.info(f"Created state listener for satellite id={satellite_id}. Total listener count: {self.listener_counts[satellite_id]}")
+    def active_satellite_ids(self) -> list:
+        """
+        Ids of the satellites that have at least one listener, in increasing order
+        """
+        with self._lock:
+            return sorted(self.listener_counts)
 
-        # providing task id ensures that the task is only run once per satellite
-        state_stream_task.apply_async(args=[satellite_id], task_id=f"satellite_id")
 
-    def destroy_listener(self, satellite_id: str):
-        if satellite_id not in self.listener_counts: return
-        self.listener_counts[satellite_id] -= 1
-        logger.info(f"Destroyed state listener for satellite id={satellite_id}. Total listener count: {self.listener_counts[satellite_id]}")
+class SatelliteStateStreamer:
+    """
+    Publishes the state of every satellite with listeners, once every `interval`, as a single batched message on the
+    'satellite.state.batch' topic. All the satellites are propagated together with one vectorized SGP4 call per tick,
+    so the cost of a tick grows with the size of the arrays, not with the number of satellites or listeners.
+    The satellites are reloaded when listeners start or stop watching satellites, and every `reload_interval` so that
+    updated TLEs are picked up.
+    """
+    def __init__(self, manager: SatelliteStateStreamManager, interval: timedelta = timedelta(seconds=1), reload_interval: timedelta = timedelta(minutes=1)):
+        self.manager = manager
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self._propagator = None
+        self._propagated_satellite_ids = None
+        self._loaded_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._session: Optional[Session] = None
 
-        if self.listener_counts[satellite_id]==0:
-            del self.listener_counts[satellite_id]
-            self._abort_task(satellite_id)
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="satellite-state-streamer", daemon=True)
+        self._thread.start()
+        logger.info(f"Started satellite state streaming every {self.interval.total_seconds()} seconds.")
 
-    def _abort_task(self, task_id: str):
-        task = state_stream_task.AsyncResult(task_id)
-        task.abort()
-        # revoke(task_id, terminate=True)
-        logger.info(f"Requested abortion of state streaming task with id={task_id}")
\ No newline at end of file
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        # neither the blocking rabbit connection nor the global database session of the main thread are thread safe,
+        # so the thread publishes on its own connection and loads the satellites with its own session
+        publisher = TopicPublisher(create_rabbit(), "satellite.state.batch")
+        self._session = Session(db_engine)
+        next_tick = monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    message = self.tick()
+                    if message is not None:
+                        publisher.publish_message(message)
+                except Exception:
+                    logger.exception("Failed to publish the satellite states.")
+                # ticks are scheduled from the previous one rather than from when the tick ended, so the rate doesn't drift
+                next_tick = max(next_tick + self.interval.total_seconds(), monotonic())
+                self._stop.wait(next_tick - monotonic())
+        finally:
+            self._session.close()
+
+    def tick(self, time: Optional[datetime] = None) -> Optional[dict]:
+        """
+        States of the satellites with listeners at `time` (now by default, naive times are UTC), as the message published on 'satellite.state.batch'.
+        Returns None if no satellite has listeners.
+        """
+        satellite_ids = self.manager.active_satellite_ids()
+        if len(satellite_ids)==0: return None
+        if self._propagated_satellite_ids != satellite_ids or monotonic() - self._loaded_at >= self.reload_interval.total_seconds():
+            # not reloaded every tick, only when the watched satellites change or their TLEs may have been updated
+            self._propagator = ConstellationPropagator.from_database(satellite_ids, session=self._session)
+            self._propagated_satellite_ids = satellite_ids
+            self._loaded_at = monotonic()
+            if self._session is not None:
+                self._session.close() # don't hold the connection until the next reload
+
+        time = time or datetime.now(timezone.utc)
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+        skyfield_time = get_timescale().from_datetime(time)
+        # same naive UTC times as the rest of the database
+        message_time = time.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+        positions = self._propagator.positions(skyfield_time)
+        is_sunlit = self._propagator.is_sunlit(skyfield_time, positions)[:, 0]
+        latitude, longitude, altitude = ecef_to_geodetic(*positions[:, 0].T)
+
+        return {
+            "time": message_time,
+            "states": [
+                {
+                    "satellite_id": satellite_id,
+                    "time": message_time,
+                    "latitude": float(latitude[i]),
+                    "longitude": float(longitude[i]),
+                    "altitude": float(altitude[i]),
+                    "is_sunlit": bool(is_sunlit[i]),
+                }
+                for i, satellite_id in enumerate(self._propagator.satellite_ids)
+                if np.isfinite(positions[i, 0]).all() # SGP4 fails for satellites that have decayed
+            ]
+        }
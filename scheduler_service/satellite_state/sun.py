@@ -0,0 +1,127 @@
+from skyfield.framelib import itrs
+from skyfield.positionlib import Geocentric
+from skyfield.timelib import Time
+from scheduler_service.constants import get_ephemeris
+from scheduler_service.satellite_state.kernels import hermite_interpolate, is_sunlit_kernel
+from datetime import timedelta
+import numpy as np
+import os
+
+_SECONDS_PER_DAY = 24 * 60 * 60
+_J2000 = 2451545.0 # TT julian date the nodes are counted from, so that every table shares the same grid
+
+# The sun moves 2.5 degrees per 10 minutes in the earth-fixed frame (almost entirely due to the earth's rotation),
+# which cubic Hermite interpolation follows to about a kilometer (a few nanoradians as seen from earth)
+_SUN_NODE_STEP = timedelta(minutes=10)
+
+# columns of the table: position (km) and velocity (km/s) of the sun relative to the earth's center,
+# in the earth-fixed frame (ITRS) and in the frame of skyfield's `Geocentric.position` (ICRF axes)
+_ITRS_POSITION = slice(0, 3)
+_ITRS_VELOCITY = slice(3, 6)
+_ICRF_POSITION = slice(6, 9)
+_ICRF_VELOCITY = slice(9, 12)
+
+
+class SunTable:
+    """
+    Position of the sun relative to the earth on a grid of nodes `step` apart, interpolated with cubic Hermite polynomials
+    of the position and velocity at the surrounding nodes.
+    The table covers the planning horizon: the first query builds the nodes from the queried times to `horizon` past them,
+    and later queries only evaluate the JPL ephemeris for the nodes they need that aren't in the table yet.
+    """
+    def __init__(self, step: timedelta = _SUN_NODE_STEP, horizon: timedelta = timedelta(days=14)):
+        self.step = step
+        self.horizon = horizon
+        self._first_node = 0
+        self._table = np.empty((0, 12), dtype=np.float64)
+
+    def itrs_positions(self, time: Time) -> np.ndarray:
+        """
+        Earth-fixed (ITRS) position of the sun in km at the provided time(s), with the coordinates along a new last axis
+        """
+        return self._interpolate(time, _ITRS_POSITION, _ITRS_VELOCITY)
+
+    def icrf_positions(self, time: Time) -> np.ndarray:
+        """
+        Position of the sun relative to the earth's center in km at the provided time(s), along the same axes as skyfield's
+        `Geocentric.position`, with the coordinates along a new last axis
+        """
+        return self._interpolate(time, _ICRF_POSITION, _ICRF_VELOCITY)
+
+    def _interpolate(self, time: Time, position_columns: slice, velocity_columns: slice) -> np.ndarray:
+        step_days = self.step.total_seconds() / _SECONDS_PER_DAY
+        offsets = (np.asarray(time.whole) - _J2000) + time.tt_fraction
+        node, u = np.divmod(np.atleast_1d(offsets).reshape(-1) / step_days, 1.0)
+        node = node.astype(np.int64)
+
+        first_node, table = self._covering(time.ts, int(np.min(node)), int(np.max(node)) + 1)
+        index = node - first_node
+        positions = hermite_interpolate(
+            table[index, position_columns], table[index, velocity_columns],
+            table[index + 1, position_columns], table[index + 1, velocity_columns],
+            self.step.total_seconds(), u[:, np.newaxis]
+        )
+        return positions.reshape(time.shape + (3,))
+
+    def _covering(self, ts, first_needed: int, last_needed: int):
+        """
+        The table, extended if needed so that it contains the nodes from `first_needed` to `last_needed`.
+        Returns the index of the first node of the table and the table.
+        """
+        first_node, table = self._first_node, self._table
+        last_node = first_node + len(table) - 1
+        if len(table) > 0 and first_node <= first_needed and last_needed <= last_node:
+            return first_node, table
+
+        if len(table) == 0:
+            horizon_nodes = int(np.ceil(self.horizon / self.step))
+            first_node, last_node = first_needed, max(last_needed, first_needed + horizon_nodes)
+            table = self._evaluate(ts, first_node, last_node)
+        else:
+            if first_needed < first_node:
+                table = np.concatenate([self._evaluate(ts, first_needed, first_node - 1), table])
+                first_node = first_needed
+            if last_needed > last_node:
+                table = np.concatenate([table, self._evaluate(ts, last_node + 1, last_needed)])
+
+        # replace both at once, so that threads sharing the table never see a table with the wrong first node
+        self._first_node, self._table = first_node, table
+        return first_node, table
+
+    def _evaluate(self, ts, first_node: int, last_node: int) -> np.ndarray:
+        step_days = self.step.total_seconds() / _SECONDS_PER_DAY
+        ephemeris = get_ephemeris()
+        nodes = ts.tt_jd(_J2000, np.arange(first_node, last_node + 1) * step_days)
+        sun = (ephemeris['sun'] - ephemeris['earth']).at(nodes)
+        itrs_position, itrs_velocity = sun.frame_xyz_and_velocity(itrs)
+
+        table = np.empty((last_node - first_node + 1, 12), dtype=np.float64)
+        table[:, _ITRS_POSITION] = itrs_position.km.T
+        table[:, _ITRS_VELOCITY] = itrs_velocity.km_per_s.T
+        table[:, _ICRF_POSITION] = sun.position.km.T
+        table[:, _ICRF_VELOCITY] = sun.velocity.km_per_s.T
+        return table
+
+
+def sun_positions(time: Time) -> np.ndarray:
+    """
+    Earth-fixed (ITRS) position of the sun in km at the provided time(s), with the coordinates along a new last axis
+    """
+    return get_sun_table().itrs_positions(time)
+
+def is_geocentric_sunlit(geocentric: Geocentric) -> np.ndarray:
+    """
+    Same as skyfield's `geocentric.is_sunlit(get_ephemeris())`, with the sun's position taken from the sun table
+    """
+    return is_sunlit_kernel(geocentric.position.km.T, get_sun_table().icrf_positions(geocentric.t))
+
+
+_sun_table = None
+def get_sun_table() -> SunTable:
+    """
+    The sun table shared by this process. SUN_TABLE_HORIZON_DAYS sets how far past the first queried time the table is built.
+    """
+    global _sun_table
+    if _sun_table is None:
+        _sun_table = SunTable(horizon=timedelta(days=float(os.getenv("SUN_TABLE_HORIZON_DAYS", 14))))
+    return _sun_table
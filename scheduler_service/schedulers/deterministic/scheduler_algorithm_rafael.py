@@ -13,7 +13,7 @@ from haversine import haversine
 from app_config import get_db_session
 from app_config.database.mapping import GroundStation, Satellite, ImageOrder, ScheduleRequest, OutageOrder, MaintenanceOrder, ScheduledMaintenance, ScheduledOutage, ScheduledImaging, Schedule, ScheduledEvent
 from sqlalchemy import case, and_, or_
-from scheduler_service.constants import get_ephemeris
+from scheduler_service.constants import get_ephemeris, get_timescale
 from scheduler_service.schedulers.utils import get_image_dimensions
 from scheduler_service.event_processing.order_processing import ensure_orders_requested
 
@@ -225,7 +225,7 @@ class satelite:
     # Load TLE files for satellites
     def loadTLE(self, tle):
 
-        ts = load.timescale() # Create timescale object for TLE computation
+        ts = get_timescale() # Shared timescale object for TLE computation
 
         if type(tle)!=str:
             data = tle
@@ -249,7 +249,6 @@ class satelite:
 
     def update(self, tm, eph, images, ts, GroundStations):
 
-        pos = self.satObj.at(tm).position.km  # Plain (x, y, z) coordinates at the current time (Center of Earth)
         subpnt = self.satObj.at(tm).subpoint()
 
         pLat = self.lat
@@ -260,16 +259,10 @@ class satelite:
 
         #print("Sattelite moved by", haversine((pLat, pLong), (self.lat, self.long)))
         
-        # Get the positions of the Earth, Sun, and satellite
-        earth_pos = eph['earth'].at(tm).position.km
-        sun_pos = eph['sun'].at(tm).position.km
-
         # Calculate altitude from position data
         semi_major_axis_km = self.satObj.model.a * 6378.137  # Get the semi-major axis in kilometers
         altitude = semi_major_axis_km - 6378.137  # The altitude is the semi-major axis minus the Earth's radius
 
-        is_sunlit = self.satObj.at(tm).is_sunlit(eph) # Check if satellite is sunlit at current time
-
         self.fov = self.viewRatio * altitude
 
         #Dec = 30.0
@@ -611,7 +604,7 @@ class System:
         self.loadOrders()
         self.loadMaint()
 
-        self.ts = load.timescale() # Create timescale object for TLE computation
+        self.ts = get_timescale() # Shared timescale object for TLE computation
         self.optimizer = RLoptimizer()
         self.schedId = 0
         self.imageID = 0
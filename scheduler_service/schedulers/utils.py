@@ -69,6 +69,16 @@ def get_image_dimensions(image_type: str):
     elif image_type == "low":
         return 40, 20
 
+def get_default_imaging_duration(image_type: str) -> timedelta:
+    # same defaults as the set_default_imaging_values() trigger on the image_order table
+    image_type = image_type.lower()
+    if image_type == "spotlight":
+        return timedelta(seconds=120)
+    elif image_type == "medium":
+        return timedelta(seconds=45)
+    elif image_type == "low":
+        return timedelta(seconds=20)
+
 def query_gaps(
         source_subquery,
         range_column: column,
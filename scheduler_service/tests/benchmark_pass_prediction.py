@@ -0,0 +1,45 @@
+"""
+Benchmark of the pass prediction stage of SatelliteStateGenerator's contact and capture searches, on the sample data.
+Run with `python -m scheduler_service.tests.benchmark_pass_prediction`. Set EPHEMERIS_CACHE_DIR to a directory to benchmark propagating with the ephemeris cache.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, load_sample_groundstations
+import numpy as np
+import time
+
+
+def benchmark(search, repeats: int = 3):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        search()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+if __name__ == '__main__':
+    start_time = datetime(2023, 10, 2)
+    end_time = start_time + timedelta(days=7)
+    tolerance = timedelta(seconds=1)
+    rng = np.random.default_rng(0)
+    targets = [
+        SimpleNamespace(latitude=latitude, longitude=longitude, image_type="medium")
+        for latitude, longitude in zip(rng.uniform(-70, 70, 100), rng.uniform(-180, 180, 100))
+    ]
+    groundstations = load_sample_groundstations()
+
+    for satellite in load_sample_satellites():
+        exhaustive = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=tolerance)
+        predicted = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=tolerance, pass_prediction=True)
+
+        # warm up the caches shared by both searches (parsed TLE, sun table, ephemeris cache tables)
+        exhaustive.contact_events_for_groundstations(start_time, end_time, groundstations)
+        contact_durations = [benchmark(lambda: generator.contact_events_for_groundstations(start_time, end_time, groundstations)) for generator in (exhaustive, predicted)]
+        capture_durations = [benchmark(lambda: generator.capture_events_for_targets(start_time, end_time, targets)) for generator in (exhaustive, predicted)]
+        print(
+            f"{satellite.name}: "
+            f"contacts {contact_durations[0]:.3f}s -> {contact_durations[1]:.3f}s ({contact_durations[0] / contact_durations[1]:.1f}x), "
+            f"captures {capture_durations[0]:.3f}s -> {capture_durations[1]:.3f}s ({capture_durations[0] / capture_durations[1]:.1f}x)"
+        )
@@ -2,8 +2,10 @@ from app_config import get_db_session
 from sqlalchemy import text, func, column, cast, ARRAY, select, bindparam, false, literal
 from typing import List, Tuple
 from datetime import datetime, timedelta
-from app_config.database.mapping import GroundStation, ScheduleRequest, ContactEvent, ScheduledImaging, ImageOrder
+from app_config.database.mapping import GroundStation, ScheduleRequest, ContactEvent, ScheduledImaging, ImageOrder, Satellite
+from pathlib import Path
 import random
+import json
 
 def create_timeline_subquery(input_ranges: List[Tuple[datetime, datetime]]):
     session = get_db_session()
@@ -21,6 +23,41 @@ def create_timeline_subquery(input_ranges: List[Tuple[datetime, datetime]]):
     return time_ranges
 
 
+def load_sample_satellites() -> List[Satellite]:
+    """
+    Satellites built from the sample data, without adding them to the database. Useful for tests that only propagate satellites.
+    """
+    samples_folder = Path(__file__).parents[2] / 'database_scripts' / 'sample_data' / 'sample_satellites'
+    satellites = []
+    for i, tle_path in enumerate(sorted((samples_folder / 'tles').glob('*.txt'))):
+        name, line1, line2 = [line.strip() for line in tle_path.read_text().strip().splitlines()]
+        info = json.loads((samples_folder / f"{name.lower().replace('-', '_')}_sat.json").read_text())
+        satellites.append(Satellite(id=i+1, name=name, tle={"line1": line1, "line2": line2}, fov=info["fov"]))
+    return satellites
+
+
+
+def load_sample_groundstations() -> List[GroundStation]:
+    """
+    Ground stations built from the sample data, without adding them to the database.
+    """
+    samples_folder = Path(__file__).parents[2] / 'database_scripts' / 'sample_data' / 'sample_groundstations'
+    return [
+        GroundStation(id=i+1, **json.loads(groundstation_path.read_text()))
+        for i, groundstation_path in enumerate(sorted(samples_folder.glob('*.json')))
+    ]
+
+
+def assert_events_match(expected_events, events, max_difference: timedelta):
+    """
+    Check that the (start, end) skyfield Time events match one for one, within `max_difference`
+    """
+    assert len(events) == len(expected_events)
+    for (expected_start, expected_end), (event_start, event_end) in zip(expected_events, events):
+        assert abs(event_start.utc_datetime() - expected_start.utc_datetime()) <= max_difference
+        assert abs(event_end.utc_datetime() - expected_end.utc_datetime()) <= max_difference
+
+
 def create_dummy_imaging_event(schedule_id, satellite_id, start_time, contact_start=None):
     session = get_db_session()
     groundstation = session.query(GroundStation).first()
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from app_config.database.mapping import ImageOrder
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, assert_events_match
+import numpy as np
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=1)
+tolerance = timedelta(seconds=1)
+
+
+def test_adaptive_eclipse_search_matches_dense_search():
+    for satellite in load_sample_satellites():
+        expected_events = SatelliteStateGenerator(satellite).eclipse_events(start_time, end_time)
+        events = SatelliteStateGenerator(satellite, tolerance=tolerance).eclipse_events(start_time, end_time)
+        assert_events_match(expected_events, events, 2*tolerance)
+
+
+def test_adaptive_capture_search_matches_dense_search():
+    rng = np.random.default_rng(0)
+    satellite = load_sample_satellites()[0]
+    orders = [
+        ImageOrder(latitude=rng.uniform(-60, 60), longitude=rng.uniform(-180, 180), image_type=image_type, duration=timedelta(seconds=20))
+        for image_type in ["spotlight", "medium", "low"] * 5
+    ]
+
+    precision = timedelta(seconds=0.5)
+    dense_events = SatelliteStateGenerator(satellite, precision=precision).capture_events_for_targets(start_time, end_time, orders)
+    adaptive_events = SatelliteStateGenerator(satellite, tolerance=tolerance).capture_events_for_targets(start_time, end_time, orders)
+    for order, expected_events, events in zip(orders, dense_events, adaptive_events):
+        # the adaptive search only promises to find the events that are long enough to image the target
+        expected_events = [event for event in expected_events if event[1].utc_datetime() - event[0].utc_datetime() >= order.duration]
+        events = [event for event in events if event[1].utc_datetime() - event[0].utc_datetime() >= order.duration]
+        assert_events_match(expected_events, events, tolerance + precision)
+
+
+def test_capture_search_with_time_ranges_matches_a_search_per_target():
+    satellite = load_sample_satellites()[0]
+    generator = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=tolerance)
+    # targets right under the ground track, so that every time range has capture opportunities
+    time_ranges = [
+        (start_time + timedelta(hours=1), start_time + timedelta(hours=7)),
+        (start_time + timedelta(hours=5, minutes=17), start_time + timedelta(hours=13)),
+        (start_time, end_time),
+        (start_time + timedelta(hours=20), end_time),
+    ]
+    orders = []
+    for (range_start, range_end), image_type in zip(time_ranges, ["spotlight", "medium", "low", "medium"]):
+        subpoint = generator.state_at(range_start + (range_end - range_start) / 2)
+        orders.append(ImageOrder(latitude=subpoint.latitude, longitude=subpoint.longitude, image_type=image_type, duration=timedelta(seconds=20)))
+
+    scanned_events = generator.capture_events_for_targets(start_time, end_time, orders, time_ranges=time_ranges)
+    indexed_events = generator.capture_events_for_targets(start_time, end_time, orders, time_ranges=time_ranges, ground_track_index=generator.ground_track_index(start_time, end_time))
+    for order, time_range, target_scanned_events, target_indexed_events in zip(orders, time_ranges, scanned_events, indexed_events):
+        expected_events = generator.capture_events(*time_range, order)
+        assert len(expected_events) > 0
+        assert_events_match(expected_events, target_scanned_events, 2*tolerance)
+        assert_events_match(expected_events, target_indexed_events, 2*tolerance)
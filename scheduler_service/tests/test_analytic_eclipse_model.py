@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, assert_events_match
+import pytest
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=2)
+tolerance = timedelta(seconds=1)
+
+def contains(outer_events, event):
+    return any(outer_start.tt <= event[0].tt and event[1].tt <= outer_end.tt for outer_start, outer_end in outer_events)
+
+
+def test_analytic_eclipses_match_skyfield():
+    for satellite in load_sample_satellites():
+        expected_events = SatelliteStateGenerator(satellite, tolerance=tolerance).eclipse_events(start_time, end_time)
+        events = SatelliteStateGenerator(satellite, tolerance=tolerance, eclipse_backend='analytic').eclipse_events(start_time, end_time)
+        assert_events_match(expected_events, events, 2*tolerance)
+
+
+def test_shadow_events_are_nested():
+    for satellite in load_sample_satellites():
+        generator = SatelliteStateGenerator(satellite, tolerance=tolerance, eclipse_backend='analytic')
+        eclipses = generator.eclipse_events(start_time, end_time)
+        shadows = generator.shadow_events(start_time, end_time)
+
+        assert len(shadows['penumbra']) == len(eclipses)
+        for eclipse in eclipses:
+            assert contains(shadows['penumbra'], eclipse)
+        for umbra in shadows['umbra']:
+            assert contains(eclipses, umbra)
+
+
+def test_unknown_eclipse_backend():
+    with pytest.raises(ValueError):
+        SatelliteStateGenerator(load_sample_satellites()[0], eclipse_backend='cylindrical')
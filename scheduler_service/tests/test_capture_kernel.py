@@ -0,0 +1,46 @@
+import math
+import numpy as np
+from haversine import haversine, Unit
+from scheduler_service.constants import EARTH_RADIUS
+from scheduler_service.satellite_state.kernels import can_capture_kernel
+from scheduler_service.schedulers.utils import get_image_dimensions
+
+
+def scalar_can_capture(latitude, longitude, altitude, target_latitude, target_longitude, image_type, fov):
+    # reference implementation: the per-state mapper the vectorized kernel replaced
+    satellite_position = (latitude, longitude)
+    image_length, image_width = get_image_dimensions(image_type)
+
+    dist_subpoint_to_target_x = haversine((target_latitude, longitude), satellite_position, unit=Unit.KILOMETERS)
+    dist_subpoint_to_target_y = haversine((latitude, target_longitude), satellite_position, unit=Unit.KILOMETERS)
+
+    dist_x = dist_subpoint_to_target_x + 0.5*image_length
+    dist_y = dist_subpoint_to_target_y + 0.5*image_width
+    required_coverage_dist = (dist_x**2 + dist_y**2)**0.5
+
+    rho = EARTH_RADIUS / (EARTH_RADIUS + altitude)
+    half_fov = 0.5 * math.radians(fov)
+    if math.sin(half_fov) > rho:
+        cap_angle = math.acos(rho)
+    else:
+        cap_angle = math.asin(math.sin(half_fov) / rho) - half_fov
+    return required_coverage_dist < EARTH_RADIUS * cap_angle
+
+
+def test_kernel_matches_scalar_mapper():
+    rng = np.random.default_rng(42)
+    for image_type in ["spotlight", "medium", "low"]:
+        for fov in [10.0, 50.0, 170.0]:
+            target_latitude, target_longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            # sample subpoints around the target so that both outcomes are exercised
+            latitude = np.clip(target_latitude + rng.normal(0, 3, 2000), -90, 90)
+            longitude = (target_longitude + rng.normal(0, 3, 2000) + 180) % 360 - 180
+            altitude = rng.uniform(400, 800, 2000)
+
+            image_length, image_width = get_image_dimensions(image_type)
+            vectorized = can_capture_kernel(latitude, longitude, altitude, target_latitude, target_longitude, image_length, image_width, fov)
+            expected = [
+                scalar_can_capture(lat, lon, alt, target_latitude, target_longitude, image_type, fov)
+                for lat, lon, alt in zip(latitude, longitude, altitude)
+            ]
+            assert vectorized.tolist() == expected
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from scheduler_service.event_processing.capture_workers import create_capture_tasks, compute_capture_windows, run_capture_tasks, max_targets_per_task
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites
+import numpy as np
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=1)
+
+
+def sample_blocks(satellite, num_blocks: int = 12):
+    rng = np.random.default_rng(0)
+    return [
+        SimpleNamespace(
+            id=100 + i, satellite_id=satellite.id, image_type=["spotlight", "medium", "low"][i % 3],
+            latitude=float(latitude), longitude=float(longitude),
+            time_range=SimpleNamespace(lower=start_time + timedelta(hours=i), upper=end_time)
+        )
+        for i, (latitude, longitude) in enumerate(zip(rng.uniform(-60, 60, num_blocks), rng.uniform(-180, 180, num_blocks)))
+    ]
+
+
+def expected_intervals(satellite, blocks):
+    state_generator = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=timedelta(seconds=1))
+    events_per_block = state_generator.capture_events_for_targets(
+        start_time, end_time, blocks,
+        time_ranges=[(block.time_range.lower, block.time_range.upper) for block in blocks],
+        ground_track_index=state_generator.ground_track_index(start_time, end_time)
+    )
+    return sorted(
+        (block.id, event_start.utc_datetime().replace(tzinfo=None), event_end.utc_datetime().replace(tzinfo=None))
+        for block, events in zip(blocks, events_per_block)
+        for event_start, event_end in events
+    )
+
+
+def test_worker_matches_capture_search(monkeypatch):
+    monkeypatch.setenv("PRECISION_POLICY", "fixed")
+    satellite = load_sample_satellites()[0]
+    blocks = sample_blocks(satellite)
+
+    tasks = create_capture_tasks(satellite, blocks, max_targets=5)
+    assert [len(task.block_ids) for task in tasks] == [5, 5, 2]
+    results = [compute_capture_windows(task) for task in tasks]
+    for result in results:
+        assert result.start.dtype == np.int64 and result.end.dtype == np.int64
+        assert result.counts.sum() == len(result.start) == len(result.end)
+
+    intervals = sorted(interval for result in results for interval in result.intervals())
+    expected = expected_intervals(satellite, blocks)
+    assert len(intervals) == len(expected) > 0
+    for (block_id, start, end), (expected_block_id, expected_start, expected_end) in zip(intervals, expected):
+        assert block_id == expected_block_id
+        assert abs(start - expected_start) <= timedelta(microseconds=1)
+        assert abs(end - expected_end) <= timedelta(microseconds=1)
+
+
+def test_tasks_fit_the_memory_budget():
+    # one target over a week takes about 3.9 MB, so a 16 MB budget fits 4 targets per task
+    assert max_targets_per_task(1000, 7.0, workers=16, memory_budget=16 * 1024 * 1024) == 4
+    # small searches are still spread over every worker
+    assert max_targets_per_task(32, 1.0, workers=16, memory_budget=512 * 1024 * 1024) == 2
+    assert max_targets_per_task(1, 30.0, workers=16, memory_budget=1024) == 1
+
+
+def test_pool_matches_single_process(monkeypatch):
+    monkeypatch.setenv("PRECISION_POLICY", "fixed")
+    satellite = load_sample_satellites()[1]
+    tasks = create_capture_tasks(satellite, sample_blocks(satellite), max_targets=3)
+
+    in_process = sorted(interval for result in run_capture_tasks(tasks, workers=1) for interval in result.intervals())
+    in_pool = sorted(interval for result in run_capture_tasks(tasks, workers=2) for interval in result.intervals())
+    assert in_pool == in_process
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from scheduler_service.satellite_state import state_generator
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=1)
+tolerance = timedelta(seconds=1)
+
+
+def test_chunked_eclipse_search_matches_single_chunk(monkeypatch):
+    satellite = load_sample_satellites()[0]
+    expected_events = SatelliteStateGenerator(satellite, tolerance=tolerance).eclipse_events(start_time, end_time)
+    # small enough for some change points to fall on the chunk boundaries
+    monkeypatch.setattr(state_generator, "_PROPAGATION_CHUNK_SIZE", 2)
+    events = SatelliteStateGenerator(satellite, tolerance=tolerance).eclipse_events(start_time, end_time)
+
+    assert len(expected_events) > 0 and len(events) == len(expected_events)
+    for (expected_start, expected_end), (event_start, event_end) in zip(expected_events, events):
+        assert abs(event_start.utc_datetime() - expected_start.utc_datetime()) < timedelta(milliseconds=1)
+        assert abs(event_end.utc_datetime() - expected_end.utc_datetime()) < timedelta(milliseconds=1)
+
+
+def test_discrete_changes_are_streamed_in_order():
+    generator = SatelliteStateGenerator(load_sample_satellites()[0])
+    start, end = generator._ensure_skyfield_time(start_time), generator._ensure_skyfield_time(end_time)
+    def is_sunlit(time):
+        return generator.is_sunlit(time)
+    is_sunlit.step_days = 60 / (24 * 60 * 60)
+
+    changes = list(generator.iter_discrete_changes(start, end, is_sunlit))
+    times, values = generator.manual_find_discrete(start, end, is_sunlit)
+    assert len(changes) == len(times) > 0
+    assert all(earlier.tt < later.tt for (earlier, _), (later, _) in zip(changes, changes[1:]))
+    assert [value for _, value in changes] == list(values)
@@ -0,0 +1,74 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from app_config import get_db_session
+from app_config.database.mapping import Satellite, EclipseProcessingBlock
+from sqlalchemy import func
+import multiprocessing
+import pytest
+import time
+import os
+
+# far enough in the future not to touch the blocks of the sample data
+window_start = datetime(2090, 1, 1, tzinfo=timezone.utc)
+window_end = window_start + timedelta(days=3)
+num_workers = 8
+
+
+def claim_blocks(tile_hours: float) -> list:
+    """
+    Runs in its own process: claims the unprocessed eclipse blocks of the window, holds them for a moment so that the other
+    workers contend for them, and marks them processed
+    """
+    os.environ["PROCESSING_TILE_HOURS"] = str(tile_hours)
+    from scheduler_service.event_processing.utils import retrieve_and_lock_unprocessed_blocks_for_processing
+
+    session = get_db_session()
+    blocks = retrieve_and_lock_unprocessed_blocks_for_processing(
+        window_start, window_end,
+        EclipseProcessingBlock,
+        partition_column_names=[EclipseProcessingBlock.satellite_id],
+        valid_partition_values_subquery=session.query(Satellite.id.label('satellite_id')).subquery(),
+        skip_locked=True
+    )
+    claimed = [block.id for block in blocks]
+    time.sleep(0.2)
+    for block in blocks:
+        block.status = 'processed'
+    session.commit()
+    return claimed
+
+
+def delete_window_blocks():
+    session = get_db_session()
+    session.query(EclipseProcessingBlock).filter(
+        EclipseProcessingBlock.time_range.op('&&')(func.tstzrange(window_start, window_end))
+    ).delete(synchronize_session=False)
+    session.commit()
+
+
+@pytest.mark.parametrize("tile_hours", [24, 0])
+def test_concurrent_workers_claim_disjoint_blocks(tile_hours):
+    delete_window_blocks()
+    try:
+        # fresh processes, so that the workers don't share the database connections of this one
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(claim_blocks, tile_hours) for _ in range(num_workers)]
+            claims = [future.result(timeout=120) for future in futures]
+
+        claimed_ids = [block_id for claim in claims for block_id in claim]
+        assert len(claimed_ids) == len(set(claimed_ids)) # no block was claimed twice
+
+        # every satellite's window is covered by processed blocks that were all claimed by some worker
+        session = get_db_session()
+        satellite_ids = [satellite_id for satellite_id, in session.query(Satellite.id)]
+        blocks = session.query(EclipseProcessingBlock).filter(
+            EclipseProcessingBlock.time_range.op('&&')(func.tstzrange(window_start, window_end))
+        ).all()
+        assert {block.id for block in blocks} == set(claimed_ids)
+        assert all(block.status == 'processed' for block in blocks)
+        for satellite_id in satellite_ids:
+            ranges = sorted((block.time_range.lower, block.time_range.upper) for block in blocks if block.satellite_id == satellite_id)
+            assert ranges[0][0] <= window_start and ranges[-1][1] >= window_end
+            assert all(previous[1] == current[0] for previous, current in zip(ranges, ranges[1:]))
+    finally:
+        delete_window_blocks()
@@ -0,0 +1,42 @@
+import numpy as np
+from datetime import timedelta
+from skyfield.api import EarthSatellite, load
+from skyfield.framelib import itrs
+from scheduler_service.constants import get_ephemeris
+from scheduler_service.satellite_state.constellation import ConstellationPropagator
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+def test_constellation_matches_individual_satellites():
+    ts = load.timescale()
+    satellites = load_sample_satellites()
+    propagator = ConstellationPropagator(satellites)
+    time = ts.utc(2023, 10, 2, 0, 0, np.arange(0, 24*60*60, 30))
+
+    positions = propagator.positions(time)
+    is_sunlit = propagator.is_sunlit(time, positions)
+    assert positions.shape == (len(satellites), len(time), 3)
+    for i, satellite in enumerate(satellites):
+        geocentric = EarthSatellite(satellite.tle["line1"], satellite.tle["line2"], satellite.name, ts).at(time)
+        assert np.allclose(positions[i], geocentric.frame_xyz(itrs).km.T, rtol=0, atol=1e-6) # km
+        assert np.array_equal(is_sunlit[i], geocentric.is_sunlit(get_ephemeris()))
+
+
+def test_constellation_eclipse_events_match_individual_satellites():
+    ts = load.timescale()
+    satellites = load_sample_satellites()
+    start_time, end_time = ts.utc(2023, 10, 2), ts.utc(2023, 10, 3)
+    tolerance = timedelta(seconds=1)
+
+    eclipse_events = ConstellationPropagator(satellites).eclipse_events(start_time, end_time, tolerance=tolerance)
+    for satellite, satellite_eclipse_events in zip(satellites, eclipse_events):
+        satellite_object = EarthSatellite(satellite.tle["line1"], satellite.tle["line2"], satellite.name, ts)
+        assert len(satellite_eclipse_events) > 0
+        margin = 2*tolerance.total_seconds() / (24*60*60) # days
+        for eclipse_start, eclipse_end in satellite_eclipse_events:
+            # the satellite is in earth's shadow just inside each eclipse, and in sunlight just outside of it
+            assert not satellite_object.at(ts.tt_jd([eclipse_start.tt + margin, eclipse_end.tt - margin])).is_sunlit(get_ephemeris()).any()
+            if eclipse_start.tt > start_time.tt:
+                assert satellite_object.at(ts.tt_jd(eclipse_start.tt - margin)).is_sunlit(get_ephemeris())
+            if eclipse_end.tt < end_time.tt:
+                assert satellite_object.at(ts.tt_jd(eclipse_end.tt + margin)).is_sunlit(get_ephemeris())
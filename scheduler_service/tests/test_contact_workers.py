@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from scheduler_service.event_processing.contact_workers import create_contact_task, compute_contact_windows, run_contact_tasks
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, load_sample_groundstations
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=2)
+
+
+def sample_blocks(satellite, groundstations):
+    return [
+        SimpleNamespace(
+            id=100 * satellite.id + i, satellite_id=satellite.id, groundstation_id=groundstation.id,
+            time_range=SimpleNamespace(lower=start_time + timedelta(hours=i), upper=end_time)
+        )
+        for i, groundstation in enumerate(groundstations)
+    ]
+
+
+def test_worker_matches_contact_search(monkeypatch):
+    monkeypatch.setenv("PRECISION_POLICY", "fixed")
+    satellite = load_sample_satellites()[0]
+    groundstations = load_sample_groundstations()
+    blocks = sample_blocks(satellite, groundstations)
+
+    windows = compute_contact_windows(create_contact_task(satellite, blocks, {groundstation.id: groundstation for groundstation in groundstations}))
+    assert windows.counts.sum() == len(windows.start) == len(windows.end) > 0
+
+    state_generator = SatelliteStateGenerator(satellite, tolerance=timedelta(seconds=1))
+    events_per_block = state_generator.contact_events_for_groundstations(
+        start_time, end_time, groundstations,
+        time_ranges=[(block.time_range.lower, block.time_range.upper) for block in blocks]
+    )
+    expected = [
+        (block.id, event_start.utc_datetime().replace(tzinfo=None), event_end.utc_datetime().replace(tzinfo=None))
+        for block, events in zip(blocks, events_per_block)
+        for event_start, event_end in events
+    ]
+    intervals = list(windows.intervals())
+    assert len(intervals) == len(expected)
+    for (block_id, start, end), (expected_block_id, expected_start, expected_end) in zip(intervals, expected):
+        assert block_id == expected_block_id
+        assert abs(start - expected_start) <= timedelta(microseconds=1)
+        assert abs(end - expected_end) <= timedelta(microseconds=1)
+
+
+def test_pool_matches_single_process(monkeypatch):
+    monkeypatch.setenv("PRECISION_POLICY", "fixed")
+    groundstations = load_sample_groundstations()
+    groundstations_by_id = {groundstation.id: groundstation for groundstation in groundstations}
+    tasks = [create_contact_task(satellite, sample_blocks(satellite, groundstations), groundstations_by_id) for satellite in load_sample_satellites()]
+
+    in_process = sorted(interval for result in run_contact_tasks(tasks, workers=1) for interval in result.intervals())
+    in_pool = sorted(interval for result in run_contact_tasks(tasks, workers=2) for interval in result.intervals())
+    assert len(in_process) > 0 and in_pool == in_process
@@ -0,0 +1,58 @@
+import numpy as np
+import time
+from datetime import timedelta
+from skyfield.api import EarthSatellite, load
+from scheduler_service.constants import get_ephemeris
+from scheduler_service.satellite_state import ephemeris_cache as ephemeris_cache_module
+from scheduler_service.satellite_state.ephemeris_cache import EphemerisCache, get_ephemeris_cache
+from scheduler_service.satellite_state.kernels import ecef_to_geodetic, haversine_distance
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+def test_cached_states_match_propagated_states(tmp_path):
+    ts = load.timescale()
+    rng = np.random.default_rng(0)
+    time = ts.utc(2023, 10, 2, 0, 0, np.sort(rng.uniform(0, 2*24*60*60, 5000)))
+
+    for db_satellite in load_sample_satellites():
+        satellite = EarthSatellite(db_satellite.tle["line1"], db_satellite.tle["line2"], db_satellite.name, ts)
+        cache = EphemerisCache(tmp_path, step=timedelta(minutes=1))
+        latitude, longitude, altitude = ecef_to_geodetic(*cache.positions(satellite, time))
+        is_sunlit = cache.is_sunlit(satellite, time)
+
+        geocentric = satellite.at(time)
+        subpoint = geocentric.subpoint()
+        assert np.max(haversine_distance(latitude, longitude, subpoint.latitude.degrees, subpoint.longitude.degrees)) < 0.01 # km
+        assert np.max(np.abs(altitude - subpoint.elevation.km)) < 0.01
+        assert np.array_equal(is_sunlit, geocentric.is_sunlit(get_ephemeris()))
+
+        # a second cache reads the tables written by the first one instead of propagating again
+        assert len(list((tmp_path).glob("*/*.npy"))) > 0
+        reloaded_latitude, _, _ = ecef_to_geodetic(*EphemerisCache(tmp_path, step=timedelta(minutes=1)).positions(satellite, time))
+        assert np.array_equal(reloaded_latitude, latitude)
+
+
+def test_least_recently_used_tables_are_evicted(tmp_path):
+    ts = load.timescale()
+    db_satellite = load_sample_satellites()[0]
+    satellite = EarthSatellite(db_satellite.tle["line1"], db_satellite.tle["line2"], db_satellite.name, ts)
+    EphemerisCache(tmp_path, step=timedelta(minutes=1)).positions(satellite, ts.utc(2023, 10, 1, 12))
+    table_bytes = next(tmp_path.glob("*/*.npy")).stat().st_size
+
+    # room for two tables: reading day 1 again makes day 2 the least recently used one when day 3 is written
+    cache = EphemerisCache(tmp_path, step=timedelta(minutes=1), max_bytes=2 * table_bytes)
+    for day in [2, 1, 3]:
+        cache.positions(satellite, ts.utc(2023, 10, day, 12))
+        cache._tables.clear() # read the tables from disk again, as another process would
+        time.sleep(0.01)
+    assert sorted(path.name for path in tmp_path.glob("*/*.npy")) == ["2023-10-01.npy", "2023-10-03.npy"]
+    assert list(tmp_path.glob("*/*.tmp")) == []
+
+
+def test_cache_is_disabled_unless_configured(monkeypatch, tmp_path):
+    monkeypatch.setattr(ephemeris_cache_module, "_ephemeris_cache", None)
+    monkeypatch.delenv("EPHEMERIS_CACHE_DIR", raising=False)
+    assert get_ephemeris_cache() is None
+
+    monkeypatch.setenv("EPHEMERIS_CACHE_DIR", str(tmp_path))
+    assert isinstance(get_ephemeris_cache(), EphemerisCache)
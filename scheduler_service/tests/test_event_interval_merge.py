@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from scheduler_service.event_processing.utils import merge_event_intervals
+from app_config import get_db_session
+from app_config.database.mapping import Satellite, SatelliteEclipse
+
+# far enough in the future not to touch the eclipses of the sample data
+base_time = datetime(2090, 1, 1)
+
+def hours(start: float, end: float):
+    return base_time + timedelta(hours=start), base_time + timedelta(hours=end)
+
+
+def test_staged_intervals_are_merged_with_the_events_they_touch():
+    session = get_db_session()
+    satellite_id = session.query(Satellite.id).order_by(Satellite.id).first()[0]
+    try:
+        for start, end in [hours(0, 1), hours(2, 3), hours(5, 6), hours(10, 11)]:
+            session.add(SatelliteEclipse(asset_id=satellite_id, start_time=start, duration=end - start))
+        session.flush()
+
+        merge_event_intervals(SatelliteEclipse, ['asset_id'], [
+            ((satellite_id,), *hours(0.5, 2)),  # overlaps the first eclipse and touches the second
+            ((satellite_id,), *hours(4, 5)),    # touches the third eclipse
+            ((satellite_id,), *hours(7, 8)),    # touches nothing
+            ((satellite_id,), *hours(7.5, 9)),  # overlaps another staged interval
+        ])
+
+        eclipses = session.query(SatelliteEclipse.utc_time_range).filter(
+            SatelliteEclipse.asset_id == satellite_id,
+            SatelliteEclipse.start_time >= base_time
+        ).order_by(SatelliteEclipse.start_time).all()
+        assert [(eclipse.lower, eclipse.upper) for eclipse, in eclipses] == [hours(0, 3), hours(4, 6), hours(7, 9), hours(10, 11)]
+    finally:
+        session.rollback()
+
+
+def test_staged_intervals_starting_where_an_event_ends_are_merged():
+    session = get_db_session()
+    satellite_id = session.query(Satellite.id).order_by(Satellite.id).first()[0]
+    try:
+        # e.g. an eclipse crossing the boundary between two processing blocks, computed half in each block
+        session.add(SatelliteEclipse(asset_id=satellite_id, start_time=hours(0, 1)[0], duration=timedelta(hours=1)))
+        session.flush()
+
+        merge_event_intervals(SatelliteEclipse, ['asset_id'], [((satellite_id,), *hours(1, 2))])
+
+        eclipses = session.query(SatelliteEclipse.utc_time_range).filter(
+            SatelliteEclipse.asset_id == satellite_id,
+            SatelliteEclipse.start_time >= base_time
+        ).order_by(SatelliteEclipse.start_time).all()
+        assert [(eclipse.lower, eclipse.upper) for eclipse, in eclipses] == [hours(0, 2)]
+    finally:
+        session.rollback()
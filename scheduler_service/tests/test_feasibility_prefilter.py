@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from app_config.database.mapping import Satellite, GroundStation, ImageOrder
+from scheduler_service.satellite_state.feasibility import can_ever_capture, can_ever_contact
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+start_time = datetime(2014, 1, 20)
+end_time = start_time + timedelta(days=2)
+
+# a satellite whose inclination (51.6 degrees) is far from polar, so that there are latitudes it can never see
+iss = Satellite(id=100, name="ISS (ZARYA)", fov=30.0, tle={
+    "line1": "1 25544U 98067A   14020.93268519  .00009878  00000-0  18200-3 0  5082",
+    "line2": "2 25544  51.6498 109.4756 0003572  55.9686 274.8005 15.49815350868473",
+})
+
+
+def test_infeasible_targets_have_no_capture_opportunities():
+    orders = [
+        ImageOrder(latitude=latitude, longitude=longitude, image_type=image_type)
+        for latitude in range(45, 70) for longitude in [-120, 0, 120] for image_type in ["spotlight", "low"]
+    ]
+    events = SatelliteStateGenerator(iss, precision=timedelta(seconds=10)).capture_events_for_targets(start_time, end_time, orders)
+    feasible = [can_ever_capture(iss, order.latitude, order.image_type) for order in orders]
+
+    assert not all(feasible) and any(feasible)
+    for order_feasible, order_events in zip(feasible, events):
+        if not order_feasible:
+            assert len(order_events) == 0
+    # the prefilter is only slightly conservative: the highest latitude with captures is close to the highest feasible latitude
+    highest_captured = max(order.latitude for order, order_events in zip(orders, events) if len(order_events) > 0)
+    highest_feasible = max(order.latitude for order, order_feasible in zip(orders, feasible) if order_feasible)
+    assert highest_feasible - highest_captured <= 2
+
+
+def test_infeasible_groundstations_have_no_contacts():
+    groundstations = [GroundStation(latitude=latitude, longitude=longitude, send_mask=10.0) for latitude in range(55, 75) for longitude in [-120, 0, 120]]
+    events = SatelliteStateGenerator(iss, tolerance=timedelta(seconds=1)).contact_events_for_groundstations(start_time, end_time, groundstations)
+    feasible = [can_ever_contact(iss, groundstation) for groundstation in groundstations]
+
+    assert not all(feasible) and any(feasible)
+    for groundstation_feasible, groundstation_events in zip(feasible, events):
+        if not groundstation_feasible:
+            assert len(groundstation_events) == 0
+
+
+def test_sample_satellites_reach_their_latitudes():
+    for satellite in load_sample_satellites():
+        assert can_ever_capture(satellite, 0.0, "spotlight") and can_ever_capture(satellite, -80.0, "low")
+        assert not can_ever_capture(satellite, 89.9, "spotlight")
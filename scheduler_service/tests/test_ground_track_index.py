@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from app_config.database.mapping import ImageOrder
+from scheduler_service.satellite_state import ground_track_index
+from scheduler_service.satellite_state.ground_track_index import get_ground_track_index
+from scheduler_service.satellite_state.kernels import haversine_distance
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+start_time = datetime(2023, 10, 2, 3)
+end_time = start_time + timedelta(days=1)
+tolerance = timedelta(seconds=1)
+
+
+def test_range_query_matches_brute_force():
+    generator = SatelliteStateGenerator(load_sample_satellites()[0], precision=timedelta(seconds=10))
+    index = generator.ground_track_index(start_time, end_time)
+    assert index.times[0].utc_datetime().replace(tzinfo=None) == datetime(2023, 10, 2)
+    assert index.times[-1].utc_datetime().replace(tzinfo=None) == datetime(2023, 10, 4)
+
+    rng = np.random.default_rng(0)
+    for latitude, longitude, radius in zip(rng.uniform(-80, 80, 20), rng.uniform(-180, 180, 20), rng.uniform(100, 3000, 20)):
+        expected = np.nonzero(haversine_distance(index.latitude, index.longitude, latitude, longitude) <= radius)[0]
+        assert np.array_equal(index.indices_within(latitude, longitude, radius), expected)
+
+
+def test_indexed_capture_search_matches_scan():
+    rng = np.random.default_rng(1)
+    for satellite in load_sample_satellites():
+        orders = [
+            ImageOrder(latitude=rng.uniform(-70, 70), longitude=rng.uniform(-180, 180), image_type=image_type, duration=timedelta(seconds=20))
+            for image_type in ["spotlight", "medium", "low"] * 5
+        ]
+        generator = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=tolerance)
+        scanned_events = generator.capture_events_for_targets(start_time, end_time, orders)
+        indexed_events = generator.capture_events_for_targets(start_time, end_time, orders, ground_track_index=generator.ground_track_index(start_time, end_time))
+
+        for expected_events, events in zip(scanned_events, indexed_events):
+            assert len(events) == len(expected_events)
+            for (expected_start, expected_end), (event_start, event_end) in zip(expected_events, events):
+                assert abs(event_start.utc_datetime() - expected_start.utc_datetime()) <= 2*tolerance
+                assert abs(event_end.utc_datetime() - expected_end.utc_datetime()) <= 2*tolerance
+
+
+def test_cached_indexes_are_bounded_by_memory(monkeypatch):
+    generator = SatelliteStateGenerator(load_sample_satellites()[0], precision=timedelta(seconds=10))
+    index = generator.ground_track_index(start_time, end_time)
+    assert index.nbytes > len(index) * 8 * 5
+
+    monkeypatch.setattr(ground_track_index, "_ground_track_indexes", OrderedDict())
+    monkeypatch.setenv("GROUND_TRACK_INDEX_CACHE_MB", str(2.5 * index.nbytes / (1024 * 1024)))
+    def get_concurrently(keys):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            return list(executor.map(lambda key: get_ground_track_index(key, lambda: index), keys))
+
+    assert all(cached is index for cached in get_concurrently([0, 1, 0, 2, 0, 3] * 20))
+    assert len(ground_track_index._ground_track_indexes) == 2 # room for two indexes
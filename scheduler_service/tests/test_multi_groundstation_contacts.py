@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, load_sample_groundstations
+
+
+def test_contact_matrix_matches_skyfield_find_events():
+    start_time = datetime(2023, 10, 2)
+    end_time = start_time + timedelta(days=2)
+    groundstations = load_sample_groundstations()
+    tolerance = timedelta(seconds=1)
+
+    for satellite in load_sample_satellites():
+        state_generator = SatelliteStateGenerator(satellite, tolerance=tolerance)
+        all_contact_events = state_generator.contact_events_for_groundstations(start_time, end_time, groundstations)
+        for groundstation, contact_events in zip(groundstations, all_contact_events):
+            expected_contact_events = state_generator.contact_events(start_time, end_time, groundstation)
+            # find_events() doesn't report a contact that is still in progress at the end of the time range
+            assert len(contact_events) - len(expected_contact_events) in (0, 1)
+            for (expected_start, expected_end), (contact_start, contact_end) in zip(expected_contact_events, contact_events):
+                assert abs(contact_start.utc_datetime() - expected_start.utc_datetime()) <= 2*tolerance
+                assert abs(contact_end.utc_datetime() - expected_end.utc_datetime()) <= 2*tolerance
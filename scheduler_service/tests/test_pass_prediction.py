@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from app_config.database.mapping import GroundStation, ImageOrder
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, load_sample_groundstations, assert_events_match
+import numpy as np
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=3)
+tolerance = timedelta(seconds=1)
+
+
+def test_pass_prediction_misses_no_contacts():
+    rng = np.random.default_rng(0)
+    groundstations = load_sample_groundstations() + [
+        GroundStation(latitude=latitude, longitude=longitude, send_mask=send_mask)
+        for latitude, longitude, send_mask in zip(rng.uniform(-85, 85, 20), rng.uniform(-180, 180, 20), rng.uniform(0, 30, 20))
+    ]
+    for satellite in load_sample_satellites():
+        exhaustive_events = SatelliteStateGenerator(satellite, precision=timedelta(seconds=30), tolerance=tolerance).contact_events_for_groundstations(start_time, end_time, groundstations)
+        predicted_events = SatelliteStateGenerator(satellite, precision=timedelta(seconds=30), tolerance=tolerance, pass_prediction=True).contact_events_for_groundstations(start_time, end_time, groundstations)
+        assert sum(len(events) for events in exhaustive_events) > 0
+        for expected_events, events in zip(exhaustive_events, predicted_events):
+            assert_events_match(expected_events, events, 2*tolerance)
+
+
+def test_pass_prediction_misses_no_capture_opportunities():
+    rng = np.random.default_rng(1)
+    orders = [
+        ImageOrder(latitude=latitude, longitude=longitude, image_type=image_type, duration=timedelta(seconds=20))
+        for latitude, longitude, image_type in zip(rng.uniform(-85, 85, 30), rng.uniform(-180, 180, 30), ["spotlight", "medium", "low"] * 10)
+    ]
+    for satellite in load_sample_satellites():
+        exhaustive_events = SatelliteStateGenerator(satellite, tolerance=tolerance).capture_events_for_targets(start_time, end_time, orders)
+        predicted_events = SatelliteStateGenerator(satellite, tolerance=tolerance, pass_prediction=True).capture_events_for_targets(start_time, end_time, orders)
+        assert sum(len(events) for events in exhaustive_events) > 0
+        for expected_events, events in zip(exhaustive_events, predicted_events):
+            assert_events_match(expected_events, events, 2*tolerance)
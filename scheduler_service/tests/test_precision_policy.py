@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from scheduler_service.satellite_state import precision_policy
+from scheduler_service.satellite_state.precision_policy import PrecisionPolicy, get_precision_policy
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites, load_sample_groundstations
+import pytest
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(days=2)
+tolerance = timedelta(seconds=1)
+
+
+def test_steps_follow_the_geometry():
+    policy = PrecisionPolicy()
+    satellites = load_sample_satellites()
+    for satellite in satellites:
+        # larger images leave the satellite's view sooner, and higher masks shorten the passes
+        assert policy.capture_step(satellite, ["low"]) < policy.capture_step(satellite, ["spotlight"])
+        assert policy.capture_step(satellite, ["spotlight", "low"]) == policy.capture_step(satellite, ["low"])
+        assert policy.contact_step(satellite, [20.0]) < policy.contact_step(satellite, [5.0])
+        assert policy.capture_step(satellite) < policy.contact_step(satellite, [10.0])
+    # a narrower field of view means shorter capture windows
+    narrowest, widest = min(satellites, key=lambda satellite: satellite.fov), max(satellites, key=lambda satellite: satellite.fov)
+    assert policy.capture_step(narrowest) < policy.capture_step(widest)
+
+
+def test_steps_are_clamped():
+    satellite = load_sample_satellites()[0]
+    assert PrecisionPolicy(samples_per_pass=1e6).capture_step(satellite) == timedelta(seconds=1)
+    assert PrecisionPolicy(samples_per_pass=1e-6).contact_step(satellite, [10.0]) == timedelta(minutes=5)
+
+
+def test_adaptive_contact_search_finds_the_contacts_longer_than_its_step():
+    groundstations = load_sample_groundstations()
+    policy = PrecisionPolicy()
+    for satellite in load_sample_satellites():
+        step = policy.contact_step(satellite, [groundstation.send_mask for groundstation in groundstations])
+        expected_events = SatelliteStateGenerator(satellite, precision=timedelta(seconds=10), tolerance=tolerance).contact_events_for_groundstations(start_time, end_time, groundstations)
+        events = SatelliteStateGenerator(satellite, tolerance=tolerance, precision_policy=policy).contact_events_for_groundstations(start_time, end_time, groundstations)
+        for groundstation_expected_events, groundstation_events in zip(expected_events, events):
+            # a contact longer than the step always contains a sample, only shorter grazing passes can be missed
+            long_events = [event for event in groundstation_expected_events if event[1].utc_datetime() - event[0].utc_datetime() > step]
+            assert len(long_events) > 0
+            for expected_start, expected_end in long_events:
+                assert any(
+                    abs(event_start.utc_datetime() - expected_start.utc_datetime()) <= 2*tolerance and abs(event_end.utc_datetime() - expected_end.utc_datetime()) <= 2*tolerance
+                    for event_start, event_end in groundstation_events
+                )
+
+
+def test_policy_is_configured_from_the_environment(monkeypatch):
+    monkeypatch.setattr(precision_policy, "_precision_policy", None)
+    monkeypatch.delenv("PRECISION_POLICY", raising=False)
+    assert get_precision_policy() is None # the fixed precision is the default
+    monkeypatch.setenv("PRECISION_POLICY", "fixed")
+    assert get_precision_policy() is None
+
+    monkeypatch.setenv("PRECISION_POLICY", "adaptive")
+    monkeypatch.setenv("PRECISION_SAMPLES_PER_PASS", "3")
+    monkeypatch.setenv("PRECISION_MAX_STEP_SECONDS", "60")
+    assert get_precision_policy() == PrecisionPolicy(samples_per_pass=3.0, max_step=timedelta(seconds=60))
+
+    monkeypatch.setenv("PRECISION_POLICY", "fastest")
+    with pytest.raises(ValueError):
+        get_precision_policy()
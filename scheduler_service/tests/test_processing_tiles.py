@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta, timezone
+from scheduler_service.event_processing.utils import tiles_covering, tile_time_range
+
+
+def test_tiles_snap_to_utc_days():
+    tiles = tiles_covering(datetime(2023, 10, 2, 5, 30), datetime(2023, 10, 4, 0, 0, 1), timedelta(days=1))
+    assert len(tiles) == 3
+    assert tile_time_range(tiles[0], timedelta(days=1)) == (datetime(2023, 10, 2, tzinfo=timezone.utc), datetime(2023, 10, 3, tzinfo=timezone.utc))
+    assert tile_time_range(tiles[-1], timedelta(days=1))[1] == datetime(2023, 10, 5, tzinfo=timezone.utc)
+
+
+def test_ranges_on_tile_boundaries_map_to_the_same_tiles():
+    day = timedelta(days=1)
+    assert tiles_covering(datetime(2023, 10, 2), datetime(2023, 10, 4), day) == tiles_covering(datetime(2023, 10, 2, 1), datetime(2023, 10, 3, 23), day)
+    # aware times are converted to UTC
+    eastern = timezone(timedelta(hours=-4))
+    assert tiles_covering(datetime(2023, 10, 1, 20, tzinfo=eastern), datetime(2023, 10, 2, 20, tzinfo=eastern), day) == tiles_covering(datetime(2023, 10, 2), datetime(2023, 10, 3), day)
+    # an empty range still maps to the tile containing it
+    assert len(tiles_covering(datetime(2023, 10, 2, 6), datetime(2023, 10, 2, 6), day)) == 1
+
+
+def test_hourly_tiles():
+    tiles = tiles_covering(datetime(2023, 10, 2, 5, 30), datetime(2023, 10, 2, 8), timedelta(hours=1))
+    assert [tile_time_range(tile, timedelta(hours=1))[0].hour for tile in tiles] == [5, 6, 7]
@@ -0,0 +1,27 @@
+from app_config.database.mapping import Satellite
+from scheduler_service.constants import get_timescale
+from scheduler_service.satellite_state.satellite_cache import get_skyfield_satellite, invalidate_skyfield_satellite
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+def test_generators_share_parsed_satellite_and_timescale():
+    satellite = load_sample_satellites()[0]
+    first_generator, second_generator = SatelliteStateGenerator(satellite), SatelliteStateGenerator(satellite)
+    assert first_generator._get_skyfield_satellite() is second_generator._get_skyfield_satellite()
+    assert first_generator._get_timescale() is get_timescale()
+
+
+def test_changed_tle_is_parsed_again():
+    first_satellite, second_satellite = load_sample_satellites()[:2]
+    old_skyfield_satellite = get_skyfield_satellite(first_satellite)
+
+    # same satellite row, with the TLE of another satellite
+    updated_satellite = Satellite(id=first_satellite.id, name=first_satellite.name, tle=second_satellite.tle, fov=first_satellite.fov)
+    new_skyfield_satellite = get_skyfield_satellite(updated_satellite)
+    assert new_skyfield_satellite is not old_skyfield_satellite
+    assert new_skyfield_satellite.model.satnum == get_skyfield_satellite(second_satellite).model.satnum
+    assert get_skyfield_satellite(updated_satellite) is new_skyfield_satellite
+
+    invalidate_skyfield_satellite(first_satellite.id)
+    assert get_skyfield_satellite(updated_satellite) is not new_skyfield_satellite
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+from skyfield.api import EarthSatellite
+from scheduler_service.constants import get_ephemeris, get_timescale
+from scheduler_service.satellite_state import state_generator as state_generator_module
+from scheduler_service.satellite_state.ephemeris_cache import EphemerisCache
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.satellite_state.kernels import haversine_distance
+from scheduler_service.tests.helpers import load_sample_satellites
+import numpy as np
+import pytest
+
+
+start_time = datetime(2023, 10, 2, 11)
+end_time = start_time + timedelta(hours=2)
+
+
+def per_state_reference(db_satellite, times: list):
+    """
+    States computed one time at a time with skyfield, the way `state_at` did before states were batched
+    """
+    ts = get_timescale()
+    satellite = EarthSatellite(db_satellite.tle["line1"], db_satellite.tle["line2"], db_satellite.name, ts)
+    states = []
+    for time in times:
+        geocentric = satellite.at(ts.from_datetime(time))
+        subpoint = geocentric.subpoint()
+        states.append((subpoint.latitude.degrees, subpoint.longitude.degrees, subpoint.elevation.km, geocentric.is_sunlit(get_ephemeris())))
+    return [np.array(column) for column in zip(*states)]
+
+
+@pytest.mark.parametrize("use_ephemeris_cache", [False, True])
+def test_batch_matches_per_state_propagation(use_ephemeris_cache, monkeypatch, tmp_path):
+    cache = EphemerisCache(tmp_path) if use_ephemeris_cache else None
+    monkeypatch.setattr(state_generator_module, "get_ephemeris_cache", lambda: cache)
+
+    for db_satellite in load_sample_satellites()[:3]:
+        batch = SatelliteStateGenerator(db_satellite).track(start_time, end_time, timedelta(seconds=30))
+        times = batch.datetimes()
+        assert times[0] == start_time.replace(tzinfo=timezone.utc) and len(batch) == 241
+
+        latitude, longitude, altitude, is_sunlit = per_state_reference(db_satellite, times)
+        if use_ephemeris_cache: # interpolated between the cache's grid points
+            assert np.max(haversine_distance(batch.latitude, batch.longitude, latitude, longitude)) < 0.01 # km
+            assert np.max(np.abs(batch.altitude - altitude)) < 0.01
+        else:
+            assert np.allclose(batch.latitude, latitude, rtol=0, atol=1e-9)
+            assert np.allclose(batch.longitude, longitude, rtol=0, atol=1e-9)
+            assert np.allclose(batch.altitude, altitude, rtol=0, atol=1e-9)
+        assert np.array_equal(batch.is_sunlit, is_sunlit)
+
+        # indexing the batch gives the same single states
+        for i in [0, 100, 240]:
+            state = batch[i]
+            assert (state.latitude, state.longitude, state.altitude, state.is_sunlit) == (batch.latitude[i], batch.longitude[i], batch.altitude[i], batch.is_sunlit[i])
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from scheduler_service.satellite_state.constellation import ConstellationPropagator
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator
+from scheduler_service.satellite_state.stream import SatelliteStateStreamManager, SatelliteStateStreamer
+from scheduler_service.satellite_state import stream
+from scheduler_service.tests.helpers import load_sample_satellites
+import pytest
+
+
+@pytest.fixture
+def satellites(monkeypatch):
+    satellites = SampleSatellites(load_sample_satellites())
+    def from_database(satellite_ids, session=None):
+        satellites.loaded_with.append(session)
+        return ConstellationPropagator([satellite for satellite in satellites if satellite.id in satellite_ids])
+    monkeypatch.setattr(ConstellationPropagator, "from_database", from_database)
+    return satellites
+
+
+class SampleSatellites(list):
+    def __init__(self, satellites):
+        super().__init__(satellites)
+        self.loaded_with = [] # sessions the satellites were loaded with
+
+
+def test_listener_counts():
+    manager = SatelliteStateStreamManager()
+    for satellite_id in [3, 1, 3]:
+        manager.create_listener(satellite_id)
+    manager.destroy_listener(3)
+    manager.destroy_listener(2) # never listened to
+    assert manager.active_satellite_ids() == [1, 3]
+    manager.destroy_listener(3)
+    assert manager.active_satellite_ids() == [1]
+
+
+def test_tick_publishes_the_watched_satellites_in_one_batch(satellites):
+    manager = SatelliteStateStreamManager()
+    streamer = SatelliteStateStreamer(manager)
+    time = datetime(2023, 10, 2, 12, 30)
+    assert streamer.tick(time) is None
+
+    for satellite in satellites[1:4]:
+        manager.create_listener(satellite.id)
+    message = streamer.tick(time)
+
+    assert message["time"] == time.isoformat()
+    assert [state["satellite_id"] for state in message["states"]] == [satellite.id for satellite in satellites[1:4]]
+    for satellite, state in zip(satellites[1:4], message["states"]):
+        expected_state = SatelliteStateGenerator(satellite).state_at(time)
+        assert state["latitude"] == pytest.approx(expected_state.latitude, abs=1e-6)
+        assert state["longitude"] == pytest.approx(expected_state.longitude, abs=1e-6)
+        assert state["altitude"] == pytest.approx(expected_state.altitude, abs=1e-3)
+        assert state["is_sunlit"] == expected_state.is_sunlit
+
+
+def test_updated_tles_are_picked_up(satellites):
+    manager = SatelliteStateStreamManager()
+    manager.create_listener(satellites[0].id)
+    time = datetime(2023, 10, 2, 12, 30)
+    streamer = SatelliteStateStreamer(manager, reload_interval=timedelta(hours=1))
+    state = streamer.tick(time)["states"][0]
+
+    satellites[0] = SimpleNamespace(id=satellites[0].id, tle=satellites[1].tle)
+    assert streamer.tick(time)["states"][0] == state # the watched satellites didn't change, and the reload isn't due yet
+    streamer.reload_interval = timedelta(0)
+    updated_state = streamer.tick(time)["states"][0]
+    expected_state = SatelliteStateGenerator(satellites[1]).state_at(time)
+    assert updated_state["latitude"] == pytest.approx(expected_state.latitude, abs=1e-6)
+    assert updated_state["longitude"] == pytest.approx(expected_state.longitude, abs=1e-6)
+
+
+def test_thread_publishes_with_its_own_connection_and_session(satellites, monkeypatch):
+    connection, session, published = object(), FakeSession(), []
+    monkeypatch.setattr(stream, "create_rabbit", lambda: connection)
+    monkeypatch.setattr(stream, "Session", lambda engine: session)
+    manager = SatelliteStateStreamManager()
+    manager.create_listener(satellites[0].id)
+    streamer = SatelliteStateStreamer(manager)
+
+    class Publisher:
+        def __init__(self, publisher_connection, topic):
+            self.connection = publisher_connection
+        def publish_message(self, message):
+            published.append((self.connection, message))
+            streamer._stop.set()
+    monkeypatch.setattr(stream, "TopicPublisher", Publisher)
+
+    streamer._run()
+    assert [publisher_connection for publisher_connection, _ in published] == [connection]
+    assert satellites.loaded_with == [session]
+    assert session.closed
+
+
+class FakeSession:
+    closed = False
+    def close(self):
+        self.closed = True
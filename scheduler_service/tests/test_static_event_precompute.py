@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from scheduler_service.event_processing import background_jobs
+from scheduler_service.event_processing.background_jobs import StaticEventPrecomputer, time_slices
+
+
+def test_time_slices_cover_the_horizon():
+    start_time = datetime(2023, 10, 2, 6)
+    slices = time_slices(start_time, start_time + timedelta(days=2, hours=12), timedelta(days=1))
+    assert slices == [
+        (start_time, start_time + timedelta(days=1)),
+        (start_time + timedelta(days=1), start_time + timedelta(days=2)),
+        (start_time + timedelta(days=2), start_time + timedelta(days=2, hours=12)),
+    ]
+
+
+def test_precompute_populates_nearest_slices_first(monkeypatch):
+    calls = []
+    monkeypatch.setattr(background_jobs, "ensure_eclipse_events_populated", lambda start, end, skip_locked: calls.append(("eclipse", start)))
+    monkeypatch.setattr(background_jobs, "ensure_contact_events_populated", lambda start, end, workers, skip_locked: calls.append(("contact", start)))
+    monkeypatch.setattr(background_jobs, "ensure_capture_opportunities_populated", lambda start, end, workers, skip_locked: calls.append(("capture", start)))
+    # a request is being scheduled when the precomputation starts, and is done after the first check
+    request_checks = iter([[7], [], [], []])
+    monkeypatch.setattr(StaticEventPrecomputer, "_processing_request_ids", lambda self: next(request_checks))
+    monkeypatch.setattr(background_jobs.time, "sleep", lambda seconds: calls.append(("wait", seconds)))
+
+    now = datetime(2023, 10, 2)
+    precomputer = StaticEventPrecomputer(horizon=timedelta(days=3), slice_duration=timedelta(days=1), workers=2)
+    progress = precomputer.run(now)
+
+    assert calls[0] == ("wait", 1)
+    assert calls[1:] == [
+        (kind, now + timedelta(days=day))
+        for day in range(3)
+        for kind in ("eclipse", "contact", "capture")
+    ]
+    assert progress.completed_slices == progress.total_slices == 3 and progress.fraction() == 1.0
+    assert progress.horizon_end == now + timedelta(days=3) and progress.finished_at is not None
+
+
+def test_requests_processing_for_too_long_are_not_waited_for(monkeypatch):
+    clock = [0.0]
+    def sleep(seconds):
+        clock[0] += seconds
+    monkeypatch.setattr(background_jobs.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(background_jobs.time, "sleep", sleep)
+    for name in ["ensure_eclipse_events_populated", "ensure_contact_events_populated", "ensure_capture_opportunities_populated"]:
+        monkeypatch.setattr(background_jobs, name, lambda *args, **kwargs: None)
+    # request 1 was left processing by a crash
+    monkeypatch.setattr(StaticEventPrecomputer, "_processing_request_ids", lambda self: [1])
+
+    precomputer = StaticEventPrecomputer(horizon=timedelta(days=14), slice_duration=timedelta(days=1), max_request_wait=timedelta(minutes=10))
+    precomputer.run(datetime(2023, 10, 2))
+    assert clock[0] == 10 * 60 # waited once for the whole run, not for every slice
+    precomputer.run(datetime(2023, 10, 2))
+    assert clock[0] == 10 * 60 # and not at all once the request is known to be stuck
@@ -0,0 +1,28 @@
+import numpy as np
+from datetime import timedelta
+from skyfield.api import EarthSatellite
+from skyfield.framelib import itrs
+from scheduler_service.constants import get_ephemeris, get_timescale
+from scheduler_service.satellite_state.sun import SunTable, is_geocentric_sunlit
+from scheduler_service.tests.helpers import load_sample_satellites
+
+
+def test_interpolated_sun_matches_ephemeris():
+    ts = get_timescale()
+    ephemeris = get_ephemeris()
+    table = SunTable(horizon=timedelta(days=1))
+    # the queries go past both ends of the initial horizon, so the table has to be extended both ways
+    for day in [1, 3, 0]:
+        time = ts.utc(2023, 10, day + 1, 0, 0, np.arange(0, 24*60*60, 7.3))
+        sun = (ephemeris['sun'] - ephemeris['earth']).at(time)
+        assert np.max(np.linalg.norm(table.itrs_positions(time) - sun.frame_xyz(itrs).km.T, axis=-1)) < 5 # km, out of 150 million
+        assert np.max(np.linalg.norm(table.icrf_positions(time) - sun.position.km.T, axis=-1)) < 5
+    assert table.itrs_positions(time[0]).shape == (3,)
+
+
+def test_sunlit_matches_skyfield():
+    ts = get_timescale()
+    time = ts.utc(2023, 10, 2, 0, 0, np.arange(0, 2*24*60*60, 10))
+    for db_satellite in load_sample_satellites():
+        geocentric = EarthSatellite(db_satellite.tle["line1"], db_satellite.tle["line2"], db_satellite.name, ts).at(time)
+        assert np.array_equal(is_geocentric_sunlit(geocentric), geocentric.is_sunlit(get_ephemeris()))
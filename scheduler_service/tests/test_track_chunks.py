@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from scheduler_service.satellite_state.state_generator import SatelliteStateGenerator, STATE_RECORD_DTYPE
+from scheduler_service.tests.helpers import load_sample_satellites
+import numpy as np
+
+
+start_time = datetime(2023, 10, 2)
+end_time = start_time + timedelta(hours=6)
+
+
+def test_track_chunks_match_track():
+    state_generator = SatelliteStateGenerator(load_sample_satellites()[0])
+    track = state_generator.track(start_time, end_time, timedelta(seconds=10))
+    chunks = list(state_generator.track_chunks(start_time, end_time, timedelta(seconds=10), chunk_size=1000))
+
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 160]
+    for name in ["time", "latitude", "longitude", "altitude", "is_sunlit"]:
+        assert np.array_equal(np.concatenate([getattr(chunk, name) for chunk in chunks]), getattr(track, name))
+
+
+def test_track_serializations():
+    state_generator = SatelliteStateGenerator(load_sample_satellites()[0])
+    track = state_generator.track(start_time, end_time, timedelta(minutes=1))
+
+    columns = track.columns()
+    assert columns["satellite_id"] == track.satellite_id
+    assert columns["time"][:2] == [int(track.time[0]), int(track.time[0]) + 60_000_000]
+    assert columns["is_sunlit"] == track.is_sunlit.tolist()
+
+    records = np.frombuffer(track.records().tobytes(), dtype=STATE_RECORD_DTYPE)
+    assert STATE_RECORD_DTYPE.itemsize == 33 and len(records) == len(track)
+    for name in STATE_RECORD_DTYPE.names:
+        assert np.array_equal(records[name], getattr(track, name))
+    assert track[5].latitude == records["latitude"][5]